@@ -0,0 +1 @@
+default_app_config = 'candy_shop.apps.delivery.apps.DeliveryConfig'
@@ -1,9 +1,25 @@
 from django.contrib import admin
+from django.db import transaction
+
+from .models import (Region, Courier, WorkingHours, Order, DeliveryHours,
+                     Delivery, CourierRegionStats)
+
+
+class HoursAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        # a bulk delete doesn't call `Hours.delete`
+        model = queryset.model
+        with transaction.atomic():
+            owner_ids = set(
+                queryset.values_list(model.owner_field, flat=True))
+            queryset.delete()
+            model.update_slots_of(owner_ids)
 
-from .models import Region, Courier, WorkingHours, Order, DeliveryHours
 
 admin.site.register(Region)
 admin.site.register(Courier)
-admin.site.register(WorkingHours)
+admin.site.register(WorkingHours, HoursAdmin)
 admin.site.register(Order)
-admin.site.register(DeliveryHours)
+admin.site.register(DeliveryHours, HoursAdmin)
+admin.site.register(Delivery)
+admin.site.register(CourierRegionStats)
@@ -2,4 +2,10 @@ from django.apps import AppConfig
 
 
 class DeliveryConfig(AppConfig):
-    name = 'delivery'
+    name = 'candy_shop.apps.delivery'
+    label = 'delivery'
+
+    def ready(self):
+        from . import open_orders, regions
+        open_orders.connect_signals()
+        regions.connect_signals()
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class AssignmentStrategy:
+    """
+    Selects orders for a courier from candidates,
+    so that their total weight doesn't exceed the capacity.
+    candidates: a list of (order_id, weight) pairs
+    """
+    def select(self, candidates, capacity: Decimal):
+        raise NotImplementedError()
+
+
+class GreedyStrategy(AssignmentStrategy):
+    """
+    Takes the heaviest orders until the first one which doesn't fit
+    """
+    def select(self, candidates, capacity):
+        selected = []
+        for order_id, weight in sorted(candidates, key=lambda c: -c[1]):
+            if weight > capacity:
+                break
+            selected.append((order_id, weight))
+            capacity -= weight
+        return selected
+
+
+class FirstFitDecreasingStrategy(AssignmentStrategy):
+    """
+    Takes the heaviest orders skipping the ones which don't fit
+    """
+    def select(self, candidates, capacity):
+        selected = []
+        for order_id, weight in sorted(candidates, key=lambda c: -c[1]):
+            if weight <= capacity:
+                selected.append((order_id, weight))
+                capacity -= weight
+        return selected
+
+
+class KnapsackStrategy(AssignmentStrategy):
+    """
+    Solves 0/1 knapsack problem over weights in hundredths of kilogram,
+    i.e. maximizes the total weight of selected orders.
+    Sums reachable with the first i orders are kept as bits of an integer,
+    so a step takes a shift and an or of a `capacity`-bit number.
+    When there are more than `max_candidates` candidates
+    the lightest ones are left to first-fit decreasing
+    """
+    unit = Decimal('0.01')
+    max_candidates = 1000
+
+    def select(self, candidates, capacity):
+        candidates = sorted(candidates, key=lambda c: -c[1])
+        capacity_units = int(capacity / self.unit)
+        if capacity_units <= 0:
+            return []
+        items = [c for c in candidates[:self.max_candidates]
+                 if c[1] <= capacity]
+        weights = [int(weight / self.unit) for _, weight in items]
+
+        mask = (1 << (capacity_units + 1)) - 1
+        reachable = [1]
+        for w in weights:
+            reachable.append((reachable[-1] | (reachable[-1] << w)) & mask)
+
+        total = reachable[-1].bit_length() - 1
+        selected = []
+        for i in range(len(items) - 1, -1, -1):
+            if not (reachable[i] >> total) & 1:
+                selected.append(items[i])
+                total -= weights[i]
+
+        capacity -= sum(weight for _, weight in selected)
+        rest = candidates[self.max_candidates:]
+        return selected + FirstFitDecreasingStrategy().select(rest, capacity)
+
+
+def get_assignment_strategy() -> AssignmentStrategy:
+    return import_string(settings.DELIVERY_ASSIGNMENT_STRATEGY)()
@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+# context managers of the current request entered around its code
+# which `run_sync` runs in a worker thread
+thread_hooks = ContextVar('thread_hooks', default=())
+
+
+@contextmanager
+def in_worker_threads(hook):
+    """
+    Enters `hook()` around every `run_sync` call made in the block
+    """
+    token = thread_hooks.set(thread_hooks.get() + (hook,))
+    try:
+        yield
+    finally:
+        thread_hooks.reset(token)
+
+
+@contextmanager
+def wrapping_queries(wrapper):
+    """
+    Installs the execute wrapper on connections of the current thread
+    and of the worker threads running code of the request
+    """
+    def wrap_connections():
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        return stack
+
+    with wrap_connections(), in_worker_threads(wrap_connections):
+        yield
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(settings.DELIVERY_ASYNC_THREADS,
+                              thread_name_prefix='delivery')
+
+
+def call_in_worker_thread(func, args, kwargs):
+    # connections are per thread, so they are checked as Django does
+    # at the start and the end of every request
+    close_old_connections()
+    try:
+        with ExitStack() as stack:
+            for hook in thread_hooks.get():
+                stack.enter_context(hook())
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Runs sync code, e.g. of the ORM, in one of `DELIVERY_ASYNC_THREADS`
+    worker threads, which bound the number of database connections
+    of the process. Unlike `sync_to_async` with `thread_sensitive=True`
+    requests don't wait for each other in the one sync thread
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, call_in_worker_thread,
+                             func, args, kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def async_view(view):
+    """
+    An async version of a sync view, which runs the view
+    and renders its response with `run_sync`
+    """
+    def get_response(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            # rendering it again in the handler is a no-op
+            response.render()
+        return response
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_sync(get_response, request, *args, **kwargs)
+    return wrapper
+
+
+class HybridMiddleware:
+    """
+    A base of middleware which handles requests in the mode
+    of the handler, so that under ASGI Django doesn't run it and
+    the rest of the chain in the one sync thread. Subclasses implement
+    `handle(request)` and `async handle_async(request)`
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # marks the instance as a coroutine function for Django
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.handle_async(request)
+        return self.handle(request)
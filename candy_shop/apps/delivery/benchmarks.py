@@ -0,0 +1,180 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Courier, Order, Delivery
+from .replay import percentile
+from .seeding import get_hours, get_next_pk, get_weight
+from .serializers import CourierSerializer, OrderSerializer
+from .services import assign_orders, complete_order, update_courier
+
+# name -> a function which takes a random generator and returns
+# a callable measured once per sample
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def sample_courier(rnd):
+    """
+    A random courier with prefetched regions and working hours,
+    picked by primary key, which is cheap on a table of any size
+    """
+    pk = rnd.randint(1, max(get_next_pk(Courier) - 1, 1))
+    return (
+        Courier.objects
+               .filter(pk__gte=pk)
+               .order_by('pk')
+               .prefetch_related('regions', 'working_hours')
+               .first()
+    )
+
+
+def rolled_back(func):
+    """
+    Runs `func` in a transaction which is rolled back,
+    so that benchmarks don't change the dataset
+    """
+    with transaction.atomic():
+        result = func()
+        transaction.set_rollback(True)
+    return result
+
+
+@benchmark
+def get_available_orders(rnd):
+    courier = sample_courier(rnd)
+    candidates = (
+        Order.objects
+             .get_available_orders(courier)
+             .order_by('-weight', 'order_id')
+             .values_list('order_id', 'weight')
+    )
+    return lambda: list(
+        candidates[:settings.DELIVERY_ASSIGNMENT_CANDIDATES])
+
+
+@benchmark
+def assign(rnd):
+    courier = sample_courier(rnd)
+    return lambda: rolled_back(lambda: assign_orders(courier))
+
+
+@benchmark
+def complete(rnd):
+    open_delivery = (
+        Delivery.objects
+                .filter(n_orders_open__gt=0,
+                        courier__gte=sample_courier(rnd).pk)
+                .order_by('courier')
+                .first()
+    )
+    order = open_delivery and open_delivery.orders.filter(
+        status=Order.OrderStatus.ASSIGNED).first()
+    if order is None:
+        return None
+    return lambda: rolled_back(
+        lambda: complete_order(open_delivery.courier, order))
+
+
+@benchmark
+def rating(rnd):
+    courier_id = sample_courier(rnd).pk
+    return lambda: Courier.objects.get(pk=courier_id).rating
+
+
+@benchmark
+def earnings(rnd):
+    courier_id = sample_courier(rnd).pk
+    return lambda: Courier.objects.get(pk=courier_id).earnings
+
+
+@benchmark
+def patch_courier(rnd):
+    courier = sample_courier(rnd)
+    regions = [r.pk for r in courier.regions.all()]
+    data = {
+        'courier_type': Courier.CourierType.FOOT,
+        'regions': regions[:1] + [max(regions) + 1],
+        'working_hours': get_hours(rnd, 2),
+    }
+    return lambda: rolled_back(lambda: update_courier(courier, data))
+
+
+@benchmark
+def validate_couriers(rnd, batch_size=1000):
+    first_id = get_next_pk(Courier)
+    items = [
+        {
+            'courier_id': courier_id,
+            'courier_type': rnd.choice(Courier.CourierType.labels),
+            'regions': rnd.sample(range(1, 100), 2),
+            'working_hours': get_hours(rnd, 2),
+        }
+        for courier_id in range(first_id, first_id + batch_size)
+    ]
+    return lambda: CourierSerializer(data=items, many=True).is_valid()
+
+
+@benchmark
+def validate_orders(rnd, batch_size=1000):
+    first_id = get_next_pk(Order)
+    items = [
+        {
+            'order_id': order_id,
+            'weight': float(get_weight(rnd)),
+            'region': rnd.randint(1, 100),
+            'delivery_hours': get_hours(rnd, 2),
+        }
+        for order_id in range(first_id, first_id + batch_size)
+    ]
+    return lambda: OrderSerializer(data=items, many=True).is_valid()
+
+
+def run_benchmarks(names=None, n_samples=100, seed=0):
+    """
+    Measures every benchmark on `n_samples` random samples
+    after a warm-up one, returns latencies in milliseconds
+    """
+    rnd = random.Random(seed)
+    results = {}
+    for name in names or BENCHMARKS:
+        latencies = []
+        for i in range(n_samples + 1):
+            run = BENCHMARKS[name](rnd)
+            if run is None:
+                continue
+            started = time.perf_counter()
+            run()
+            if i:
+                latencies.append(time.perf_counter() - started)
+        if not latencies:
+            continue
+        latencies.sort()
+        results[name] = {
+            'samples': len(latencies),
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+    return {
+        'time': timezone.now().isoformat(),
+        'dataset': {
+            'couriers': Courier.objects.count(),
+            'orders': Order.objects.count(),
+            'open_orders': Order.objects.filter(
+                status=Order.OrderStatus.OPEN).count(),
+        },
+        'settings': {
+            'assignment_strategy': settings.DELIVERY_ASSIGNMENT_STRATEGY,
+            'open_order_index': bool(settings.DELIVERY_OPEN_ORDER_INDEX),
+        },
+        'benchmarks': results,
+    }
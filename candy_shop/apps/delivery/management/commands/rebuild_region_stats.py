@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from candy_shop.apps.delivery.models import Courier
+from candy_shop.apps.delivery.services import rebuild_region_stats
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds running aggregates of couriers' completed orders "
+            "from the order history")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare ratings computed from the aggregates "
+                 "with ratings computed from the order history")
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            stats = rebuild_region_stats()
+            self.stdout.write(f"Rebuilt {len(stats)} aggregates")
+            return
+
+        n_couriers = 0
+        inconsistent_ids = []
+        for courier in Courier.objects.prefetch_related('region_stats'):
+            n_couriers += 1
+            if courier.rating != courier.get_rating_from_history():
+                inconsistent_ids.append(courier.pk)
+        if inconsistent_ids:
+            raise CommandError(
+                f"Ratings of couriers {inconsistent_ids} are inconsistent "
+                f"with the order history, run the command without --check")
+        self.stdout.write(f"Ratings of {n_couriers} couriers are consistent")
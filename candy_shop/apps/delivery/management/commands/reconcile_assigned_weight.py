@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from candy_shop.apps.delivery.services import reconcile_assigned_weight
+
+
+class Command(BaseCommand):
+    help = ("Repairs couriers' assigned weight which has drifted "
+            "from the total weight of their assigned orders")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report couriers with drifted assigned weight")
+
+    def handle(self, *args, **options):
+        drifted_ids = reconcile_assigned_weight(repair=not options['check'])
+        if drifted_ids and options['check']:
+            raise CommandError(
+                f"Assigned weight of couriers {drifted_ids} has drifted, "
+                f"run the command without --check")
+        if drifted_ids:
+            self.stdout.write(
+                f"Repaired assigned weight of couriers {drifted_ids}")
+        else:
+            self.stdout.write("Assigned weight of all couriers is consistent")
@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from candy_shop.apps.delivery.replay import (HttpClient, InProcessClient,
+                                             read_requests, replay, summarize)
+
+
+class Command(BaseCommand):
+    help = ("Replays a JSONL log of API requests, e.g. captured with "
+            "DELIVERY_REQUEST_CAPTURE_FILE, and reports throughput, "
+            "latency percentiles and queries per endpoint. Without --url "
+            "requests are sent in-process to the configured database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help="A JSONL file of requests")
+        parser.add_argument(
+            '--url',
+            help="A base URL of a live server, e.g. http://localhost:8080")
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help="The number of requests sent at the same time")
+        parser.add_argument(
+            '--speedup', type=float, default=0,
+            help="Paces requests by their time in the log divided by "
+                 "this factor, they are sent as fast as possible by default")
+        parser.add_argument(
+            '--report', help="Writes the report to this file as JSON")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be positive")
+        try:
+            with open(options['log']) as f:
+                requests = list(read_requests(f))
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Can't read requests: {e!r}")
+
+        if options['url']:
+            def get_client():
+                return HttpClient(options['url'])
+        else:
+            get_client = InProcessClient
+        results, total_time = replay(requests, get_client,
+                                     concurrency=options['concurrency'],
+                                     speedup=options['speedup'])
+        summary = summarize(results, total_time)
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(summary, f, indent=2)
+        self.write_summary(summary)
+
+    def write_summary(self, summary):
+        columns = ['requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms',
+                   'queries']
+        width = max([len(e) for e in summary['endpoints']] + [8])
+        self.stdout.write(
+            'endpoint'.ljust(width) +
+            ''.join(c.rjust(10) for c in columns))
+        for endpoint, stats in summary['endpoints'].items():
+            values = [
+                '-' if stats[c] is None else
+                f'{stats[c]:.1f}' if isinstance(stats[c], float) else
+                str(stats[c])
+                for c in columns
+            ]
+            self.stdout.write(
+                endpoint.ljust(width) + ''.join(v.rjust(10) for v in values))
+        self.stdout.write(
+            f"{summary['requests']} requests in {summary['seconds']:.2f} s, "
+            f"{summary['throughput'] or 0:.1f} requests/s")
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from candy_shop.apps.delivery.benchmarks import BENCHMARKS, run_benchmarks
+from candy_shop.apps.delivery.models import Courier
+
+
+class Command(BaseCommand):
+    help = ("Measures latencies of hot paths on the configured database, "
+            "e.g. seeded with `seed_data`, without changing it")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help=f"Benchmarks to run, all of them by default: "
+                 f"{', '.join(BENCHMARKS)}")
+        parser.add_argument('--samples', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--report', help="Writes the report to this file as JSON")
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks {sorted(unknown)}")
+        if not Courier.objects.exists():
+            raise CommandError("There are no couriers, run seed_data first")
+        report = run_benchmarks(names=options['names'],
+                                n_samples=options['samples'],
+                                seed=options['seed'])
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        columns = ['samples', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms']
+        width = max(len(name) for name in BENCHMARKS)
+        self.stdout.write(
+            'benchmark'.ljust(width) + ''.join(c.rjust(10) for c in columns))
+        for name, stats in report['benchmarks'].items():
+            self.stdout.write(name.ljust(width) + ''.join(
+                f'{stats[c]:.2f}'.rjust(10) if isinstance(stats[c], float)
+                else str(stats[c]).rjust(10)
+                for c in columns))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from candy_shop.apps.delivery.seeding import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = ("Generates a synthetic dataset of couriers, orders "
+            "and their delivery history in the configured database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, default=50000)
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--regions', type=int, default=1000)
+        parser.add_argument(
+            '--complete-share', type=float, default=0.5,
+            help="A share of orders which are already delivered")
+        parser.add_argument(
+            '--assigned-share', type=float, default=0.05,
+            help="A share of orders which are assigned if couriers "
+                 "have capacity for them")
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['regions'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--regions and --chunk-size must be positive")
+        if options['complete_share'] + options['assigned_share'] > 1:
+            raise CommandError("The shares of orders can't exceed 1")
+        generator = DatasetGenerator(
+            n_couriers=options['couriers'],
+            n_orders=options['orders'],
+            n_regions=options['regions'],
+            complete_share=options['complete_share'],
+            assigned_share=options['assigned_share'],
+            chunk_size=options['chunk_size'],
+            seed=options['seed'],
+        )
+        generator.generate(log=self.stdout.write)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from candy_shop.apps.delivery.profiling import sign_path
+
+
+class Command(BaseCommand):
+    help = ("Prints a value of the X-Delivery-Profile header which allows "
+            "to profile requests to the path, e.g. /orders/assign")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        if not settings.DELIVERY_PROFILE_KEY:
+            raise CommandError("Profiling is disabled, "
+                               "DELIVERY_PROFILE_KEY isn't set")
+        self.stdout.write(sign_path(options['path']))
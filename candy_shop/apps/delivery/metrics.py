@@ -0,0 +1,345 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .asynchronous import HybridMiddleware, wrapping_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+
+# name -> (type, help, buckets of a histogram)
+METRICS = {
+    'delivery_requests_total': (
+        'counter', "Requests by view, method and status", None),
+    'delivery_request_duration_seconds': (
+        'histogram', "Latency of requests", LATENCY_BUCKETS),
+    'delivery_db_queries': (
+        'histogram', "SQL queries made by a request", QUERY_BUCKETS),
+    'delivery_db_duration_seconds': (
+        'histogram', "Time of a request spent in SQL queries",
+        LATENCY_BUCKETS),
+    'delivery_request_size_bytes': (
+        'histogram', "Sizes of request bodies", SIZE_BUCKETS),
+    'delivery_response_size_bytes': (
+        'histogram', "Sizes of response bodies", SIZE_BUCKETS),
+}
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms of the current process.
+    With `DELIVERY_METRICS_DIR` every process writes its values
+    to a file there at most every `flush_interval` seconds,
+    and `render` sums the files of all processes, e.g. gunicorn workers.
+    On exit a process adds its counters and histograms to the aggregate
+    of exited processes and removes its file, so that the totals don't
+    go down, `collect` does the same for files of processes which have
+    been killed
+    """
+    flush_interval = 1
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # name -> labels -> a value of a counter
+        # or bucket counts followed by the sum and the count of a histogram
+        self.values = {name: {} for name in METRICS}
+        self.flushed_at = 0
+        self.path = None
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            values = self.values[name]
+            values[labels] = values.get(labels, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self.lock:
+            values = self.values[name]
+            if labels not in values:
+                values[labels] = [0] * (len(buckets) + 2)
+            histogram = values[labels]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    # buckets are cumulative as in Prometheus
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def get_snapshot(self):
+        with self.lock:
+            return to_snapshot(self.values)
+
+    def get_path(self, pid):
+        return os.path.join(settings.DELIVERY_METRICS_DIR, f'{pid}.json')
+
+    @contextmanager
+    def locked(self, directory, operation):
+        """
+        Holds a lock of the metrics directory, shared by readers of the files
+        and exclusive for changes of the aggregate
+        """
+        with open(os.path.join(directory, 'lock'), 'a') as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def fold(self, path, snapshot=None):
+        """
+        Adds values of an exited process to the aggregate and removes
+        its file, gauges of exited processes are dropped
+        """
+        directory = os.path.dirname(path)
+        aggregate_path = os.path.join(directory, 'aggregate.json')
+        with self.locked(directory, fcntl.LOCK_EX):
+            if snapshot is None:
+                snapshot = read_snapshot(path)
+            if snapshot is not None:
+                totals = {name: {} for name in METRICS}
+                add_snapshot(totals, read_snapshot(aggregate_path) or {})
+                add_snapshot(totals, {
+                    name: values for name, values in snapshot.items()
+                    if name in METRICS and METRICS[name][0] != 'gauge'
+                })
+                write_snapshot(aggregate_path, to_snapshot(totals))
+            remove_file(path)
+
+    def on_exit(self, path):
+        # a process forked after a flush inherits the handler
+        if path != self.path or not path.endswith(f'/{os.getpid()}.json'):
+            return
+        try:
+            self.fold(self.path, self.get_snapshot())
+        except OSError:
+            # the directory has been removed
+            pass
+
+    def flush(self, force=False):
+        if not settings.DELIVERY_METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < self.flush_interval:
+            return
+        self.flushed_at = now
+        path = self.get_path(os.getpid())
+        if path != self.path:
+            if os.path.exists(path):
+                # left by an exited process with the same pid
+                self.fold(path)
+            self.path = path
+            atexit.register(self.on_exit, path)
+        write_snapshot(path, self.get_snapshot())
+
+    def collect(self):
+        """
+        Values of all processes summed by metric and labels
+        """
+        totals = {name: {} for name in METRICS}
+        add_snapshot(totals, self.get_snapshot())
+        if not settings.DELIVERY_METRICS_DIR:
+            return totals
+        own_path = self.get_path(os.getpid())
+        paths = [path for path in glob.glob(self.get_path('*'))
+                 if path != own_path]
+        for path in paths:
+            pid = os.path.basename(path).split('.')[0]
+            if pid.isdigit() and not is_running(int(pid)):
+                self.fold(path)
+        # a file is not read both before and after it is folded
+        with self.locked(settings.DELIVERY_METRICS_DIR, fcntl.LOCK_SH):
+            for path in glob.glob(self.get_path('*')):
+                if path != own_path:
+                    add_snapshot(totals, read_snapshot(path) or {})
+        return totals
+
+    def render(self):
+        """
+        All metrics in Prometheus text format
+        """
+        lines = []
+        for name, values in self.collect().items():
+            metric_type, help_text, buckets = METRICS[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in sorted(values.items()):
+                if metric_type == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                # bucket counts are cumulative, +Inf is the count
+                bounds = [str(b) for b in buckets] + ['+Inf']
+                counts = value[:-2] + [value[-1]]
+                for bound, count in zip(bounds, counts):
+                    lines.append(
+                        f'{name}_bucket'
+                        f'{format_labels(labels + (("le", bound),))} '
+                        f'{count}')
+                lines.append(f'{name}_sum{format_labels(labels)} '
+                             f'{value[-2]}')
+                lines.append(f'{name}_count{format_labels(labels)} '
+                             f'{value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # a process of another user
+        pass
+    return True
+
+
+def to_snapshot(metrics):
+    """
+    Values by metric and labels as JSON
+    """
+    return {
+        name: [[list(labels),
+                list(value) if isinstance(value, list) else value]
+               for labels, value in values.items()]
+        for name, values in metrics.items()
+    }
+
+
+def add_snapshot(totals, snapshot):
+    """
+    Adds values of a snapshot to totals by metric and labels
+    """
+    for name, values in snapshot.items():
+        if name not in totals:
+            continue
+        for labels, value in values:
+            labels = tuple(tuple(label) for label in labels)
+            total = totals[name].get(labels)
+            if total is None:
+                totals[name][labels] = value
+            elif isinstance(total, list):
+                totals[name][labels] = [a + b for a, b in zip(total, value)]
+            else:
+                totals[name][labels] = total + value
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # a removed file
+        return None
+
+
+def write_snapshot(path, snapshot):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(path + '.tmp', path)
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\')
+                                        .replace('"', r'\"'))
+        for key, value in labels) + '}'
+
+
+metrics_registry = MetricsRegistry()
+
+
+class QueryStats:
+    """
+    An execute wrapper counting queries and the time spent in them
+    """
+    def __init__(self):
+        self.n_queries = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.n_queries += 1
+
+
+def get_view_name(request):
+    """
+    A bounded label of the view, e.g. `CourierViewSet.retrieve`
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name
+    action = (getattr(match.func, 'actions', None) or {}).get(
+        request.method.lower())
+    return f'{view_class.__name__}.{action}' if action else view_class.__name__
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Records per view latency, the number and the time of SQL queries
+    and sizes of payloads of every request
+    """
+    def __init__(self, get_response):
+        if not settings.DELIVERY_METRICS:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def handle(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with wrapping_queries(stats):
+            response = self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def handle_async(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with wrapping_queries(stats):
+            response = await self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, stats, duration):
+        labels = (('view', get_view_name(request)),
+                  ('method', request.method))
+        registry = metrics_registry
+        registry.inc('delivery_requests_total',
+                     labels + (('status', str(response.status_code)),))
+        registry.observe('delivery_request_duration_seconds', labels,
+                         duration)
+        registry.observe('delivery_db_queries', labels, stats.n_queries)
+        registry.observe('delivery_db_duration_seconds', labels,
+                         stats.duration)
+        try:
+            request_size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_size = 0
+        registry.observe('delivery_request_size_bytes', labels, request_size)
+        if not response.streaming:
+            registry.observe('delivery_response_size_bytes', labels,
+                             len(response.content))
+        registry.flush()
@@ -0,0 +1,54 @@
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .asynchronous import HybridMiddleware
+
+
+class RequestCaptureMiddleware(HybridMiddleware):
+    """
+    Appends API requests to `DELIVERY_REQUEST_CAPTURE_FILE` as JSONL
+    which can be replayed with `manage.py replay_requests`.
+    Bodies of streaming uploads aren't read, so such requests
+    are captured without a body
+    """
+    def __init__(self, get_response):
+        if not settings.DELIVERY_REQUEST_CAPTURE_FILE:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        self.file = open(settings.DELIVERY_REQUEST_CAPTURE_FILE, 'a',
+                         buffering=1)
+        self.lock = threading.Lock()
+
+    def handle(self, request):
+        self.capture(request)
+        return self.get_response(request)
+
+    async def handle_async(self, request):
+        self.capture(request)
+        return await self.get_response(request)
+
+    def capture(self, request):
+        record = {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.get_full_path(),
+        }
+        if self.is_small(request):
+            try:
+                record['body'] = json.loads(request.body or 'null')
+            except ValueError:
+                record['body'] = request.body.decode(errors='replace')
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+
+    @staticmethod
+    def is_small(request):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return False
+        return content_length < settings.DELIVERY_STREAMING_MIN_SIZE
@@ -0,0 +1,71 @@
+# Generated by Django 3.1.7 on 2026-10-18 04:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Courier',
+            fields=[
+                ('courier_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('courier_type', models.IntegerField(choices=[(10, 'foot'), (15, 'bike'), (50, 'car')])),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.TimeField()),
+                ('finishes_at', models.TimeField()),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='delivery.courier')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('order_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('assigned', 'Assigned'), ('complete', 'Complete')], default='open', max_length=10)),
+                ('open_time', models.DateTimeField(auto_now=True)),
+                ('assigned_time', models.DateTimeField(blank=True, null=True)),
+                ('complete_time', models.DateTimeField(blank=True, null=True)),
+                ('delivery_time', models.DurationField(blank=True, null=True)),
+                ('courier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='delivery.courier')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='delivery.region')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeliveryHours',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.TimeField()),
+                ('finishes_at', models.TimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_hours', to='delivery.order')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='courier',
+            name='regions',
+            field=models.ManyToManyField(to='delivery.Region'),
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 3.1.7 on 2026-10-18 04:42
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# the same as in `models.Hours`, which may change after the migration
+SLOT_MINUTES = 30
+DAY_MINUTES = 24 * 60
+
+HOURS = [
+    # (hours model, owner model, owner field, slots field, aligned field)
+    ('WorkingHours', 'Courier', 'courier',
+     'working_slots', 'working_slots_aligned'),
+    ('DeliveryHours', 'Order', 'order',
+     'delivery_slots', 'delivery_slots_aligned'),
+]
+
+
+def get_minutes(hours):
+    starts_minute = hours.starts_at.hour * 60 + hours.starts_at.minute
+    finishes_minute = hours.finishes_at.hour * 60 + hours.finishes_at.minute
+    if finishes_minute < starts_minute:
+        finishes_minute += DAY_MINUTES
+    return starts_minute, finishes_minute
+
+
+def get_slots(starts_minute, finishes_minute):
+    # hours finishing on the next day are split at midnight
+    slots = 0
+    for starts, finishes in [(starts_minute, finishes_minute),
+                             (0, finishes_minute - DAY_MINUTES)]:
+        finishes = min(finishes, DAY_MINUTES)
+        if starts < finishes:
+            first = starts // SLOT_MINUTES
+            last = -(-finishes // SLOT_MINUTES)
+            slots |= (1 << last) - (1 << first)
+    is_aligned = (starts_minute >= finishes_minute or (
+        starts_minute % SLOT_MINUTES == 0 and
+        finishes_minute % SLOT_MINUTES == 0))
+    return slots, is_aligned
+
+
+def set_minutes_and_slots(apps, schema_editor):
+    """
+    Sets minutes of all hours and slots of their owners,
+    see `models.Hours.get_slots_of`
+    """
+    for hours_name, owner_name, owner_field, slots_field, aligned_field \
+            in HOURS:
+        Hours = apps.get_model('delivery', hours_name)
+        Owner = apps.get_model('delivery', owner_name)
+        owner_slots = defaultdict(lambda: (0, True))
+        batch = []
+        for hours in Hours.objects.order_by('pk').iterator():
+            hours.starts_minute, hours.finishes_minute = get_minutes(hours)
+            slots, is_aligned = get_slots(hours.starts_minute,
+                                          hours.finishes_minute)
+            owner_id = getattr(hours, owner_field + '_id')
+            owner_slots[owner_id] = (
+                owner_slots[owner_id][0] | slots,
+                owner_slots[owner_id][1] and is_aligned)
+            batch.append(hours)
+            if len(batch) == 1000:
+                Hours.objects.bulk_update(
+                    batch, ['starts_minute', 'finishes_minute'])
+                batch = []
+        Hours.objects.bulk_update(batch, ['starts_minute', 'finishes_minute'])
+
+        # owners without hours keep the defaults, an empty set of slots
+        owner_ids = defaultdict(list)
+        for owner_id, slots in owner_slots.items():
+            owner_ids[slots].append(owner_id)
+        for (slots, is_aligned), ids in owner_ids.items():
+            for i in range(0, len(ids), 1000):
+                Owner.objects.filter(pk__in=ids[i:i + 1000]).update(**{
+                    slots_field: slots,
+                    aligned_field: is_aligned,
+                })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courier',
+            name='working_slots',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='courier',
+            name='working_slots_aligned',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryhours',
+            name='finishes_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='deliveryhours',
+            name='starts_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_slots',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_slots_aligned',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='workinghours',
+            name='finishes_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='workinghours',
+            name='starts_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_minutes_and_slots,
+                             migrations.RunPython.noop),
+    ]
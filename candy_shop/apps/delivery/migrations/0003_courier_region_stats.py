@@ -0,0 +1,54 @@
+# Generated by Django 3.1.7 on 2026-10-18 04:42
+
+import datetime
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def add_region_stats(apps, schema_editor):
+    """
+    Aggregates the order history, see `services.rebuild_region_stats`
+    """
+    Order = apps.get_model('delivery', 'Order')
+    CourierRegionStats = apps.get_model('delivery', 'CourierRegionStats')
+    history = (
+        Order.objects
+             .filter(status='complete', courier__isnull=False,
+                     delivery_time__isnull=False)
+             .values('courier', 'region')
+             .annotate(Sum('delivery_time'), n_orders=Count('*'))
+             .values_list('courier', 'region',
+                          'delivery_time__sum', 'n_orders')
+    )
+    CourierRegionStats.objects.bulk_create([
+        CourierRegionStats(courier_id=courier_id,
+                           region_id=region_id,
+                           delivery_time_sum=delivery_time_sum,
+                           n_orders_complete=n_orders)
+        for courier_id, region_id, delivery_time_sum, n_orders in history
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0002_hours_minutes_and_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierRegionStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delivery_time_sum', models.DurationField(default=datetime.timedelta)),
+                ('n_orders_complete', models.PositiveIntegerField(default=0)),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='region_stats', to='delivery.courier')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='delivery.region')),
+            ],
+            options={
+                'unique_together': {('courier', 'region')},
+            },
+        ),
+        migrations.RunPython(add_region_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.7 on 2026-10-18 04:42
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def set_assigned_weight(apps, schema_editor):
+    """
+    Sums the weight of assigned orders of every courier with one UPDATE,
+    see `services.reconcile_assigned_weight`
+    """
+    Courier = apps.get_model('delivery', 'Courier')
+    Order = apps.get_model('delivery', 'Order')
+    assigned_weight = (
+        Order.objects
+             .filter(courier=OuterRef('pk'), status='assigned')
+             .order_by()
+             .values('courier')
+             .annotate(Sum('weight'))
+             .values('weight__sum')
+    )
+    Courier.objects.update(assigned_weight=Coalesce(
+        Subquery(assigned_weight), Value(Decimal(0)),
+        output_field=models.DecimalField(max_digits=6, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0003_courier_region_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courier',
+            name='assigned_weight',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=6),
+        ),
+        migrations.RunPython(set_assigned_weight, migrations.RunPython.noop),
+    ]
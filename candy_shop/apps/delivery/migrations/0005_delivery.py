@@ -0,0 +1,66 @@
+# Generated by Django 3.1.7 on 2026-10-18 04:42
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+import django.db.models.deletion
+
+
+def add_deliveries(apps, schema_editor):
+    """
+    Orders assigned to a courier at once had the same assigned time,
+    a delivery is created for each of such groups
+    """
+    Order = apps.get_model('delivery', 'Order')
+    Delivery = apps.get_model('delivery', 'Delivery')
+    orders = Order.objects.filter(courier__isnull=False,
+                                  assigned_time__isnull=False,
+                                  status__in=['assigned', 'complete'])
+    groups = (
+        orders.order_by()
+              .values('courier', 'assigned_time')
+              .annotate(n_open=Count('pk', filter=Q(status='assigned')),
+                        n_complete=Count('pk', filter=Q(status='complete')),
+                        last_complete_time=Max('complete_time'))
+    )
+    Delivery.objects.bulk_create([
+        Delivery(courier_id=group['courier'],
+                 assigned_time=group['assigned_time'],
+                 n_orders_open=group['n_open'],
+                 n_orders_complete=group['n_complete'],
+                 last_complete_time=group['last_complete_time'])
+        for group in groups
+    ], batch_size=1000)
+    deliveries = Delivery.objects.filter(
+        courier=OuterRef('courier'), assigned_time=OuterRef('assigned_time'))
+    orders.update(delivery=Subquery(deliveries.values('pk')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0004_courier_assigned_weight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assigned_time', models.DateTimeField()),
+                ('n_orders_open', models.PositiveIntegerField(default=0)),
+                ('n_orders_complete', models.PositiveIntegerField(default=0)),
+                ('last_complete_time', models.DateTimeField(blank=True, null=True)),
+                ('courier', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='delivery.courier')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='delivery.delivery'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['courier', 'n_orders_open'], name='delivery_courier_open_idx'),
+        ),
+        migrations.RunPython(add_deliveries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.7 on 2026-10-18 04:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0005_delivery'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deliveryhours',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='delivery_hours', to='delivery.order'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='courier',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='delivery.courier'),
+        ),
+        migrations.AlterField(
+            model_name='workinghours',
+            name='courier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='delivery.courier'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryhours',
+            index=models.Index(fields=['order', 'starts_minute', 'finishes_minute'], name='delivery_hours_bounds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(status='open'), fields=['region', 'weight'], name='order_open_region_weight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['courier', 'status'], name='order_courier_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workinghours',
+            index=models.Index(fields=['courier', 'starts_minute', 'finishes_minute'], name='working_hours_bounds_idx'),
+        ),
+    ]
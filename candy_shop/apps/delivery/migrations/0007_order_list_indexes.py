@@ -0,0 +1,27 @@
+# Generated by Django 3.1.7 on 2026-10-18 04:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0006_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='region',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='delivery.region'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['region', 'status', 'order_id'], name='order_region_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['assigned_time'], name='order_assigned_time_idx'),
+        ),
+    ]
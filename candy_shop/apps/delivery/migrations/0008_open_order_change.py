@@ -0,0 +1,21 @@
+# Generated by Django 3.1.7 on 2026-10-18 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0007_order_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenOrderChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField()),
+                ('is_open', models.BooleanField()),
+            ],
+        ),
+    ]
@@ -1,7 +1,54 @@
+import csv
+import io
+from datetime import timedelta
 from decimal import Decimal
 
-from django.db import models
-from django.db.models import QuerySet, Q, Avg, Min, Count, Case, When, F, Sum
+from django.db import models, connections, transaction
+from django.db.models import (QuerySet, Q, Avg, Min, F, Count,
+                              Sum, Exists, OuterRef, Subquery)
+from django.db.models.functions import Coalesce
+
+from .signals import open_orders_changed
+
+
+class DeliveryQuerySet(QuerySet):
+    def bulk_insert(self, objs):
+        """
+        Inserts all `objs` with a single statement:
+        COPY on PostgreSQL and a multi-row INSERT on other backends.
+        Like `bulk_create` it neither calls `save()` nor sends signals,
+        autoincrement primary keys are not set on the instances
+        """
+        objs = list(objs)
+        self._for_write = True
+        connection = connections[self.db]
+        if not objs or connection.vendor != 'postgresql':
+            return self.bulk_create(objs)
+
+        opts = self.model._meta
+        fields = [
+            f for f in opts.concrete_fields
+            if not (f.primary_key and getattr(objs[0], f.attname) is None)
+        ]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objs:
+            # None is written as an unquoted empty string, i.e. NULL
+            writer.writerow([
+                f.get_db_prep_save(f.pre_save(obj, True), connection)
+                for f in fields
+            ])
+            obj._state.adding = False
+            obj._state.db = self.db
+        buffer.seek(0)
+
+        sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            connection.ops.quote_name(opts.db_table),
+            ', '.join(connection.ops.quote_name(f.column) for f in fields),
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+        return objs
 
 
 class Region(models.Model):
@@ -11,9 +58,26 @@ class Region(models.Model):
 class Hours(models.Model):
     regex = r'^(2[0-3]|[01]\d):([0-5]\d)-(2[0-3]|[01]\d):([0-5]\d)$'
     time_format = r'%H:%M'
+    # a day is split into 48 slots, so that a set of slots
+    # can be stored as a bitmask in one BIGINT column
+    slot_minutes = 30
+    day_minutes = 24 * 60
 
     starts_at = models.TimeField()
     finishes_at = models.TimeField()
+    # the same bounds as minutes since midnight,
+    # hours finishing before they start finish on the next day,
+    # e.g. 22:00-02:00 are 1320-1560
+    starts_minute = models.PositiveSmallIntegerField()
+    finishes_minute = models.PositiveSmallIntegerField()
+
+    objects = DeliveryQuerySet.as_manager()
+
+    # the foreign key to the owner of the hours and the owner's fields
+    # with `get_slots_of` of all its hours
+    owner_field = None
+    slots_field = None
+    slots_aligned_field = None
 
     class Meta:
         abstract = True
@@ -25,12 +89,187 @@ class Hours(models.Model):
                 it is assumed that string is validated
         """
         starts_at, finishes_at = string.split('-')
-        return cls(starts_at=starts_at, finishes_at=finishes_at)
+        instance = cls(starts_at=starts_at, finishes_at=finishes_at)
+        instance.set_minutes()
+        return instance
+
+    @staticmethod
+    def to_minutes(value):
+        """
+        value: `datetime.time` or a string with format `HH:MM`
+        """
+        if isinstance(value, str):
+            hours, minutes = value.split(':')[:2]
+            return int(hours) * 60 + int(minutes)
+        return value.hour * 60 + value.minute
+
+    def set_minutes(self):
+        self.starts_minute = self.to_minutes(self.starts_at)
+        self.finishes_minute = self.to_minutes(self.finishes_at)
+        if self.finishes_minute < self.starts_minute:
+            self.finishes_minute += self.day_minutes
+
+    def get_owner_id(self):
+        return getattr(self, self.owner_field + '_id')
+
+    def save(self, *args, **kwargs):
+        """
+        Services insert hours in bulk and set the owner's slots themselves,
+        saving single hours, e.g. in admin, updates the slots of the owners
+        """
+        self.set_minutes()
+        with transaction.atomic():
+            owner_ids = {self.get_owner_id()}
+            if self.pk is not None:
+                # the hours may be moved from another owner
+                owner_ids.update(
+                    type(self).objects
+                              .filter(pk=self.pk)
+                              .values_list(self.owner_field, flat=True))
+            super().save(*args, **kwargs)
+            self.update_slots_of(owner_ids)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.update_slots_of([self.get_owner_id()])
+        return result
+
+    @classmethod
+    def update_slots_of(cls, owner_ids):
+        """
+        Recomputes the slots of the owners from all their hours
+        """
+        owner_ids = set(owner_ids)
+        hours = {owner_id: [] for owner_id in owner_ids}
+        for h in (cls.objects
+                     .filter(**{cls.owner_field + '__in': owner_ids})
+                     .only(cls.owner_field, 'starts_minute',
+                           'finishes_minute')):
+            hours[h.get_owner_id()].append(h)
+        owner_model = cls._meta.get_field(cls.owner_field).related_model
+        for owner_id, owner_hours in hours.items():
+            slots, is_aligned = cls.get_slots_of(owner_hours)
+            owner_model.objects.filter(pk=owner_id).update(**{
+                cls.slots_field: slots,
+                cls.slots_aligned_field: is_aligned,
+            })
+
+    @classmethod
+    def get_slots_between(cls, starts_minute, finishes_minute):
+        first = starts_minute // cls.slot_minutes
+        last = -(-finishes_minute // cls.slot_minutes)
+        return (1 << last) - (1 << first)
+
+    def get_slots(self):
+        """
+        Returns a bitmask of the slots the hours intersect
+        and whether the hours are aligned to slot bounds,
+        hours finishing on the next day are split at midnight
+        """
+        if self.starts_minute >= self.finishes_minute:
+            return 0, True
+        slots = self.get_slots_between(
+            self.starts_minute, min(self.finishes_minute, self.day_minutes))
+        if self.finishes_minute > self.day_minutes:
+            slots |= self.get_slots_between(
+                0, self.finishes_minute - self.day_minutes)
+        is_aligned = (self.starts_minute % self.slot_minutes == 0 and
+                      self.finishes_minute % self.slot_minutes == 0)
+        return slots, is_aligned
+
+    @classmethod
+    def get_slots_of(cls, hours):
+        """
+        Returns a bitmask of the slots intersected by any of `hours`
+        and whether all of them are aligned to slot bounds.
+        If either of two sets of hours is aligned, the sets overlap
+        exactly when their bitmasks intersect
+        """
+        slots = 0
+        is_aligned = True
+        for h in hours:
+            h_slots, h_is_aligned = h.get_slots()
+            slots |= h_slots
+            is_aligned = is_aligned and h_is_aligned
+        return slots, is_aligned
+
+    @classmethod
+    def overlap(cls, hours, other_hours):
+        """
+        hours, other_hours: lists of (starts_minute, finishes_minute),
+        hours finishing on the next day overlap the others
+        on that day too, see `get_overlap_q`
+        """
+        day = cls.day_minutes
+        return any(
+            starts < other_finishes and finishes > other_starts or
+            finishes > other_starts + day or
+            other_finishes > starts + day
+            for starts, finishes in hours
+            for other_starts, other_finishes in other_hours
+        )
+
+    @classmethod
+    def get_overlap_q(cls, starts_minute, finishes_minute):
+        """
+        A filter of hours overlapping the given ones, the same as `overlap`
+        """
+        day = cls.day_minutes
+        q = (Q(starts_minute__lt=finishes_minute,
+               finishes_minute__gt=starts_minute) |
+             Q(finishes_minute__gt=starts_minute + day))
+        if finishes_minute > day:
+            q |= Q(starts_minute__lt=finishes_minute - day)
+        return q
 
     def __str__(self):
         return f"{self.starts_at:%H:%M}-{self.finishes_at:%H:%M}"
 
 
+class CourierQuerySet(DeliveryQuerySet):
+    def get_idle_couriers(self, region_ids):
+        """
+        Couriers working in any of the regions without assigned orders
+        """
+        return (
+            self.filter(regions__in=region_ids)
+                .exclude(orders__status=Order.OrderStatus.ASSIGNED)
+                .distinct()
+        )
+
+    def with_details(self):
+        """
+        Fetches everything shown in courier details
+        with a constant number of queries for any number of couriers:
+        regions, hours and running aggregates of the rating are prefetched,
+        the number of complete deliveries is annotated by a subquery
+        """
+        complete_deliveries = (
+            Delivery.objects
+                    .filter(Delivery.get_complete_q(), courier=OuterRef('pk'))
+                    .order_by()
+                    .values('courier')
+                    .annotate(n=Count('*'))
+                    .values('n')
+        )
+        return (
+            self.annotate(n_deliveries_complete=Coalesce(
+                    Subquery(complete_deliveries), 0))
+                .prefetch_related('regions', 'working_hours', 'region_stats')
+        )
+
+    def add_assigned_weight(self, courier_id, weight):
+        """
+        Atomically adds `weight` (a number or an expression)
+        to `Courier.assigned_weight` of the courier
+        """
+        return (
+            self.filter(pk=courier_id)
+                .update(assigned_weight=F('assigned_weight') + weight)
+        )
+
+
 class Courier(models.Model):
     courier_id = models.BigAutoField(primary_key=True)
 
@@ -48,43 +287,57 @@ class Courier(models.Model):
 
     courier_type = models.IntegerField(choices=CourierType.choices)
     regions = models.ManyToManyField(Region)
+    # see `Hours.get_slots_of`, maintained by services
+    working_slots = models.BigIntegerField(default=0)
+    working_slots_aligned = models.BooleanField(default=True)
+    # total weight of assigned orders, maintained by
+    # `CourierQuerySet.add_assigned_weight` in the same transactions
+    # which change the orders, see `services.reconcile_assigned_weight`
+    assigned_weight = models.DecimalField(
+        max_digits=6, decimal_places=2, default=Decimal(0))
+
+    objects = CourierQuerySet.as_manager()
+
+    @staticmethod
+    def get_rating(min_avg_delivery_time):
+        if min_avg_delivery_time is None:
+            return None
+        min_avg_delivery_time = min_avg_delivery_time.total_seconds()
+        min_avg_delivery_time = min(min_avg_delivery_time, 60 * 60)
+        rating = 5 * (60 * 60 - min_avg_delivery_time) / (60 * 60)
+        return round(rating, 2)
 
     @property
     def rating(self):
+        """
+        Reads running aggregates of `CourierRegionStats`,
+        i.e. takes one row per region instead of the whole order history
+        """
+        avg_delivery_times = [
+            stats.get_avg_delivery_time()
+            for stats in self.region_stats.all()
+            if stats.n_orders_complete
+        ]
+        return self.get_rating(min(avg_delivery_times, default=None))
+
+    def get_rating_from_history(self):
         q_res = (
             self.orders.all()
             .values('region')
             .annotate(Avg('delivery_time'))
             .aggregate(Min('delivery_time__avg'))
         )
-        min_avg_delivery_time = q_res['delivery_time__avg__min']
-        if min_avg_delivery_time is None:
-            return None
-        min_avg_delivery_time = min_avg_delivery_time.total_seconds()
-        min_avg_delivery_time = min(min_avg_delivery_time, 60 * 60)
-        rating = 5 * (60 * 60 - min_avg_delivery_time) / (60 * 60)
-        return round(rating, 2)
+        return self.get_rating(q_res['delivery_time__avg__min'])
 
     @property
     def earnings(self):
-        q_res = (
-            self.orders.all()
-            .values('assigned_time')
-            .annotate(
-                cnt_assigned_orders=Count('*'),
-                cnt_completed_orders=Count(
-                    Case(
-                        When(status=Order.OrderStatus.COMPLETE,
-                             then=F('status'))
-                    ))
-                )
-            .filter(cnt_assigned_orders=F('cnt_completed_orders'))
-            .aggregate(
-                n_deliviries_complete=Count('assigned_time', distinct=True))
-        )
-        n_deliviries_complete = q_res.get('n_deliviries_complete', 0)
+        # annotated by `CourierQuerySet.with_details`
+        n_deliveries_complete = getattr(self, 'n_deliveries_complete', None)
+        if n_deliveries_complete is None:
+            n_deliveries_complete = (
+                self.deliveries.filter(Delivery.get_complete_q()).count())
         C = Courier.CourierType(self.courier_type).get_earnings_coef()
-        return n_deliviries_complete * 500 * C
+        return n_deliveries_complete * 500 * C
 
     def get_orders_weight(self):
         return (
@@ -94,16 +347,26 @@ class Courier(models.Model):
         )
 
     def get_weight_balance(self):
-        current_weight = self.get_orders_weight()
-        weight_capacity = self.courier_type - (current_weight or 0)
-        return weight_capacity
+        return self.courier_type - self.assigned_weight
 
 
 class WorkingHours(Hours):
     courier = models.ForeignKey(
         Courier,
         on_delete=models.CASCADE,
-        related_name='working_hours')
+        related_name='working_hours',
+        db_index=False)
+
+    owner_field = 'courier'
+    slots_field = 'working_slots'
+    slots_aligned_field = 'working_slots_aligned'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['courier', 'starts_minute',
+                                 'finishes_minute'],
+                         name='working_hours_bounds_idx'),
+        ]
 
     @classmethod
     def from_string(cls, string, courier=None):
@@ -112,7 +375,7 @@ class WorkingHours(Hours):
         return instance
 
 
-class OrderQuerySet(QuerySet):
+class OrderQuerySet(DeliveryQuerySet):
     def get_available_orders(self,
                              courier: Courier,
                              required_status: str = 'open',
@@ -121,17 +384,121 @@ class OrderQuerySet(QuerySet):
         qs = qs.filter(status=required_status)
         if apply_weight_filter:
             qs = qs.filter(weight__lte=courier.courier_type)
-        filter_wh = None
-        for wh in courier.working_hours.all():
-            q = Q(
-                Q(delivery_hours__starts_at__lt=wh.finishes_at) &
-                Q(delivery_hours__finishes_at__gt=wh.starts_at)
-            )
-            filter_wh = filter_wh | q if filter_wh is not None else q
-        qs = qs.filter(filter_wh)
-        qs = qs.distinct()
+
+        # intersecting slots are necessary for hours to overlap,
+        # and sufficient if either side is aligned to slot bounds
+        qs = (
+            qs.annotate(matching_slots=F('delivery_slots')
+                        .bitand(courier.working_slots))
+              .filter(matching_slots__gt=0)
+        )
+        if not courier.working_slots_aligned:
+            filter_wh = Q()
+            for wh in courier.working_hours.all():
+                filter_wh |= DeliveryHours.get_overlap_q(wh.starts_minute,
+                                                         wh.finishes_minute)
+            overlapping_hours = DeliveryHours.objects.filter(
+                filter_wh, order=OuterRef('pk'))
+            qs = qs.filter(
+                Exists(overlapping_hours) | Q(delivery_slots_aligned=True))
         return qs
 
+    def lock_open(self, order_ids: list):
+        """
+        Locks those of `order_ids` which are still open
+        until the end of the transaction, skipping the ones already locked
+        by concurrent transactions instead of waiting for them.
+        Returns ids of locked orders
+        """
+        if not order_ids:
+            return []
+        return list(
+            self.filter(pk__in=order_ids, status=Order.OrderStatus.OPEN)
+                .select_for_update(skip_locked=True)
+                .values_list('pk', flat=True)
+        )
+
+    def assign(self, courier: Courier, order_ids: list, assigned_time):
+        """
+        Assigns those of `order_ids` which are still open to the courier
+        as a new delivery with one UPDATE, returns ids of assigned orders
+        """
+        if not order_ids:
+            return []
+        delivery = Delivery.objects.create(courier=courier,
+                                           assigned_time=assigned_time,
+                                           n_orders_open=len(order_ids))
+        n_assigned = (
+            self.filter(pk__in=order_ids, status=Order.OrderStatus.OPEN)
+                .update(courier=courier,
+                        delivery=delivery,
+                        status=Order.OrderStatus.ASSIGNED,
+                        assigned_time=assigned_time)
+        )
+        if not n_assigned:
+            delivery.delete()
+            return []
+        open_orders_changed.send(sender=Order, closed_ids=order_ids)
+        if n_assigned < len(order_ids):
+            # some of the orders were taken by a concurrent assignment
+            order_ids = list(
+                self.filter(delivery=delivery).values_list('pk', flat=True))
+            Delivery.objects.filter(pk=delivery.pk).update(
+                n_orders_open=n_assigned)
+        assigned_weight = (
+            self.filter(delivery=delivery)
+                .values('delivery')
+                .annotate(Sum('weight'))
+                .values('weight__sum')
+        )
+        Courier.objects.add_assigned_weight(courier.pk,
+                                            Subquery(assigned_weight))
+        return order_ids
+
+    @transaction.atomic
+    def return_to_open(self, open_time):
+        """
+        Returns assigned orders of the queryset to open with one UPDATE,
+        the couriers' assigned weight and deliveries' counters
+        are updated by one UPDATE per courier and one for all deliveries.
+        Returns ids of returned orders
+        """
+        returned = list(
+            self.filter(status=Order.OrderStatus.ASSIGNED)
+                .select_for_update()
+                .values_list('order_id', 'courier', 'delivery', 'weight')
+        )
+        if not returned:
+            return []
+        order_ids = [order_id for order_id, *_ in returned]
+        Order.objects.filter(pk__in=order_ids).update(
+            status=Order.OrderStatus.OPEN,
+            open_time=open_time,
+            assigned_time=None,
+            courier=None,
+            delivery=None)
+
+        returned_weights = {}
+        for _, courier_id, _, weight in returned:
+            returned_weights[courier_id] = (
+                returned_weights.get(courier_id, 0) + weight)
+        for courier_id, weight in returned_weights.items():
+            Courier.objects.add_assigned_weight(courier_id, -weight)
+
+        n_orders_open = (
+            Order.objects
+                 .filter(delivery=OuterRef('pk'),
+                         status=Order.OrderStatus.ASSIGNED)
+                 .values('delivery')
+                 .annotate(n_orders=Count('*'))
+                 .values('n_orders')
+        )
+        Delivery.objects.filter(
+            pk__in={delivery_id for _, _, delivery_id, _ in returned}
+        ).update(n_orders_open=Coalesce(Subquery(n_orders_open), 0))
+        open_orders_changed.send(sender=Order, opened_ids=order_ids)
+        return order_ids
+
 
 class Order(models.Model):
     objects = OrderQuerySet.as_manager()
@@ -146,9 +513,11 @@ class Order(models.Model):
 
     order_id = models.BigAutoField(primary_key=True)
     weight = models.DecimalField(max_digits=4, decimal_places=2)
-    region = models.ForeignKey(Region, on_delete=models.PROTECT)
+    region = models.ForeignKey(Region, on_delete=models.PROTECT,
+                               db_index=False)
     courier = models.ForeignKey(Courier, on_delete=models.PROTECT,
-                                related_name='orders', blank=True, null=True)
+                                related_name='orders', blank=True, null=True,
+                                db_index=False)
     status = models.CharField(max_length=10,
                               choices=OrderStatus.choices,
                               default=OrderStatus.OPEN)
@@ -156,22 +525,127 @@ class Order(models.Model):
     assigned_time = models.DateTimeField(blank=True, null=True)
     complete_time = models.DateTimeField(blank=True, null=True)
     delivery_time = models.DurationField(blank=True, null=True)
+    delivery = models.ForeignKey('Delivery', on_delete=models.SET_NULL,
+                                 related_name='orders', blank=True,
+                                 null=True)
+    # see `Hours.get_slots_of`, maintained by services
+    delivery_slots = models.BigIntegerField(default=0)
+    delivery_slots_aligned = models.BooleanField(default=True)
 
-    def return_to_open(self):
-        self.status = self.OrderStatus.OPEN
-        self.assigned_time = None
-        self.courier = None
-        self.save()
+    class Meta:
+        indexes = [
+            # candidates of `get_available_orders` and `dispatch_orders`,
+            # only a small part of all orders is open at a time
+            models.Index(fields=['region', 'weight'],
+                         condition=Q(status='open'),
+                         name='order_open_region_weight_idx'),
+            # assigned orders of a courier
+            models.Index(fields=['courier', 'status'],
+                         name='order_courier_status_idx'),
+            # pages of the orders list filtered by region and status
+            models.Index(fields=['region', 'status', 'order_id'],
+                         name='order_region_status_idx'),
+            models.Index(fields=['assigned_time'],
+                         name='order_assigned_time_idx'),
+        ]
 
 
 class DeliveryHours(Hours):
     order = models.ForeignKey(
         Order,
         on_delete=models.CASCADE,
-        related_name='delivery_hours')
+        related_name='delivery_hours',
+        db_index=False)
+
+    owner_field = 'order'
+    slots_field = 'delivery_slots'
+    slots_aligned_field = 'delivery_slots_aligned'
+
+    class Meta:
+        indexes = [
+            # the overlap subquery of `get_available_orders`
+            # is answered by the index alone
+            models.Index(fields=['order', 'starts_minute',
+                                 'finishes_minute'],
+                         name='delivery_hours_bounds_idx'),
+        ]
 
     @classmethod
     def from_string(cls, string, order=None):
         instance = super().from_string(string)
         instance.order = order
         return instance
+
+    @classmethod
+    def update_slots_of(cls, order_ids):
+        super().update_slots_of(order_ids)
+        # open orders are read again by the open order index
+        open_orders = Order.objects.filter(pk__in=order_ids,
+                                           status=Order.OrderStatus.OPEN)
+        open_ids = list(open_orders.values_list('pk', flat=True))
+        if open_ids:
+            open_orders_changed.send(sender=Order, opened_ids=open_ids)
+
+
+class Delivery(models.Model):
+    """
+    Orders assigned to a courier at once,
+    counters are maintained by `OrderQuerySet.assign`,
+    `OrderQuerySet.return_to_open` and `services.complete_order`
+    """
+    courier = models.ForeignKey(
+        Courier,
+        on_delete=models.CASCADE,
+        related_name='deliveries',
+        db_index=False)
+    assigned_time = models.DateTimeField()
+    # assigned orders which are not completed yet
+    n_orders_open = models.PositiveIntegerField(default=0)
+    n_orders_complete = models.PositiveIntegerField(default=0)
+    last_complete_time = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # complete deliveries of a courier
+            models.Index(fields=['courier', 'n_orders_open'],
+                         name='delivery_courier_open_idx'),
+        ]
+
+    @staticmethod
+    def get_complete_q():
+        # deliveries with all orders returned to open are not counted
+        return Q(n_orders_open=0, n_orders_complete__gt=0)
+
+    def get_last_complete_time(self):
+        return self.last_complete_time or self.assigned_time
+
+
+class CourierRegionStats(models.Model):
+    """
+    Running aggregates of the courier's completed orders in a region,
+    maintained by `services.complete_order`
+    """
+    courier = models.ForeignKey(
+        Courier,
+        on_delete=models.CASCADE,
+        related_name='region_stats')
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    delivery_time_sum = models.DurationField(default=timedelta)
+    n_orders_complete = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['courier', 'region']
+
+    def get_avg_delivery_time(self):
+        return self.delivery_time_sum / self.n_orders_complete
+
+
+class OpenOrderChange(models.Model):
+    """
+    A log of orders which have become open or stopped being open,
+    written in the transaction of the change,
+    see `open_orders.OpenOrderIndex`
+    """
+    id = models.BigAutoField(primary_key=True)
+    order_id = models.BigIntegerField()
+    is_open = models.BooleanField()
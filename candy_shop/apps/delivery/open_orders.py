@@ -0,0 +1,254 @@
+import bisect
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.db.models.signals import post_save
+
+from .models import Order, Hours, DeliveryHours, OpenOrderChange
+from .signals import open_orders_changed
+
+
+def iter_from(items, start):
+    return (items[i] for i in range(start, len(items)))
+
+
+def iter_slots(slots):
+    while slots:
+        low_bit = slots & -slots
+        yield low_bit.bit_length() - 1
+        slots ^= low_bit
+
+
+class OpenOrderIndex:
+    """
+    Open orders of every region and set of time slots sorted by weight,
+    kept in memory of a worker to look up assignment candidates.
+    Candidates are merged from the lists of the courier's regions
+    with slots intersecting the courier's ones, which are found
+    by every slot of the courier, so that only the heaviest of them
+    are looked through.
+    The index is built lazily. Before every lookup it catches up
+    with `OpenOrderChange` written by all workers since the last one:
+    orders which have stopped being open are removed and only
+    the ones which have become open are read from the database
+    """
+    # ids of changes missing in the log are looked for again
+    # for this number of seconds, they are either of transactions
+    # which haven't committed yet or of rolled back ones
+    gap_timeout = 60
+    # the log is pruned to this number of changes by writes and catch ups
+    # passing every `prune_every` changes, an index which is behind it
+    # is rebuilt
+    log_size = 100000
+    prune_every = 1000
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # the id of the last change of `OpenOrderChange` applied
+        self.version = None
+        # ids of missing changes -> when they were found missing
+        self.gaps = {}
+        # region -> slots bitmask -> a sorted list of (-weight, order_id)
+        self.regions = defaultdict(lambda: defaultdict(list))
+        # region -> slot -> bitmasks of the region's orders including it
+        self.slot_masks = defaultdict(lambda: defaultdict(set))
+        # order_id -> (weight, region, slots, hours if not aligned)
+        self.orders = {}
+
+    def get_candidates(self, courier, limit=None, max_weight=None):
+        """
+        The same orders as `OrderQuerySet.get_available_orders`
+        as (order_id, weight) pairs, the heaviest first.
+        Only the first `limit` candidates are looked through,
+        orders heavier than `max_weight`, by default the courier's type,
+        are skipped.
+        courier: a courier with prefetched regions and working hours
+        """
+        with self.lock:
+            if self.version is None:
+                self.rebuild()
+            else:
+                self.catch_up()
+
+            working_hours = None
+            if not courier.working_slots_aligned:
+                working_hours = [(wh.starts_minute, wh.finishes_minute)
+                                 for wh in courier.working_hours.all()]
+            if max_weight is None:
+                max_weight = courier.courier_type
+            min_key = (-max_weight, -math.inf)
+            bucket_orders = []
+            for region in courier.regions.all():
+                buckets = self.regions.get(region.pk, {})
+                slot_masks = self.slot_masks.get(region.pk, {})
+                masks = set()
+                for slot in iter_slots(courier.working_slots):
+                    masks.update(slot_masks.get(slot, ()))
+                for slots in masks:
+                    orders = buckets[slots]
+                    if orders:
+                        start = bisect.bisect_left(orders, min_key)
+                        bucket_orders.append(iter_from(orders, start))
+
+            candidates = []
+            for minus_weight, order_id in heapq.merge(*bucket_orders):
+                hours = self.orders[order_id][3]
+                if (working_hours is None or hours is None or
+                        Hours.overlap(working_hours, hours)):
+                    candidates.append((order_id, -minus_weight))
+                    if len(candidates) == limit:
+                        break
+        return candidates
+
+    def rebuild(self):
+        with self.lock:
+            # read before the orders, so that changes committed meanwhile
+            # are applied by the next catch up
+            version = OpenOrderChange.objects.aggregate(Max('pk'))['pk__max']
+            version = version or 0
+            # recent changes which haven't committed yet
+            recent_ids = set(
+                OpenOrderChange.objects
+                               .filter(pk__lte=version)
+                               .order_by('-pk')
+                               .values_list('pk', flat=True)[:self.prune_every]
+            )
+            now = time.monotonic()
+            self.gaps = {pk: now
+                         for pk in range(min(recent_ids, default=0), version)
+                         if pk not in recent_ids}
+            self.regions.clear()
+            self.slot_masks.clear()
+            self.orders.clear()
+            self._add(Order.objects.filter(status=Order.OrderStatus.OPEN))
+            self.version = version
+
+    def invalidate(self):
+        with self.lock:
+            self.version = None
+
+    def catch_up(self):
+        """
+        Applies changes committed since the last catch up
+        """
+        with self.lock:
+            new_changes = Q(pk__gte=self.version)
+            if self.gaps:
+                new_changes |= Q(pk__in=list(self.gaps))
+            changes = list(
+                OpenOrderChange.objects
+                               .filter(new_changes)
+                               .order_by('pk')
+                               .values_list('pk', 'order_id', 'is_open'))
+            change_ids = {pk for pk, _, _ in changes}
+            last_id = max(change_ids, default=self.version)
+            if ((self.version and self.version not in change_ids) or
+                    last_id - self.version > self.log_size):
+                # changes have been pruned from the log
+                return self.rebuild()
+
+            now = time.monotonic()
+            for pk in range(self.version + 1, last_id):
+                if pk not in change_ids:
+                    self.gaps[pk] = now
+            self.gaps = {pk: found_at for pk, found_at in self.gaps.items()
+                         if pk not in change_ids and
+                         now - found_at < self.gap_timeout}
+
+            # the last change of an order is the latest one, because
+            # changes of an order are serialized by the lock of its row
+            is_open = {order_id: order_is_open
+                       for pk, order_id, order_is_open in changes
+                       if pk != self.version}
+            self._remove(is_open)
+            opened_ids = [pk for pk, order_is_open in is_open.items()
+                          if order_is_open]
+            if opened_ids:
+                self._add(
+                    Order.objects.filter(pk__in=opened_ids,
+                                         status=Order.OrderStatus.OPEN))
+
+            self.prune_log(self.version, last_id)
+            self.version = last_id
+
+    @classmethod
+    def prune_log(cls, from_id, to_id):
+        """
+        Prunes the log if changes after `from_id` up to `to_id`
+        pass a multiple of `prune_every`
+        """
+        if to_id // cls.prune_every > from_id // cls.prune_every:
+            OpenOrderChange.objects.filter(
+                pk__lte=to_id - cls.log_size).delete()
+
+    def _add(self, orders):
+        orders = list(orders.values_list('order_id', 'weight', 'region',
+                                         'delivery_slots',
+                                         'delivery_slots_aligned'))
+        unaligned_ids = [o[0] for o in orders if not o[4]]
+        delivery_hours = defaultdict(list)
+        if unaligned_ids:
+            unaligned_hours = (
+                DeliveryHours.objects
+                             .filter(order__in=unaligned_ids)
+                             .values_list('order', 'starts_minute',
+                                          'finishes_minute')
+            )
+            for order_id, starts_minute, finishes_minute in unaligned_hours:
+                delivery_hours[order_id].append(
+                    (starts_minute, finishes_minute))
+
+        for order_id, weight, region, slots, slots_aligned in orders:
+            self.orders[order_id] = (
+                weight, region, slots,
+                None if slots_aligned else delivery_hours[order_id])
+            buckets = self.regions[region]
+            if slots not in buckets:
+                for slot in iter_slots(slots):
+                    self.slot_masks[region][slot].add(slots)
+            bisect.insort(buckets[slots], (-weight, order_id))
+
+    def _remove(self, order_ids):
+        for order_id in order_ids:
+            if order_id not in self.orders:
+                continue
+            weight, region, slots, _ = self.orders.pop(order_id)
+            orders = self.regions[region][slots]
+            i = bisect.bisect_left(orders, (-weight, order_id))
+            if i < len(orders) and orders[i] == (-weight, order_id):
+                del orders[i]
+
+
+open_order_index = OpenOrderIndex()
+
+
+def on_open_orders_changed(sender, opened_ids=(), closed_ids=(), **kwargs):
+    if not settings.DELIVERY_OPEN_ORDER_INDEX:
+        return
+    changes = OpenOrderChange.objects.bulk_create(
+        [OpenOrderChange(order_id=pk, is_open=True) for pk in opened_ids] +
+        [OpenOrderChange(order_id=pk, is_open=False) for pk in closed_ids])
+    if not changes:
+        return
+    # the log is pruned even if no worker catches up with it,
+    # ids of inserted rows are returned by PostgreSQL only
+    last_id = (changes[-1].pk or
+               OpenOrderChange.objects.aggregate(Max('pk'))['pk__max'])
+    OpenOrderIndex.prune_log(last_id - len(changes), last_id)
+
+
+def on_order_saved(sender, instance, **kwargs):
+    if instance.status == Order.OrderStatus.OPEN:
+        on_open_orders_changed(sender, opened_ids=[instance.pk])
+    else:
+        on_open_orders_changed(sender, closed_ids=[instance.pk])
+
+
+def connect_signals():
+    open_orders_changed.connect(on_open_orders_changed, sender=Order)
+    post_save.connect(on_order_saved, sender=Order)
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DeliveryCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key,
+    a page takes the same queries wherever it is in the list
+    """
+    ordering = 'pk'
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 1000
@@ -0,0 +1,162 @@
+import codecs
+import io
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def parse_constant(value):
+    # the same as in `rest_framework.parsers.JSONParser` with strict JSON
+    raise ParseError(f"Out of range float value {value} is not allowed")
+
+
+class FastJSONParser(JSONParser):
+    """
+    Parses the same data as `JSONParser` with orjson if it's installed,
+    documents orjson rejects are parsed by `JSONParser` for the same
+    result or error. Unlike it, integers out of the 64-bit range
+    are parsed as floats, so they fail validation of ids
+    rather than their insert
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type,
+                                 parser_context)
+
+
+class JSONStreamReader:
+    """
+    Reads a JSON document of the form `{"data": [...]}` from a binary stream
+    and yields items of the array one by one.
+    Only the current item and the unparsed part of the last read chunk
+    are kept in memory, so a payload of any size can be processed
+    """
+    whitespace = ' \t\n\r'
+    delimiters = whitespace + ',:]}'
+
+    def __init__(self, stream, encoding='utf-8',
+                 read_size=64 * 1024, max_item_size=1024 * 1024):
+        self.stream = stream
+        self.read_size = read_size
+        self.max_item_size = max_item_size
+        self.text_decoder = codecs.getincrementaldecoder(encoding)()
+        self.json_decoder = json.JSONDecoder(parse_constant=parse_constant)
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self):
+        chunk = self.stream.read(self.read_size) if self.stream else b''
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        try:
+            self.buffer += self.text_decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as e:
+            raise ParseError(f"JSON parse error - {e}")
+        self.eof = not chunk
+
+    def _skip_whitespace(self):
+        while True:
+            while (self.pos < len(self.buffer) and
+                   self.buffer[self.pos] in self.whitespace):
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return
+            self._read()
+
+    def _next_char(self, expected):
+        self._skip_whitespace()
+        char = self.buffer[self.pos:self.pos + 1]
+        if char not in expected:
+            raise ParseError(
+                f"JSON parse error - expected one of '{expected}' "
+                f"but got '{char}'")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(
+                    self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ParseError(f"JSON parse error - {e}")
+            else:
+                # a number can be cut by the end of the buffer,
+                # so the value is accepted only when a delimiter follows it
+                if self.eof or (end < len(self.buffer) and
+                                self.buffer[end] in self.delimiters):
+                    self.pos = end
+                    return value
+            if len(self.buffer) - self.pos > self.max_item_size:
+                raise ParseError("JSON parse error - an item is too large")
+            self._read()
+
+    def iter_items(self, key='data'):
+        """
+        Yields items of the `key` array, other keys are parsed and skipped.
+        Raises `ParseError` if the document is malformed
+        or does not have the `key` array
+        """
+        found = False
+        self._next_char('{')
+        self._skip_whitespace()
+        if self.buffer[self.pos:self.pos + 1] == '}':
+            self.pos += 1
+        else:
+            while True:
+                name = self._value()
+                if not isinstance(name, str):
+                    raise ParseError("JSON parse error - invalid key")
+                self._next_char(':')
+                if name == key:
+                    found = True
+                    yield from self._iter_array()
+                else:
+                    self._value()
+                if self._next_char(',}') == '}':
+                    break
+
+        self._skip_whitespace()
+        if self.pos < len(self.buffer):
+            raise ParseError("JSON parse error - extra data")
+        if not found:
+            raise ParseError(f"JSON parse error - '{key}' array is missing")
+
+    def _iter_array(self):
+        self._next_char('[')
+        self._skip_whitespace()
+        if self.buffer[self.pos:self.pos + 1] == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._next_char(',]') == ']':
+                return
+
+
+def iter_chunks(iterable, chunk_size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
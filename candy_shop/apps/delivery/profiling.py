@@ -0,0 +1,164 @@
+import cProfile
+import functools
+import json
+import os
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+from .asynchronous import HybridMiddleware, in_worker_threads
+from .metrics import get_view_name
+from .middleware import RequestCaptureMiddleware
+
+HEADER = 'HTTP_X_DELIVERY_PROFILE'
+SALT = 'candy_shop.apps.delivery.profiling'
+
+
+def get_signer():
+    return signing.TimestampSigner(key=settings.DELIVERY_PROFILE_KEY,
+                                   salt=SALT)
+
+
+def sign_path(path):
+    """
+    A value of the `X-Delivery-Profile` header which allows to profile
+    requests to `path` for `DELIVERY_PROFILE_MAX_AGE` seconds
+    """
+    return get_signer().sign(path)
+
+
+def is_signed(request):
+    value = request.META.get(HEADER)
+    if not value:
+        return False
+    try:
+        path = get_signer().unsign(
+            value, max_age=settings.DELIVERY_PROFILE_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return path == request.path
+
+
+def get_ids(request, body):
+    """
+    Ids of couriers and orders which the request is about
+    """
+    ids = []
+    match = request.resolver_match
+    if match and 'pk' in match.kwargs:
+        ids.append(('pk', match.kwargs['pk']))
+    if isinstance(body, dict):
+        ids.extend((key, body[key]) for key in ('courier_id', 'order_id')
+                   if isinstance(body.get(key), int))
+    return ids
+
+
+class AllocationTracer:
+    """
+    Traces allocations while any profiled request runs. Tracemalloc
+    is global, so it's started by the first of overlapping requests
+    and stopped by the last of them, each of which sees allocations
+    of the others too
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.n_requests = 0
+        self.started = False
+
+    @contextmanager
+    def tracing(self):
+        with self.lock:
+            if not self.n_requests:
+                # unless it's traced since the start of the process
+                self.started = not tracemalloc.is_tracing()
+                if self.started:
+                    tracemalloc.start()
+            self.n_requests += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.n_requests -= 1
+                if not self.n_requests and self.started:
+                    tracemalloc.stop()
+
+
+allocation_tracer = AllocationTracer()
+
+
+@contextmanager
+def profiling(profiler):
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Runs requests with a valid signed `X-Delivery-Profile` header
+    under cProfile and tracemalloc and writes to `DELIVERY_PROFILE_DIR`
+    the profile, which can be read with `pstats`, and the top allocations
+    made by the request. Isn't used unless `DELIVERY_PROFILE_KEY` is set
+    """
+    n_top_allocations = 30
+
+    def __init__(self, get_response):
+        if not settings.DELIVERY_PROFILE_KEY:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def handle(self, request):
+        if not is_signed(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        with self.profile(request, profiler):
+            return profiler.runcall(self.get_response, request)
+
+    async def handle_async(self, request):
+        if not is_signed(request):
+            return await self.get_response(request)
+        profiler = cProfile.Profile()
+        # views are run in worker threads, see `asynchronous.run_sync`,
+        # so they are profiled there rather than the event loop
+        with self.profile(request, profiler), \
+                in_worker_threads(functools.partial(profiling, profiler)):
+            return await self.get_response(request)
+
+    @contextmanager
+    def profile(self, request, profiler):
+        body = None
+        if RequestCaptureMiddleware.is_small(request):
+            try:
+                body = json.loads(request.body or 'null')
+            except ValueError:
+                pass
+
+        with allocation_tracer.tracing():
+            before = tracemalloc.take_snapshot()
+            yield
+            after = tracemalloc.take_snapshot()
+
+        path = self.get_path(request, body)
+        profiler.dump_stats(path + '.prof')
+        allocations = after.compare_to(before, 'lineno')
+        with open(path + '.alloc.txt', 'w') as f:
+            for stat in allocations[:self.n_top_allocations]:
+                f.write(f'{stat}\n')
+
+    @staticmethod
+    def get_path(request, body):
+        parts = [datetime.now().strftime('%Y%m%dT%H%M%S%f'),
+                 get_view_name(request)]
+        parts.extend(f'{key}{value}' for key, value in get_ids(request, body))
+        parts.append(str(os.getpid()))
+        name = re.sub(r'[^\w.-]', '_', '-'.join(parts))
+        os.makedirs(settings.DELIVERY_PROFILE_DIR, exist_ok=True)
+        return os.path.join(settings.DELIVERY_PROFILE_DIR, name)
@@ -0,0 +1,63 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate
+
+from .models import Region
+
+
+class RegionRegistry:
+    """
+    Ids of existing regions kept in memory of a worker, so that
+    resolving known regions takes no queries. The ids are loaded
+    on the first miss and reloaded on every following one.
+    Ids become known only after the transaction which has read
+    or inserted them is committed, so a rollback can't leave
+    a region known which doesn't exist
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.region_ids = frozenset()
+
+    def get_or_create(self, region_ids):
+        """
+        Inserts unknown `region_ids` with a single statement
+        """
+        region_ids = set(region_ids)
+        if region_ids <= self.region_ids:
+            return
+        existing_ids = set(Region.objects.values_list('pk', flat=True))
+        missing_ids = region_ids - existing_ids
+        if missing_ids:
+            Region.objects.bulk_create([Region(pk=r) for r in missing_ids],
+                                       ignore_conflicts=True)
+        transaction.on_commit(lambda: self.add(existing_ids | region_ids))
+
+    def add(self, region_ids):
+        with self.lock:
+            self.region_ids = self.region_ids | region_ids
+
+    def discard(self, region_ids):
+        with self.lock:
+            self.region_ids = self.region_ids - set(region_ids)
+
+    def clear(self):
+        with self.lock:
+            self.region_ids = frozenset()
+
+
+region_registry = RegionRegistry()
+
+
+def on_region_deleted(sender, instance, **kwargs):
+    region_registry.discard([instance.pk])
+
+
+def on_migrated(sender, **kwargs):
+    # tables are also flushed with `post_migrate`
+    region_registry.clear()
+
+
+def connect_signals():
+    post_delete.connect(on_region_deleted, sender=Region)
+    post_migrate.connect(on_migrated)
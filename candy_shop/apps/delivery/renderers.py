@@ -0,0 +1,41 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    # dates and times are passed to the encoder of DRF to be formatted
+    # as it does, subclasses of str, int, dict and list,
+    # e.g. `ReturnList` and `ErrorDetail`, are serialized natively
+    ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME |
+                      orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders the same bytes as `JSONRenderer` with orjson if it's installed.
+    Types orjson doesn't serialize, e.g. `Decimal`, are converted by
+    the encoder of DRF and data orjson refuses to render are rendered
+    by `JSONRenderer`. Unlike it, floats which Python writes in exponent
+    notation, e.g. `1e-05`, are written without it or as `1e16`
+    and non-finite floats are rendered as null rather than refused,
+    the API renders neither
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or
+                self.ensure_ascii or not self.strict or
+                self.get_indent(accepted_media_type,
+                                renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # escaped by `JSONRenderer` for JavaScript
+        return (ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+                   .replace(b'\xe2\x80\xa9', b'\\u2029'))
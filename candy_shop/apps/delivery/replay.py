@@ -0,0 +1,174 @@
+import json
+import math
+import queue
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+
+def read_requests(lines):
+    """
+    Parses a JSONL log of requests, every line is an object with
+    `method`, `path`, optional `body` and optional `time`,
+    which is a timestamp in seconds used to pace the replay
+    """
+    for line in lines:
+        line = line.strip()
+        if line:
+            record = json.loads(line)
+            yield {
+                'method': record['method'].upper(),
+                'path': record['path'],
+                'body': record.get('body'),
+                'time': record.get('time'),
+            }
+
+
+def get_endpoint(method, path):
+    """
+    Groups requests by method and path with ids replaced by `{id}`
+    """
+    path = re.sub(r'/\d+(?=/|$)', '/{id}', path.split('?')[0])
+    return f'{method} {path}'
+
+
+class InProcessClient:
+    """
+    Sends requests through the Django test client in the current process
+    and counts the queries made by every request
+    """
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def send(self, method, path, body):
+        data = json.dumps(body) if body is not None else ''
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.generic(
+                method, path, data, content_type='application/json')
+        return response.status_code, len(ctx.captured_queries)
+
+    def close(self):
+        connection.close()
+
+
+class HttpClient:
+    """
+    Sends requests to a live server, queries can't be counted
+    """
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def send(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as r:
+                r.read()
+                return r.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def close(self):
+        pass
+
+
+def replay(requests, get_client, concurrency=1, speedup=0):
+    """
+    Sends `requests` from `concurrency` threads in the order of the log.
+    With a positive `speedup` requests which have `time` are sent
+    no earlier than at their offset from the first request
+    divided by `speedup`, otherwise they are sent as fast as possible.
+    get_client: a callable creating a client for every thread
+    Returns a list of (endpoint, status code, latency, number of queries)
+    and the total time in seconds
+    """
+    tasks = queue.Queue()
+    first_time = None
+    for request in requests:
+        delay = 0
+        if speedup > 0 and request['time'] is not None:
+            if first_time is None:
+                first_time = request['time']
+            delay = (request['time'] - first_time) / speedup
+        tasks.put((delay, request))
+
+    results = []
+    results_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def work():
+        client = get_client()
+        try:
+            while True:
+                try:
+                    delay, request = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                wait = started + delay - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                request_started = time.perf_counter()
+                status_code, n_queries = client.send(
+                    request['method'], request['path'], request['body'])
+                latency = time.perf_counter() - request_started
+                with results_lock:
+                    results.append((
+                        get_endpoint(request['method'], request['path']),
+                        status_code, latency, n_queries))
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def percentile(values, p):
+    """
+    The nearest-rank percentile of sorted `values`
+    """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(results, total_time):
+    """
+    Throughput of the replay and latency percentiles in milliseconds,
+    the number of errors and the mean number of queries per endpoint
+    """
+    by_endpoint = defaultdict(list)
+    for endpoint, *result in results:
+        by_endpoint[endpoint].append(result)
+
+    endpoints = {}
+    for endpoint, endpoint_results in sorted(by_endpoint.items()):
+        latencies = sorted(latency for _, latency, _ in endpoint_results)
+        n_queries = [n for _, _, n in endpoint_results if n is not None]
+        endpoints[endpoint] = {
+            'requests': len(endpoint_results),
+            'errors': sum(status_code >= 400
+                          for status_code, _, _ in endpoint_results),
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'queries': (sum(n_queries) / len(n_queries)
+                        if n_queries else None),
+        }
+    return {
+        'requests': len(results),
+        'seconds': total_time,
+        'throughput': len(results) / total_time if total_time else None,
+        'endpoints': endpoints,
+    }
@@ -0,0 +1,207 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Courier, Order, Delivery
+from .services import (create_couriers, create_orders,
+                       rebuild_region_stats, reconcile_assigned_weight)
+
+# shifts of couriers and delivery windows of orders
+# (starts at, duration in minutes), some of them aren't aligned to slots
+WINDOWS = [
+    ('08:00', 240), ('09:00', 540), ('10:00', 150), ('12:00', 360),
+    ('14:00', 240), ('16:00', 300), ('18:00', 240), ('08:15', 210),
+    ('11:45', 105), ('19:10', 140),
+]
+
+
+def get_hours(rnd, max_windows):
+    hours = []
+    windows = rnd.sample(WINDOWS, rnd.randint(1, max_windows))
+    for starts_at, minutes in windows:
+        h, m = map(int, starts_at.split(':'))
+        finishes_minute = min(h * 60 + m + minutes, 23 * 60 + 59)
+        hours.append(f'{starts_at}-{finishes_minute // 60:02}:'
+                     f'{finishes_minute % 60:02}')
+    return hours
+
+
+def get_next_pk(model):
+    last_pk = model.objects.order_by('-pk').values_list('pk', flat=True)
+    return (last_pk.first() or 0) + 1
+
+
+def get_weight(rnd):
+    # most orders are light, a few are close to the maximum
+    weight = Decimal(rnd.expovariate(1 / 5)).quantize(Order.MIN_WEIGHT)
+    return min(max(weight, Order.MIN_WEIGHT), Order.MAX_WEIGHT)
+
+
+class DatasetGenerator:
+    """
+    Generates couriers, orders and their history through the same
+    bulk paths as the API: `create_couriers` and `create_orders`.
+    Of all orders `complete_share` are delivered by couriers working
+    in their regions in deliveries of up to `max_delivery_size` orders,
+    `assigned_share` are assigned within the couriers' capacity,
+    the rest are open. Running aggregates are rebuilt in the end
+    """
+    max_delivery_size = 5
+
+    def __init__(self, n_couriers, n_orders, n_regions,
+                 complete_share=0.5, assigned_share=0.05,
+                 chunk_size=10000, seed=0):
+        self.n_couriers = n_couriers
+        self.n_orders = n_orders
+        self.n_regions = n_regions
+        self.complete_share = complete_share
+        self.assigned_share = assigned_share
+        self.chunk_size = chunk_size
+        self.rnd = random.Random(seed)
+        self.now = timezone.now()
+
+    def generate(self, log=None):
+        log = log or (lambda message: None)
+        first_courier_id = get_next_pk(Courier)
+        first_order_id = get_next_pk(Order)
+        self.next_delivery_id = get_next_pk(Delivery)
+
+        region_couriers = defaultdict(list)
+        courier_types = {}
+        for start in range(0, self.n_couriers, self.chunk_size):
+            stop = min(start + self.chunk_size, self.n_couriers)
+            data = self.get_couriers(first_courier_id + start,
+                                     first_courier_id + stop)
+            for d in data:
+                courier_types[d['courier_id']] = d['courier_type']
+                for region in d['regions']:
+                    region_couriers[region].append(d['courier_id'])
+            with transaction.atomic():
+                create_couriers(data)
+            log(f"Created {stop} couriers")
+
+        # deliveries of assigned orders are open until the end
+        self.open_deliveries = {}
+        self.capacity = dict(courier_types)
+        for start in range(0, self.n_orders, self.chunk_size):
+            stop = min(start + self.chunk_size, self.n_orders)
+            with transaction.atomic():
+                self.create_orders(first_order_id + start,
+                                   first_order_id + stop,
+                                   region_couriers)
+            log(f"Created {stop} orders")
+
+        with transaction.atomic():
+            self.update_open_deliveries()
+            self.reset_sequences()
+            reconcile_assigned_weight(repair=True)
+            rebuild_region_stats()
+        log("Rebuilt running aggregates")
+
+    def get_couriers(self, first_id, stop_id):
+        data = []
+        for courier_id in range(first_id, stop_id):
+            n_regions = min(self.rnd.randint(1, 3), self.n_regions)
+            data.append({
+                'courier_id': courier_id,
+                'courier_type': self.rnd.choice(Courier.CourierType.values),
+                'regions': self.rnd.sample(range(1, self.n_regions + 1),
+                                           n_regions),
+                'working_hours': get_hours(self.rnd, 2),
+            })
+        return data
+
+    def create_orders(self, first_id, stop_id, region_couriers):
+        complete_deliveries = {}
+        deliveries = []
+        data = []
+        for order_id in range(first_id, stop_id):
+            d = {
+                'order_id': order_id,
+                'weight': get_weight(self.rnd),
+                'region': self.rnd.randint(1, self.n_regions),
+                'delivery_hours': get_hours(self.rnd, 2),
+            }
+            couriers = region_couriers.get(d['region'])
+            state = self.rnd.random()
+            if couriers and state < self.complete_share:
+                courier_id = self.rnd.choice(couriers)
+                delivery = complete_deliveries.get(courier_id)
+                if (delivery is None or
+                        delivery.n_orders_complete >= self.max_delivery_size
+                        or self.rnd.random() < 0.3):
+                    delivery = self.new_delivery(
+                        courier_id,
+                        self.now - timedelta(minutes=self.rnd.randint(
+                            6 * 60, 30 * 24 * 60)))
+                    complete_deliveries[courier_id] = delivery
+                    deliveries.append(delivery)
+                complete_time = delivery.last_complete_time + timedelta(
+                    minutes=self.rnd.randint(5, 60))
+                d.update(status=Order.OrderStatus.COMPLETE,
+                         courier_id=courier_id,
+                         delivery_id=delivery.pk,
+                         assigned_time=delivery.assigned_time,
+                         complete_time=complete_time,
+                         delivery_time=(complete_time -
+                                        delivery.last_complete_time))
+                delivery.n_orders_complete += 1
+                delivery.last_complete_time = complete_time
+            elif (couriers and
+                  state < self.complete_share + self.assigned_share):
+                courier_id = self.rnd.choice(couriers)
+                if self.capacity[courier_id] >= d['weight']:
+                    self.capacity[courier_id] -= d['weight']
+                    delivery = self.open_deliveries.get(courier_id)
+                    if delivery is None:
+                        delivery = self.new_delivery(courier_id, self.now)
+                        self.open_deliveries[courier_id] = delivery
+                        deliveries.append(delivery)
+                    d.update(status=Order.OrderStatus.ASSIGNED,
+                             courier_id=courier_id,
+                             delivery_id=delivery.pk,
+                             assigned_time=delivery.assigned_time)
+            data.append(d)
+
+        for delivery in deliveries:
+            if not delivery.n_orders_complete:
+                delivery.last_complete_time = None
+        Delivery.objects.bulk_create(deliveries)
+        create_orders(data)
+
+    def new_delivery(self, courier_id, assigned_time):
+        delivery = Delivery(pk=self.next_delivery_id,
+                            courier_id=courier_id,
+                            assigned_time=assigned_time,
+                            last_complete_time=assigned_time)
+        self.next_delivery_id += 1
+        return delivery
+
+    @staticmethod
+    def reset_sequences():
+        # deliveries are inserted with explicit primary keys
+        # which don't advance sequences of PostgreSQL
+        sql = connection.ops.sequence_reset_sql(no_style(), [Delivery])
+        with connection.cursor() as cursor:
+            for statement in sql:
+                cursor.execute(statement)
+
+    @staticmethod
+    def update_open_deliveries():
+        n_orders_open = (
+            Order.objects
+                 .filter(delivery=OuterRef('pk'),
+                         status=Order.OrderStatus.ASSIGNED)
+                 .values('delivery')
+                 .annotate(n_orders=Count('*'))
+                 .values('n_orders')
+        )
+        Delivery.objects.filter(n_orders_complete=0).update(
+            n_orders_open=Coalesce(Subquery(n_orders_open), 0))
@@ -1,7 +1,10 @@
 from rest_framework import serializers
-from .models import Courier, WorkingHours, Order
-from .validators import RegexValidator, IntervalValidator
-from .services import create_courier, update_courier, create_order
+from .models import Courier, WorkingHours, Order, DeliveryHours
+from .validators import (RegexValidator, IntervalValidator, PayloadValidator,
+                         to_integer, to_decimal, to_choice, to_string,
+                         to_list)
+from .services import (create_courier, create_couriers, update_courier,
+                       create_order, create_orders)
 from django.db.models.manager import Manager
 import logging
 
@@ -31,6 +34,8 @@ class ChoiceField(serializers.ChoiceField):
 
 class HoursField(serializers.StringRelatedField):
     def to_internal_value(self, data):
+        # validators are not run for items of a many=True related field
+        self.run_validators(data)
         return data
 
 
@@ -54,32 +59,70 @@ class RegionsField(serializers.ListField):
         return super().run_validation(initial_data)
 
 
-class DeliveryModelSerializer(serializers.ModelSerializer):
-    def get_initial_data_keys(self):
-        if isinstance(self.initial_data, dict):
-            return self.initial_data.keys()
-        elif (isinstance(self.initial_data, list) and
-              isinstance(self.initial_data[0], dict)):
-            return self.initial_data[0].keys()
+class DeliveryListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of objects, rejects ids which are repeated
+    in the batch or already exist, and creates the whole batch at once
+    through `create_many` of the child serializer
+    """
+    def get_duplicate_ids(self, ids):
+        model = self.child.Meta.model
+        duplicates = set(
+            model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        seen = set()
+        for i in ids:
+            if i in seen:
+                duplicates.add(i)
+            seen.add(i)
+        return duplicates
+
+    def to_internal_value(self, data):
+        payload_validator = getattr(self.child, 'payload_validator', None)
+        if payload_validator is not None and isinstance(data, list):
+            validated_data, errors = payload_validator(data)
+            if any(errors):
+                raise serializers.ValidationError(errors)
         else:
-            raise serializers.ValidationError("Invalid data passed")
+            validated_data = super().to_internal_value(data)
+
+        pk_name = self.child.Meta.model._meta.pk.name
+        ids = [item[pk_name] for item in validated_data]
+        duplicates = self.get_duplicate_ids(ids)
+        if duplicates:
+            errors = []
+            for i in ids:
+                if i in duplicates:
+                    errors.append({'id': i})
+                    # every duplicated id is reported once
+                    duplicates.remove(i)
+                else:
+                    errors.append({})
+            raise serializers.ValidationError(errors)
+        return validated_data
+
+    def create(self, validated_data):
+        return self.child.create_many(validated_data)
 
-    def validate(self, data):
-        if hasattr(self, 'initial_data'):
-            unknown_keys = (set(self.get_initial_data_keys()) -
-                            set(self.fields.keys()))
-            if unknown_keys:
-                msg = "Got unknown fields: {}".format(unknown_keys)
-                raise serializers.ValidationError(msg)
-        return data
+
+class DeliveryModelSerializer(serializers.ModelSerializer):
+    def validate_keys(self, initial_data):
+        if not isinstance(initial_data, dict):
+            raise serializers.ValidationError("Invalid data passed")
+        unknown_keys = set(initial_data.keys()) - set(self.fields.keys())
+        if unknown_keys:
+            msg = "Got unknown fields: {}".format(unknown_keys)
+            raise serializers.ValidationError(msg)
 
     def run_validation(self, initial_data, id_field):
         try:
+            self.validate_keys(initial_data)
             return super().run_validation(initial_data)
         except serializers.ValidationError as e:
             # it is not the best practice, but required by the task
             logging.error(e, exc_info=True)
-            err_data = {'id': initial_data.get(id_field, None)}
+            err_data = {'id': None}
+            if isinstance(initial_data, dict):
+                err_data['id'] = initial_data.get(id_field, None)
             raise serializers.ValidationError(err_data)
 
 
@@ -90,13 +133,26 @@ class CourierSerializer(DeliveryModelSerializer):
     courier_id = serializers.IntegerField()
     courier_type = ChoiceField(Courier.CourierType.choices)
 
+    payload_validator = PayloadValidator(
+        'courier_id',
+        courier_id=to_integer(),
+        courier_type=to_choice(Courier.CourierType.choices),
+        regions=to_list(to_integer(min_value=1)),
+        working_hours=to_list(to_string(WorkingHours.regex),
+                              allow_mapping=True),
+    )
+
     class Meta:
         model = Courier
         fields = ['courier_id', 'courier_type', 'regions', 'working_hours']
+        list_serializer_class = DeliveryListSerializer
 
     def create(self, validated_data):
         return create_courier(validated_data)
 
+    def create_many(self, validated_data):
+        return create_couriers(validated_data)
+
     def update(self, instance, validated_data):
         return update_courier(instance, validated_data)
 
@@ -108,13 +164,17 @@ class SingleRegionField(serializers.IntegerField):
     def __init__(self):
         super().__init__(min_value=1)
 
+    def get_attribute(self, instance):
+        # doesn't fetch the region
+        return instance.region_id
+
     def to_representation(self, value):
-        return int(value.pk)
+        return int(value)
 
 
 class OrderSerializer(DeliveryModelSerializer):
     delivery_hours = HoursField(
-        many=True, validators=[RegexValidator(WorkingHours.regex)])
+        many=True, validators=[RegexValidator(DeliveryHours.regex)])
     order_id = serializers.IntegerField()
     weight = serializers.DecimalField(
         max_digits=Order._meta.get_field('weight').max_digits,
@@ -123,17 +183,63 @@ class OrderSerializer(DeliveryModelSerializer):
                                       right=Order.MAX_WEIGHT)])
     region = SingleRegionField()
 
+    payload_validator = PayloadValidator(
+        'order_id',
+        order_id=to_integer(),
+        weight=to_decimal(
+            max_digits=Order._meta.get_field('weight').max_digits,
+            decimal_places=Order._meta.get_field('weight').decimal_places,
+            left=Order.MIN_WEIGHT,
+            right=Order.MAX_WEIGHT),
+        region=to_integer(min_value=1),
+        delivery_hours=to_list(to_string(DeliveryHours.regex),
+                               allow_mapping=True),
+    )
+
     class Meta:
         model = Order
         fields = ['order_id', 'weight', 'region', 'delivery_hours']
+        list_serializer_class = DeliveryListSerializer
 
     def create(self, validated_data):
         return create_order(validated_data)
 
+    def create_many(self, validated_data):
+        return create_orders(validated_data)
+
     def run_validation(self, initial_data):
         return super().run_validation(initial_data, 'order_id')
 
 
+class OrderFilterSerializer(serializers.Serializer):
+    """
+    Validates query parameters of the orders list,
+    `status` and `region` may be repeated
+    """
+    status = serializers.ListField(
+        child=serializers.ChoiceField(choices=Order.OrderStatus.choices),
+        required=False)
+    region = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False)
+    courier = serializers.IntegerField(min_value=1, required=False)
+    assigned_after = serializers.DateTimeField(required=False)
+    assigned_before = serializers.DateTimeField(required=False)
+
+    lookups = {
+        'status': 'status__in',
+        'region': 'region__in',
+        'courier': 'courier',
+        'assigned_after': 'assigned_time__gte',
+        'assigned_before': 'assigned_time__lt',
+    }
+
+    def get_lookups(self):
+        return {
+            self.lookups[name]: value
+            for name, value in self.validated_data.items()
+        }
+
+
 class AssignSerializer(serializers.Serializer):
     courier_id = serializers.PrimaryKeyRelatedField(
         queryset=Courier.objects
@@ -141,6 +247,37 @@ class AssignSerializer(serializers.Serializer):
                         .prefetch_related('regions', 'working_hours'))
 
 
+class DispatchSerializer(serializers.Serializer):
+    """
+    Accepts either ids of couriers or regions,
+    in the latter case all idle couriers of the regions are taken
+    """
+    courier_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+    regions = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False)
+
+    def validate(self, data):
+        if ('courier_ids' in data) == ('regions' in data):
+            msg = "Either courier_ids or regions is required"
+            raise serializers.ValidationError(msg)
+
+        if 'courier_ids' in data:
+            couriers = Courier.objects.filter(pk__in=data['courier_ids'])
+        else:
+            couriers = Courier.objects.get_idle_couriers(data['regions'])
+        couriers = list(
+            couriers.prefetch_related('regions', 'working_hours'))
+
+        if 'courier_ids' in data:
+            unknown_ids = set(data['courier_ids']) - {c.pk for c in couriers}
+            if unknown_ids:
+                msg = "Got unknown couriers: {}".format(unknown_ids)
+                raise serializers.ValidationError(msg)
+        data['couriers'] = couriers
+        return data
+
+
 class CompleteOrderSerializer(serializers.Serializer):
     courier_id = serializers.PrimaryKeyRelatedField(
         queryset=Courier.objects.all())
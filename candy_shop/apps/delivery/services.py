@@ -1,120 +1,418 @@
+from collections import defaultdict
+from django.conf import settings
 from django.utils import timezone
-from django.core.paginator import Paginator
 from django.db import transaction
-from .models import Order, Courier, Region, WorkingHours, DeliveryHours
-from django.db.models import Max
+from rest_framework.exceptions import ValidationError
+from .assignment import AssignmentStrategy, get_assignment_strategy
+from .models import (Order, Courier, Hours, WorkingHours,
+                     DeliveryHours, Delivery, CourierRegionStats)
+from django.db.models import Sum, Count, Q
+from .open_orders import open_order_index
+from .regions import region_registry
+from .signals import open_orders_changed
+from .tracing import traced
 
 
+@traced
 @transaction.atomic
-def assign_orders(courier):
-    available_orders = (
-        Order.objects
-             .get_available_orders(courier)
-             .order_by('-weight')
-    )
-
-    selected_orders = []
-    # chunk size can be different
-    paginator = Paginator(available_orders, per_page=5)
+def assign_orders(courier, strategy: AssignmentStrategy = None):
+    """
+    Fetches all candidate orders with one query, selects a subset
+    fitting the courier's capacity in memory and assigns it
+    with one UPDATE. Returns ids of assigned orders.
+    At most `DELIVERY_ASSIGNMENT_CANDIDATES` heaviest candidates
+    fitting the remaining capacity are locked with SKIP LOCKED
+    and the UPDATE is guarded by the order status,
+    so concurrent assignments neither wait for each other,
+    nor take all the orders from each other, nor assign an order twice.
+    With `DELIVERY_OPEN_ORDER_INDEX` candidates are taken from memory,
+    see `open_orders.OpenOrderIndex`, and are not locked
+    """
+    strategy = strategy or get_assignment_strategy()
 
     weight_capacity = courier.get_weight_balance()
     if weight_capacity < 0:
         raise ValueError("Weight capacity for the courier is negative!")
 
-    assigned_time = timezone.now()
-    for page in paginator:
-        page_break = False
+    if settings.DELIVERY_OPEN_ORDER_INDEX:
+        # orders which the index has got wrong are skipped by the UPDATE
+        candidates = open_order_index.get_candidates(
+            courier, limit=settings.DELIVERY_ASSIGNMENT_CANDIDATES,
+            max_weight=weight_capacity)
+    else:
+        candidates = (
+            Order.objects
+                 .get_available_orders(courier)
+                 .filter(weight__lte=weight_capacity)
+                 .select_for_update(skip_locked=True)
+                 .order_by('-weight', 'order_id')
+                 .values_list('order_id', 'weight')
+        )
+    candidates = list(candidates[:settings.DELIVERY_ASSIGNMENT_CANDIDATES])
+    selected_ids = [
+        order_id for order_id, _ in strategy.select(candidates,
+                                                    weight_capacity)
+    ]
+    return Order.objects.assign(courier, selected_ids, timezone.now())
 
-        for order in page.object_list:
-            if order.weight > weight_capacity:
-                page_break = True
-                break
-            else:
-                order.courier = courier
-                order.status = Order.OrderStatus.ASSIGNED
-                order.assigned_time = assigned_time
-                selected_orders.append(order)
-                weight_capacity -= order.weight
 
-        if page_break:
-            break
-    Order.objects.bulk_update(selected_orders,
-                              ['courier', 'status', 'assigned_time'])
-    return selected_orders
+@traced
+@transaction.atomic
+def dispatch_orders(couriers, strategy: AssignmentStrategy = None):
+    """
+    Assigns open orders to many couriers at once.
+    Open orders of all the couriers' regions are fetched with one query
+    and distributed in memory: couriers with fewer candidates choose first,
+    so that they don't lose their only orders to more flexible couriers.
+    Selected orders locked by concurrent transactions are skipped.
+    couriers: couriers with prefetched regions and working hours
+    Returns a dict courier_id -> ids of assigned orders
+    """
+    strategy = strategy or get_assignment_strategy()
+    couriers = list(couriers)
+
+    region_ids = {r.pk for c in couriers for r in c.regions.all()}
+    open_orders = (
+        Order.objects
+             .filter(region__in=region_ids, status=Order.OrderStatus.OPEN)
+             .values_list('order_id', 'weight', 'region',
+                          'delivery_slots', 'delivery_slots_aligned')
+    )
+    orders_by_region = defaultdict(list)
+    for order in open_orders:
+        orders_by_region[order[2]].append(order)
+
+    delivery_hours = defaultdict(list)
+    if not all(c.working_slots_aligned for c in couriers):
+        unaligned_hours = (
+            DeliveryHours.objects
+                         .filter(order__region__in=region_ids,
+                                 order__status=Order.OrderStatus.OPEN,
+                                 order__delivery_slots_aligned=False)
+                         .values_list('order', 'starts_minute',
+                                      'finishes_minute')
+        )
+        for order_id, starts_minute, finishes_minute in unaligned_hours:
+            delivery_hours[order_id].append((starts_minute, finishes_minute))
+
+    candidates = {}
+    for courier in couriers:
+        working_hours = [(wh.starts_minute, wh.finishes_minute)
+                         for wh in courier.working_hours.all()]
+        candidates[courier.pk] = [
+            (order_id, weight)
+            for region in courier.regions.all()
+            for order_id, weight, _, slots, slots_aligned
+            in orders_by_region[region.pk]
+            if weight <= courier.courier_type and
+            slots & courier.working_slots and (
+                courier.working_slots_aligned or slots_aligned or
+                Hours.overlap(working_hours, delivery_hours[order_id]))
+        ]
+
+    taken_ids = set()
+    selected_ids = {}
+    for courier in sorted(couriers, key=lambda c: len(candidates[c.pk])):
+        weight_capacity = courier.get_weight_balance()
+        available = [c for c in candidates[courier.pk]
+                     if c[0] not in taken_ids]
+        selected_ids[courier.pk] = [
+            order_id for order_id, _ in strategy.select(available,
+                                                        weight_capacity)
+        ]
+        taken_ids.update(selected_ids[courier.pk])
+
+    locked_ids = set(Order.objects.lock_open(list(taken_ids)))
+    assigned_time = timezone.now()
+    return {
+        courier.pk: Order.objects.assign(
+            courier,
+            [pk for pk in selected_ids[courier.pk] if pk in locked_ids],
+            assigned_time)
+        for courier in couriers
+    }
 
 
+@traced
+@transaction.atomic
 def complete_order(courier: Courier, order: Order):
+    """
+    Completes the order if it's still assigned to the courier.
+    The order is completed by an UPDATE guarded by its status,
+    courier and delivery, which is locked, and the counters, the courier's
+    weight and region stats are changed only if it has been completed,
+    so `order` may be stale, e.g. loaded before a concurrent completion
+    or a rebalance of the courier's orders
+    """
     if order.status == Order.OrderStatus.COMPLETE:
         return order
 
+    delivery = (
+        Delivery.objects
+                .select_for_update()
+                .filter(pk=order.delivery_id, courier=courier)
+                .first()
+    )
+    complete_time = timezone.now()
+    delivery_time = delivery and (complete_time -
+                                  delivery.get_last_complete_time())
+    n_completed = delivery and (
+        Order.objects
+             .filter(pk=order.pk,
+                     status=Order.OrderStatus.ASSIGNED,
+                     delivery=delivery)
+             .update(status=Order.OrderStatus.COMPLETE,
+                     complete_time=complete_time,
+                     delivery_time=delivery_time)
+    )
+    if not n_completed:
+        order.refresh_from_db()
+        if order.status == Order.OrderStatus.COMPLETE:
+            return order
+        raise ValidationError({'order_id': ["Order has invalid status"]})
     order.status = Order.OrderStatus.COMPLETE
-    order.complete_time = timezone.now()
+    order.complete_time = complete_time
+    order.delivery_time = delivery_time
 
-    last_complete_time = (
-        Courier.objects
-        .filter(pk=courier.pk)
-        .filter(orders__assigned_time=order.assigned_time)
-        .aggregate(Max('orders__complete_time'))
-    )['orders__complete_time__max']
-    last_complete_time = last_complete_time or order.assigned_time
-    order.delivery_time = order.complete_time - last_complete_time
-    order.save()
+    delivery.n_orders_open -= 1
+    delivery.n_orders_complete += 1
+    delivery.last_complete_time = order.complete_time
+    delivery.save()
+    Courier.objects.add_assigned_weight(courier.pk, -order.weight)
+    add_to_region_stats(courier, order)
     return order
 
 
-def create_courier(data: dict):
-    regions = data.pop('regions')
-    regions = [Region.objects.get_or_create(pk=r)[0] for r in regions]
-    working_hours = data.pop('working_hours')
+def add_to_region_stats(courier: Courier, order: Order):
+    """
+    Adds the completed order to running aggregates of the courier,
+    the row is locked until the end of the transaction
+    """
+    stats, _ = (
+        CourierRegionStats.objects
+                          .select_for_update()
+                          .get_or_create(courier=courier,
+                                         region_id=order.region_id)
+    )
+    stats.delivery_time_sum += order.delivery_time
+    stats.n_orders_complete += 1
+    stats.save()
+    return stats
 
-    courier = Courier(**data)
-    courier.save()
-    courier.regions.add(*regions)
 
-    WorkingHours.objects.bulk_create(
-        [WorkingHours.from_string(s, courier=courier) for s in working_hours])
-    return courier
+@transaction.atomic
+def rebuild_region_stats():
+    """
+    Recomputes `CourierRegionStats` of all couriers from the order history
+    """
+    CourierRegionStats.objects.all().delete()
+    history = (
+        Order.objects
+             .filter(status=Order.OrderStatus.COMPLETE)
+             .values('courier', 'region')
+             .annotate(Sum('delivery_time'), n_orders=Count('*'))
+             .values_list('courier', 'region',
+                          'delivery_time__sum', 'n_orders')
+    )
+    return CourierRegionStats.objects.bulk_create([
+        CourierRegionStats(courier_id=courier_id,
+                           region_id=region_id,
+                           delivery_time_sum=delivery_time_sum,
+                           n_orders_complete=n_orders)
+        for courier_id, region_id, delivery_time_sum, n_orders in history
+    ])
 
 
+@traced
 @transaction.atomic
-def update_courier(instance, data):
-    instance.courier_type = data.get('courier_type', instance.courier_type)
-    instance.save()
+def create_couriers(data: list):
+    """
+    Creates a batch of couriers with a fixed number of statements:
+    one for regions, one for couriers, one for the couriers' regions
+    and one for working hours
+    """
+    region_registry.get_or_create(r for d in data for r in d['regions'])
+
+    couriers = []
+    courier_regions = []
+    working_hours = []
+    CourierRegion = Courier.regions.through
+    for d in data:
+        regions = d.pop('regions')
+        hours = d.pop('working_hours')
+        courier = Courier(**d)
+        couriers.append(courier)
+        courier_regions.extend(
+            CourierRegion(courier_id=courier.pk, region_id=r)
+            for r in set(regions))
+        hours = [WorkingHours.from_string(s, courier=courier) for s in hours]
+        courier.working_slots, courier.working_slots_aligned = (
+            WorkingHours.get_slots_of(hours))
+        working_hours.extend(hours)
+
+    Courier.objects.bulk_insert(couriers)
+    CourierRegion.objects.bulk_create(courier_regions)
+    WorkingHours.objects.bulk_insert(working_hours)
+    return couriers
+
+
+def create_courier(data: dict):
+    return create_couriers([data])[0]
+
+
+@traced
+@transaction.atomic
+def update_courier(instance, data, strategy: AssignmentStrategy = None):
+    """
+    Only the changed regions and working hours are inserted or deleted,
+    the courier is saved only when its fields have changed, and its orders
+    are rebalanced only when its capacity, regions or hours are narrowed
+    """
+    update_fields = []
+    is_narrowed = False
+
+    courier_type = data.get('courier_type', instance.courier_type)
+    if courier_type != instance.courier_type:
+        is_narrowed = courier_type < instance.courier_type
+        instance.courier_type = courier_type
+        update_fields.append('courier_type')
 
     if 'regions' in data:
-        instance.regions.clear()
-        instance.regions.add(
-            *[Region.objects.get_or_create(pk=r)[0] for r in data['regions']])
+        region_ids = set(instance.regions.values_list('pk', flat=True))
+        removed_ids = region_ids - set(data['regions'])
+        added_ids = set(data['regions']) - region_ids
+        if removed_ids:
+            instance.regions.remove(*removed_ids)
+            is_narrowed = True
+        if added_ids:
+            region_registry.get_or_create(added_ids)
+            instance.regions.add(*added_ids)
 
     if 'working_hours' in data:
-        instance.working_hours.all().delete()
-        wh_instances = [
-            WorkingHours.from_string(s, courier=instance)
-            for s in data['working_hours']]
-        WorkingHours.objects.bulk_create(wh_instances)
-
-    instance.save()
-    available_orders = list(
-        instance.orders.all()
-        .get_available_orders(instance,
+        removed = list(instance.working_hours.all())
+        kept, added = [], []
+        for s in data['working_hours']:
+            wh = WorkingHours.from_string(s, courier=instance)
+            bounds = (wh.starts_minute, wh.finishes_minute)
+            same = [r for r in removed
+                    if (r.starts_minute, r.finishes_minute) == bounds]
+            if same:
+                removed.remove(same[0])
+                kept.append(same[0])
+            else:
+                added.append(wh)
+        if removed:
+            WorkingHours.objects.filter(
+                pk__in=[wh.pk for wh in removed]).delete()
+            is_narrowed = True
+        if added:
+            WorkingHours.objects.bulk_create(added)
+        if removed or added:
+            instance.working_slots, instance.working_slots_aligned = (
+                WorkingHours.get_slots_of(kept + added))
+            update_fields += ['working_slots', 'working_slots_aligned']
+
+    # `assigned_weight` is maintained by the orders' transactions
+    if update_fields:
+        instance.save(update_fields=update_fields)
+    if is_narrowed:
+        rebalance_orders(instance, strategy)
+    return instance
+
+
+@traced
+@transaction.atomic
+def rebalance_orders(courier, strategy: AssignmentStrategy = None):
+    """
+    Orders which don't match the courier's regions or hours
+    are returned to open, so are the ones not selected by the strategy
+    to fit the courier's capacity, with a single UPDATE
+    """
+    assigned_orders = list(
+        courier.orders.filter(status=Order.OrderStatus.ASSIGNED)
+                      .select_for_update()
+                      .values_list('order_id', 'weight')
+    )
+    matching_ids = set(
+        courier.orders.all()
+        .get_available_orders(courier,
                               required_status=Order.OrderStatus.ASSIGNED,
                               apply_weight_filter=False)
-        .order_by('weight')
+        .values_list('order_id', flat=True)
     )
-    weight_balance = instance.get_weight_balance()
-    while available_orders and weight_balance < 0:
-        order = available_orders.pop(0)
-        order.return_to_open()
-        weight_balance += order.weight
+    kept = [o for o in assigned_orders if o[0] in matching_ids]
+    if sum(weight for _, weight in kept) > courier.courier_type:
+        strategy = strategy or get_assignment_strategy()
+        kept = strategy.select(kept, courier.courier_type)
+    kept_ids = {order_id for order_id, _ in kept}
 
-    return instance
+    returned_ids = [order_id for order_id, _ in assigned_orders
+                    if order_id not in kept_ids]
+    if returned_ids:
+        Order.objects.filter(pk__in=returned_ids).return_to_open(
+            timezone.now())
+        courier.assigned_weight = sum(weight for _, weight in kept)
+
+
+@transaction.atomic
+def reconcile_assigned_weight(repair=True):
+    """
+    Compares `Courier.assigned_weight` with the total weight
+    of assigned orders and, if `repair`, overwrites the drifted values.
+    Returns ids of drifted couriers
+    """
+    is_assigned = Q(orders__status=Order.OrderStatus.ASSIGNED)
+
+    def get_drifted(couriers):
+        couriers = couriers.annotate(
+            orders_weight=Sum('orders__weight', filter=is_assigned))
+        return [c for c in couriers
+                if c.assigned_weight != (c.orders_weight or 0)]
+
+    drifted = get_drifted(Courier.objects.all())
+    if not drifted or not repair:
+        return [c.pk for c in drifted]
+
+    # concurrent changes of the drifted couriers wait until the repair ends
+    drifted_ids = list(
+        Courier.objects
+               .filter(pk__in=[c.pk for c in drifted])
+               .select_for_update()
+               .values_list('pk', flat=True)
+    )
+    drifted = get_drifted(Courier.objects.filter(pk__in=drifted_ids))
+    for courier in drifted:
+        courier.assigned_weight = courier.orders_weight or 0
+    Courier.objects.bulk_update(drifted, ['assigned_weight'])
+    return [c.pk for c in drifted]
+
+
+@traced
+@transaction.atomic
+def create_orders(data: list):
+    """
+    Creates a batch of orders with a fixed number of statements:
+    one for regions, one for orders and one for delivery hours
+    """
+    region_registry.get_or_create(d['region'] for d in data)
+
+    orders = []
+    delivery_hours = []
+    for d in data:
+        hours = d.pop('delivery_hours')
+        order = Order(region_id=d.pop('region'), **d)
+        orders.append(order)
+        hours = [DeliveryHours.from_string(s, order=order) for s in hours]
+        order.delivery_slots, order.delivery_slots_aligned = (
+            DeliveryHours.get_slots_of(hours))
+        delivery_hours.extend(hours)
+
+    Order.objects.bulk_insert(orders)
+    DeliveryHours.objects.bulk_insert(delivery_hours)
+    open_orders_changed.send(sender=Order,
+                             opened_ids=[o.order_id for o in orders])
+    return orders
 
 
 def create_order(data):
-    delivery_hours = data.pop('delivery_hours')
-    region = Region.objects.get_or_create(pk=data.pop('region'))[0]
-    order = Order(region=region, **data)
-    order.save()
-    DeliveryHours.objects.bulk_create(
-        [DeliveryHours.from_string(s, order=order) for s in delivery_hours])
-    return order
+    return create_orders([data])[0]
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# sent by bulk operations on orders, which don't send `post_save`
+# opened_ids: ids of orders which have become open
+# closed_ids: ids of orders which are not open anymore
+open_orders_changed = Signal()
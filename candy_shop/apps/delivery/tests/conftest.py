@@ -0,0 +1,39 @@
+import pytest
+import random
+from decimal import Decimal
+from candy_shop.apps.delivery.models import Courier
+from candy_shop.apps.delivery.services import create_couriers, create_orders
+
+
+@pytest.fixture
+def seed():
+    """
+    Creates couriers and orders with random regions 1-5, types, weights
+    and hours, some of which aren't aligned to slots, returns the couriers
+    ordered by id with prefetched regions and working hours
+    """
+    def seed(n_couriers, n_orders, max_weight=50):
+        rnd = random.Random(0)
+        hours = ['09:00-18:00', '10:00-12:30', '08:15-11:45', '14:10-22:00']
+        create_couriers([
+            {
+                'courier_id': i,
+                'courier_type': rnd.choice(Courier.CourierType.values),
+                'regions': rnd.sample(range(1, 6), 2),
+                'working_hours': rnd.sample(hours, 2),
+            }
+            for i in range(1, n_couriers + 1)
+        ])
+        create_orders([
+            {
+                'order_id': i,
+                'weight': Decimal(rnd.randint(1, max_weight * 100)) / 100,
+                'region': rnd.randint(1, 5),
+                'delivery_hours': rnd.sample(hours, rnd.randint(1, 2)),
+            }
+            for i in range(1, n_orders + 1)
+        ])
+        return list(Courier.objects
+                           .order_by('pk')
+                           .prefetch_related('regions', 'working_hours'))
+    return seed
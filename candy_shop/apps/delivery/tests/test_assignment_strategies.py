@@ -0,0 +1,139 @@
+import pytest
+import random
+import timeit
+from decimal import Decimal
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils import timezone
+from candy_shop.apps.delivery.models import Courier, Order
+from candy_shop.apps.delivery.services import (assign_orders, create_couriers,
+                                               create_orders)
+from candy_shop.apps.delivery.assignment import (GreedyStrategy,
+                                                 FirstFitDecreasingStrategy,
+                                                 KnapsackStrategy)
+
+
+def to_candidates(weights):
+    return [(i, Decimal(str(w))) for i, w in enumerate(weights, start=1)]
+
+
+def total_weight(selected):
+    return sum(weight for _, weight in selected)
+
+
+@pytest.mark.parametrize('strategy, expected_weight', [
+    (GreedyStrategy(), Decimal('0')),
+    (FirstFitDecreasingStrategy(), Decimal('8.5')),
+    (KnapsackStrategy(), Decimal('8.75')),
+])
+def test_strategies_skip_heavy_orders(strategy, expected_weight):
+    candidates = to_candidates([9.5, 6, 2.5, 2, 0.75])
+    selected = strategy.select(candidates, Decimal('9'))
+    assert total_weight(selected) == expected_weight
+    assert len(set(selected)) == len(selected)
+    assert set(selected) <= set(candidates)
+
+
+def test_knapsack_with_many_candidates():
+    strategy = KnapsackStrategy()
+    strategy.max_candidates = 3
+    candidates = to_candidates([9, 8, 7, 0.5, 0.25, 0.25])
+    selected = strategy.select(candidates, Decimal('16'))
+    assert total_weight(selected) == Decimal('16')
+    assert strategy.select(candidates, Decimal('0')) == []
+
+
+def generate_candidates(n, seed=0):
+    rnd = random.Random(seed)
+    return to_candidates(
+        [round(rnd.uniform(0.01, 50), 2) for _ in range(n)])
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('n_candidates', [10, 100, 1000])
+@pytest.mark.parametrize('capacity', [Decimal(10), Decimal(50)])
+def test_strategies_latency_and_fill_ratio(n_candidates, capacity):
+    candidates = generate_candidates(n_candidates)
+    for strategy in [GreedyStrategy(), FirstFitDecreasingStrategy(),
+                     KnapsackStrategy()]:
+        latency = min(timeit.repeat(
+            lambda: strategy.select(candidates, capacity),
+            number=1, repeat=5))
+        selected = strategy.select(candidates, capacity)
+        fill_ratio = total_weight(selected) / capacity
+        print(f"{type(strategy).__name__}: {n_candidates} candidates, "
+              f"capacity {capacity}, latency {latency * 1000:.2f} ms, "
+              f"fill ratio {fill_ratio:.3f}")
+        assert total_weight(selected) <= capacity
+
+
+@transaction.atomic
+def legacy_assign_orders(courier):
+    """
+    The assignment loop which was used before strategies
+    """
+    available_orders = (
+        Order.objects
+             .get_available_orders(courier)
+             .order_by('-weight')
+    )
+    selected_orders = []
+    paginator = Paginator(available_orders, per_page=5)
+    weight_capacity = courier.courier_type - (courier.get_orders_weight() or 0)
+    assigned_time = timezone.now()
+    for page in paginator:
+        page_break = False
+        for order in page.object_list:
+            if order.weight > weight_capacity:
+                page_break = True
+                break
+            else:
+                order.courier = courier
+                order.status = Order.OrderStatus.ASSIGNED
+                order.assigned_time = assigned_time
+                selected_orders.append(order)
+                weight_capacity -= order.weight
+        if page_break:
+            break
+    Order.objects.bulk_update(selected_orders,
+                              ['courier', 'status', 'assigned_time'])
+    return [o.pk for o in selected_orders]
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize('courier_type', Courier.CourierType)
+def test_assign_orders_latency_and_fill_ratio(courier_type):
+    create_couriers([{
+        'courier_id': 1,
+        'courier_type': courier_type,
+        'regions': [1, 2],
+        'working_hours': ['09:00-18:00'],
+    }])
+    rnd = random.Random(0)
+    create_orders([
+        {
+            'order_id': i,
+            'weight': Decimal(str(round(rnd.uniform(0.01, 50), 2))),
+            'region': i % 3 + 1,
+            'delivery_hours': ['10:00-12:00'],
+        }
+        for i in range(1, 3001)
+    ])
+    courier = Courier.objects.get(pk=1)
+
+    for assign in [legacy_assign_orders, assign_orders]:
+        timings = []
+        for _ in range(5):
+            with transaction.atomic():
+                start = timeit.default_timer()
+                assigned_ids = assign(courier)
+                timings.append(timeit.default_timer() - start)
+                weight = sum(Order.objects
+                             .filter(pk__in=assigned_ids)
+                             .values_list('weight', flat=True))
+                transaction.set_rollback(True)
+        fill_ratio = weight / courier.courier_type
+        print(f"{assign.__name__}: {courier_type.label} courier, "
+              f"latency {min(timings) * 1000:.2f} ms, "
+              f"fill ratio {fill_ratio:.3f}")
@@ -0,0 +1,123 @@
+import pytest
+import asyncio
+import importlib
+import json
+from django.db import connection
+from django.test import override_settings
+from django.urls import clear_url_caches, resolve
+from rest_framework import status
+from candy_shop import urls as root_urls
+from candy_shop.apps.delivery import urls
+from candy_shop.apps.delivery.metrics import metrics_registry
+
+COURIERS = {
+    "data": [
+        {
+            "courier_id": courier_id,
+            "courier_type": "car",
+            "regions": [1],
+            "working_hours": ["09:00-18:00"]
+        }
+        for courier_id in range(1, 21)
+    ]
+}
+
+ORDERS = {
+    "data": [
+        {
+            "order_id": order_id,
+            "weight": 1,
+            "region": 1,
+            "delivery_hours": ["10:00-12:00"]
+        }
+        for order_id in range(1, 4)
+    ]
+}
+
+
+def reload_urls():
+    importlib.reload(urls)
+    # the resolver including them caches the patterns
+    importlib.reload(root_urls)
+    clear_url_caches()
+
+
+@pytest.fixture
+def async_views(monkeypatch):
+    # worker threads close their connections after every request,
+    # so that none are left open to the test database
+    monkeypatch.setitem(connection.settings_dict, 'CONN_MAX_AGE', 0)
+    with override_settings(DELIVERY_ASYNC_VIEWS=True):
+        reload_urls()
+        yield
+    reload_urls()
+
+
+@pytest.fixture
+def registry(settings):
+    settings.DELIVERY_METRICS = True
+    metrics_registry.__init__()
+    yield metrics_registry
+    metrics_registry.__init__()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.integration
+def test_async_views(async_client, async_views, registry):
+    assert asyncio.iscoroutinefunction(resolve('/orders/assign').func)
+    assert asyncio.iscoroutinefunction(resolve('/couriers/1').func)
+
+    async def post(path, data):
+        return await async_client.post(path, json.dumps(data),
+                                       content_type="application/json")
+
+    async def scenario():
+        response = await post('/couriers', COURIERS)
+        assert response.status_code == status.HTTP_201_CREATED
+        response = await post('/orders', ORDERS)
+        assert response.status_code == status.HTTP_201_CREATED
+        response = await post('/orders/assign', {"courier_id": 1})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['orders']) == 3
+        response = await post('/orders/complete', {
+            "courier_id": 1,
+            "order_id": 1,
+            "complete_time": "2021-01-10T10:33:01.42Z"
+        })
+        assert response.status_code == status.HTTP_200_OK
+
+        # couriers polling at the same time
+        return await asyncio.gather(*[
+            async_client.get(f'/couriers/{courier_id}')
+            for courier_id in range(1, 21)
+        ])
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [status.HTTP_200_OK] * 20
+    assert [r.data['courier_id'] for r in responses] == list(range(1, 21))
+
+    # queries made in worker threads are counted by the middleware
+    labels = (('view', 'CourierViewSet.retrieve'), ('method', 'GET'))
+    *_, n_queries, n_requests = registry.values['delivery_db_queries'][labels]
+    assert n_requests == 20
+    assert n_queries >= 20
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.integration
+def test_async_views_are_traced(async_client, async_views, settings,
+                                tmp_path):
+    settings.DELIVERY_TRACE_FILE = str(tmp_path / 'trace.log')
+    settings.DELIVERY_TRACE_SAMPLE_RATE = 1
+    settings.DELIVERY_TRACE_SLOW_SECONDS = 0
+
+    response = asyncio.run(async_client.post(
+        '/couriers', json.dumps(COURIERS), content_type="application/json"))
+    assert response.status_code == status.HTTP_201_CREATED
+
+    with open(settings.DELIVERY_TRACE_FILE) as f:
+        trace, = [json.loads(line) for line in f]
+    children = trace['span']['children']
+    assert [c['name'] for c in children] == [
+        'parse', 'validate', 'services.create_couriers', 'render']
+    assert sum(c.get('queries', 0) for c in children) > 0
@@ -0,0 +1,148 @@
+import pytest
+import random
+import threading
+import timeit
+from collections import Counter
+from decimal import Decimal
+from django.db import connection, connections
+from candy_shop.apps.delivery.models import Courier, Order
+from candy_shop.apps.delivery.open_orders import open_order_index
+from candy_shop.apps.delivery.services import (assign_orders, create_couriers,
+                                               create_orders)
+from .test_assignment_strategies import legacy_assign_orders
+
+
+def run_concurrently(assign, courier_ids, n_threads):
+    """
+    Assigns orders to every courier from `n_threads` threads,
+    returns the elapsed time and all assigned ids
+    """
+    assigned_ids = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(ids):
+        try:
+            for courier in (Courier.objects
+                            .filter(pk__in=ids)
+                            .prefetch_related('regions', 'working_hours')):
+                order_ids = assign(courier)
+                with lock:
+                    assigned_ids.extend(order_ids)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=worker, args=(courier_ids[i::n_threads],))
+        for i in range(n_threads)
+    ]
+    start = timeit.default_timer()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    return timeit.default_timer() - start, assigned_ids
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('open_order_index_enabled', [False, True])
+def test_concurrent_assign_has_no_duplicates(settings,
+                                             open_order_index_enabled):
+    if connection.vendor != 'postgresql':
+        pytest.skip("row-level locks are not supported by the database")
+    settings.DELIVERY_OPEN_ORDER_INDEX = open_order_index_enabled
+    open_order_index.invalidate()
+
+    create_couriers([
+        {
+            'courier_id': i,
+            'courier_type': Courier.CourierType.FOOT,
+            'regions': [1],
+            'working_hours': ['09:00-18:00'],
+        }
+        for i in range(1, 9)
+    ])
+    create_orders([
+        {
+            'order_id': i,
+            'weight': 3,
+            'region': 1,
+            'delivery_hours': ['10:00-12:00'],
+        }
+        for i in range(1, 21)
+    ])
+
+    _, assigned_ids = run_concurrently(
+        assign_orders, list(range(1, 9)), n_threads=4)
+    open_order_index.invalidate()
+    assert assigned_ids
+    assert len(assigned_ids) == len(set(assigned_ids))
+    assert sorted(assigned_ids) == sorted(
+        Order.objects
+             .filter(status=Order.OrderStatus.ASSIGNED)
+             .values_list('order_id', flat=True))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('open_order_index_enabled', [False, True])
+def test_candidates_fit_remaining_capacity(settings,
+                                           open_order_index_enabled):
+    settings.DELIVERY_OPEN_ORDER_INDEX = open_order_index_enabled
+    open_order_index.invalidate()
+    create_couriers([{
+        'courier_id': 1,
+        'courier_type': Courier.CourierType.FOOT,
+        'regions': [1],
+        'working_hours': ['09:00-18:00'],
+    }])
+    order = {'region': 1, 'delivery_hours': ['10:00-12:00']}
+    create_orders([{**order, 'order_id': 1, 'weight': Decimal('1.5')}])
+    assert assign_orders(Courier.objects.get(pk=1)) == [1]
+
+    # more orders than candidates are too heavy for the remaining 8.5 kg
+    create_orders([{**order, 'order_id': i, 'weight': Decimal('9.5')}
+                   for i in range(2, 152)] +
+                  [{**order, 'order_id': 152, 'weight': Decimal(1)}])
+    assert assign_orders(Courier.objects.get(pk=1)) == [152]
+    open_order_index.invalidate()
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('assign', [legacy_assign_orders, assign_orders])
+def test_concurrent_assign(assign):
+    if connection.vendor != 'postgresql':
+        pytest.skip("row-level locks are not supported by the database")
+
+    n_couriers = 200
+    create_couriers([
+        {
+            'courier_id': i,
+            'courier_type': Courier.CourierType.FOOT,
+            'regions': [1, 2],
+            'working_hours': ['09:00-18:00'],
+        }
+        for i in range(1, n_couriers + 1)
+    ])
+    rnd = random.Random(0)
+    create_orders([
+        {
+            'order_id': i,
+            'weight': Decimal(str(round(rnd.uniform(0.01, 10), 2))),
+            'region': i % 2 + 1,
+            'delivery_hours': ['10:00-12:00'],
+        }
+        for i in range(1, 2001)
+    ])
+
+    elapsed, assigned_ids = run_concurrently(
+        assign, list(range(1, n_couriers + 1)), n_threads=16)
+    duplicates = [pk for pk, n in Counter(assigned_ids).items() if n > 1]
+    print(f"{assign.__name__}: {n_couriers / elapsed:.1f} assignments/s, "
+          f"{len(set(assigned_ids))} orders assigned, "
+          f"{len(duplicates)} assigned twice")
+    if assign is assign_orders:
+        assert not duplicates
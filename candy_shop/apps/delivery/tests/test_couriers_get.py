@@ -1,7 +1,8 @@
 import pytest
 import json
+from django.core.management import call_command, CommandError
 from rest_framework import status
-from candy_shop.apps.delivery.models import Order
+from candy_shop.apps.delivery.models import Order, Courier
 from datetime import timedelta
 
 
@@ -81,6 +82,9 @@ def setup_db(client):
         order.delivery_time = timedelta(seconds=order_id*100)
         order.save()
 
+    # delivery times are changed bypassing `complete_order`
+    call_command('rebuild_region_stats')
+
 
 @pytest.mark.django_db
 @pytest.mark.integration
@@ -92,3 +96,92 @@ def test_get_values(client, setup_db):
                                 'working_hours', 'rating', 'earnings'}
     assert data['earnings'] == 3 * 500 * 9
     assert data['rating'] == round((60*60 - 100)/(60*60) * 5, 2)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_rating_is_maintained(client, setup_db):
+    courier = Courier.objects.get(pk=1)
+    call_command('rebuild_region_stats', '--check')
+
+    Order.objects.filter(pk=1).update(delivery_time=timedelta(seconds=400))
+    with pytest.raises(CommandError):
+        call_command('rebuild_region_stats', '--check')
+    call_command('rebuild_region_stats')
+    assert courier.rating == courier.get_rating_from_history()
+    assert courier.rating == round((60*60 - 200)/(60*60) * 5, 2)
+
+    orders = {
+        "data": [
+            {
+                "order_id": 4,
+                "weight": 50,
+                "region": 2,
+                "delivery_hours": ["09:00-18:00"]
+            },
+        ]
+    }
+    response = client.post(
+        '/orders',
+        json.dumps(orders),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+    response = client.post(
+        '/orders/assign',
+        json.dumps({"courier_id": 1}),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    response = client.post(
+        '/orders/complete',
+        json.dumps({"courier_id": 1, "order_id": 4}),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+
+    stats = courier.region_stats.get(region=2)
+    assert stats.n_orders_complete == 2
+    assert courier.rating == courier.get_rating_from_history()
+    call_command('rebuild_region_stats', '--check')
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_list_pages(client, setup_db):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    couriers = {
+        "data": [
+            {
+                "courier_id": courier_id,
+                "courier_type": "foot",
+                "regions": [courier_id % 3 + 1],
+                "working_hours": ["09:00-11:00", "12:00-18:00"]
+            }
+            for courier_id in range(2, 12)
+        ]
+    }
+    response = client.post(
+        '/couriers',
+        json.dumps(couriers),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    pages = []
+    n_queries = []
+    url = '/couriers?limit=4'
+    while url:
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.data['results'])
+        n_queries.append(len(ctx.captured_queries))
+        url = response.data['next']
+
+    assert [len(p) for p in pages] == [4, 4, 3]
+    assert len(set(n_queries)) == 1
+    couriers = [c for page in pages for c in page]
+    assert [c['courier_id'] for c in couriers] == list(range(1, 12))
+    for courier in couriers:
+        assert courier == client.get(f"/couriers/{courier['courier_id']}").data
+    assert couriers[0]['earnings'] == 3 * 500 * 9
+    assert couriers[1]['earnings'] == 0
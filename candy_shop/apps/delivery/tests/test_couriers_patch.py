@@ -1,7 +1,11 @@
 import pytest
 import json
+from decimal import Decimal
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from candy_shop.apps.delivery.models import Courier
+from candy_shop.apps.delivery.models import Courier, Order
 
 
 @pytest.fixture
@@ -109,3 +113,146 @@ def test_reassign_after_changing_courier_type(
         content_type="application/json")
     assert response.status_code == status.HTTP_200_OK
     assert set([o['id'] for o in response.data['orders']]) == {2}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_assigned_weight_is_maintained(
+    setup_with_partially_complete_delivery,
+    client
+):
+    def get_assigned_weights():
+        return dict(Courier.objects.values_list('pk', 'assigned_weight'))
+
+    assert get_assigned_weights() == {1: Decimal(15), 2: Decimal(0)}
+
+    patch = {
+        "courier_type": 'foot',
+    }
+    response = client.patch(
+        '/couriers/1',
+        json.dumps(patch),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert get_assigned_weights() == {1: Decimal(0), 2: Decimal(0)}
+
+    response = client.post(
+        '/orders/assign',
+        json.dumps({'courier_id': 2}),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert get_assigned_weights() == {1: Decimal(0), 2: Decimal(15)}
+    call_command('reconcile_assigned_weight', '--check')
+
+    Courier.objects.filter(pk=2).update(assigned_weight=Decimal(3))
+    with pytest.raises(CommandError):
+        call_command('reconcile_assigned_weight', '--check')
+    call_command('reconcile_assigned_weight')
+    assert get_assigned_weights() == {1: Decimal(0), 2: Decimal(15)}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_rebalance_with_single_update(client):
+    couriers = {
+        "data": [
+            {
+                "courier_id": 1,
+                "courier_type": "car",
+                "regions": [1, 2],
+                "working_hours": ["09:00-18:00"]
+            },
+        ]
+    }
+    response = client.post(
+        '/couriers',
+        json.dumps(couriers),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    orders = {
+        "data": [
+            {
+                "order_id": order_id,
+                "weight": 1,
+                "region": order_id % 2 + 1,
+                "delivery_hours": ["09:00-18:00"]
+            }
+            for order_id in range(1, 41)
+        ]
+    }
+    response = client.post(
+        '/orders',
+        json.dumps(orders),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = client.post(
+        '/orders/assign',
+        json.dumps({"courier_id": 1}),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data['orders']) == 40
+
+    patch = {
+        "courier_type": "foot",
+        "regions": [1],
+    }
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.patch(
+            '/couriers/1',
+            json.dumps(patch),
+            content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    order_updates = [q for q in ctx.captured_queries
+                     if q['sql'].startswith('UPDATE "delivery_order"')]
+    assert len(order_updates) == 1
+
+    courier = Courier.objects.get(pk=1)
+    assigned = courier.orders.filter(status=Order.OrderStatus.ASSIGNED)
+    assert {o.region_id for o in assigned} == {1}
+    assert assigned.count() == 10
+    assert courier.assigned_weight == Decimal(10)
+    assert courier.deliveries.get().n_orders_open == 10
+    assert Order.objects.filter(status=Order.OrderStatus.OPEN).count() == 30
+    call_command('reconcile_assigned_weight', '--check')
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_patch_writes_only_changes(
+    setup_with_partially_complete_delivery,
+    client
+):
+    def patch_courier(data):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.patch(
+                '/couriers/1',
+                json.dumps(data),
+                content_type="application/json")
+        assert response.status_code == status.HTTP_200_OK
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries]
+        return [s for s in statements if s in ('INSERT', 'UPDATE', 'DELETE')]
+
+    profile = {
+        "courier_type": "car",
+        "regions": [1],
+        "working_hours": ["09:00-18:00"]
+    }
+    assert patch_courier(profile) == []
+
+    profile['regions'] = [1, 2]
+    profile['working_hours'].append('20:00-21:00')
+    assert sorted(patch_courier(profile)) == ['INSERT', 'INSERT', 'INSERT',
+                                              'UPDATE']
+    assert patch_courier(profile) == []
+    assert Courier.objects.get(pk=1).orders.count() == 2
+
+    profile['working_hours'] = ['20:00-21:00']
+    response = client.patch(
+        '/couriers/1',
+        json.dumps(profile),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['working_hours'] == ['20:00-21:00']
+    assert Courier.objects.get(pk=1).assigned_weight == Decimal(0)
@@ -98,3 +98,36 @@ def test_invalid_working_hours(client, post_and_assert_fn):
     incorrect_data = deepcopy(CORRECT_POST_DATA)
     incorrect_data['data'][0]['working_hours'] = '03.09.09 10:00-15:00'
     post_and_assert_fn(client, incorrect_data)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_query_count_does_not_depend_on_batch_size(client):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    def post_batch(first_id, size):
+        data = {
+            "data": [
+                {
+                    "courier_id": first_id + i,
+                    "courier_type": ["foot", "bike", "car"][i % 3],
+                    "regions": [i % 5 + 1, i % 7 + 1],
+                    "working_hours": ["09:00-12:00", "16:00-21:30"]
+                }
+                for i in range(size)
+            ]
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(
+                '/couriers',
+                json.dumps(data),
+                content_type="application/json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data['couriers']) == size
+        return len(ctx.captured_queries)
+
+    assert post_batch(1, 5) == post_batch(100, 90)
+    assert Courier.objects.count() == 95
+    assert Courier.objects.get(pk=100).regions.count() == 1
+    assert Courier.objects.get(pk=101).working_hours.count() == 2
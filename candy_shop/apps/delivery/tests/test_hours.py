@@ -0,0 +1,136 @@
+import pytest
+import json
+from django.contrib.admin.sites import site
+from rest_framework import status
+from candy_shop.apps.delivery.models import (Courier, DeliveryHours, Order,
+                                             OpenOrderChange, WorkingHours)
+from candy_shop.apps.delivery.open_orders import open_order_index
+from candy_shop.apps.delivery.services import (assign_orders, create_couriers,
+                                               create_orders)
+
+
+@pytest.fixture
+def courier():
+    create_couriers([{
+        'courier_id': 1,
+        'courier_type': Courier.CourierType.FOOT,
+        'regions': [1],
+        'working_hours': ['09:00-10:00'],
+    }])
+    return Courier.objects.get(pk=1)
+
+
+@pytest.fixture
+def order():
+    create_orders([{
+        'order_id': 1,
+        'weight': 1,
+        'region': 1,
+        'delivery_hours': ['09:00-10:00'],
+    }])
+    return Order.objects.get(pk=1)
+
+
+def get_slots(*hours):
+    return WorkingHours.get_slots_of(
+        [WorkingHours.from_string(h) for h in hours])
+
+
+@pytest.mark.django_db
+def test_saved_hours_update_courier_slots(courier):
+    assert (courier.working_slots, courier.working_slots_aligned) == \
+        get_slots('09:00-10:00')
+
+    hours = WorkingHours.from_string('12:15-13:00', courier=courier)
+    hours.save()
+    courier.refresh_from_db()
+    assert (courier.working_slots, courier.working_slots_aligned) == \
+        get_slots('09:00-10:00', '12:15-13:00')
+
+    hours.finishes_at = '14:00'
+    hours.save()
+    courier.refresh_from_db()
+    assert (courier.working_slots, courier.working_slots_aligned) == \
+        get_slots('09:00-10:00', '12:15-14:00')
+
+    hours.delete()
+    courier.refresh_from_db()
+    assert (courier.working_slots, courier.working_slots_aligned) == \
+        get_slots('09:00-10:00')
+
+
+@pytest.mark.django_db
+def test_moved_hours_update_both_couriers(courier):
+    create_couriers([{
+        'courier_id': 2,
+        'courier_type': Courier.CourierType.FOOT,
+        'regions': [1],
+        'working_hours': [],
+    }])
+    hours = courier.working_hours.get()
+    hours.courier_id = 2
+    hours.save()
+    assert Courier.objects.get(pk=1).working_slots == 0
+    assert Courier.objects.get(pk=2).working_slots == \
+        get_slots('09:00-10:00')[0]
+
+
+@pytest.mark.django_db
+def test_saved_hours_update_open_order(order, settings):
+    settings.DELIVERY_OPEN_ORDER_INDEX = True
+    DeliveryHours.from_string('18:00-19:00', order=order).save()
+    order.refresh_from_db()
+    assert order.delivery_slots == get_slots('09:00-10:00', '18:00-19:00')[0]
+    # the open order index reads the order again
+    change = OpenOrderChange.objects.latest('pk')
+    assert (change.order_id, change.is_open) == (order.pk, True)
+
+
+@pytest.mark.django_db
+def test_admin_delete_updates_slots(courier, rf):
+    WorkingHours.from_string('12:00-13:00', courier=courier).save()
+    model_admin = site._registry[WorkingHours]
+    model_admin.delete_queryset(
+        rf.post('/'), WorkingHours.objects.filter(starts_minute=9 * 60))
+    courier.refresh_from_db()
+    assert (courier.working_slots, courier.working_slots_aligned) == \
+        get_slots('12:00-13:00')
+
+
+def test_overnight_hours_are_split_at_midnight():
+    hours = WorkingHours.from_string('22:00-02:00')
+    assert (hours.starts_minute, hours.finishes_minute) == (1320, 1560)
+    assert get_slots('22:00-02:00') == (
+        sum(1 << slot for slot in [44, 45, 46, 47, 0, 1, 2, 3]), True)
+    assert get_slots('23:15-00:45') == (
+        sum(1 << slot for slot in [46, 47, 0, 1]), False)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.parametrize('open_order_index_enabled', [False, True])
+def test_overnight_hours_are_matched(client, settings,
+                                     open_order_index_enabled):
+    settings.DELIVERY_OPEN_ORDER_INDEX = open_order_index_enabled
+    open_order_index.invalidate()
+
+    def post(path, data):
+        response = client.post(path, json.dumps({'data': data}),
+                               content_type="application/json")
+        assert response.status_code == status.HTTP_201_CREATED
+
+    post('/couriers', [{
+        'courier_id': 1,
+        'courier_type': 'foot',
+        'regions': [1],
+        'working_hours': ['23:15-00:45'],
+    }])
+    post('/orders', [
+        {'order_id': i, 'weight': 1, 'region': 1, 'delivery_hours': [hours]}
+        for i, hours in enumerate(
+            ['00:15-01:00', '21:00-23:00', '22:50-23:20', '00:45-03:00',
+             '20:00-04:00'], start=1)
+    ])
+    courier = Courier.objects.get(pk=1)
+    assert sorted(assign_orders(courier)) == [1, 3, 5]
+    open_order_index.invalidate()
@@ -0,0 +1,195 @@
+import pytest
+import io
+import json
+import timeit
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from rest_framework import status
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from candy_shop.apps.delivery import renderers
+from candy_shop.apps.delivery.parsers import FastJSONParser
+from candy_shop.apps.delivery.renderers import FastJSONRenderer
+
+COURIERS = {
+    "data": [
+        {
+            "courier_id": 1,
+            "courier_type": "car",
+            "regions": [1, 2],
+            "working_hours": ["09:00-18:00"]
+        },
+        {
+            "courier_id": 2,
+            "courier_type": "foot",
+            "regions": [2],
+            "working_hours": ["11:35-14:05", "09:00-11:00"]
+        },
+    ]
+}
+
+ORDERS = {
+    "data": [
+        {
+            "order_id": order_id,
+            "weight": weight,
+            "region": 1,
+            "delivery_hours": ["10:00-12:00"]
+        }
+        for order_id, weight in [(1, 0.23), (2, 15), (3, 0.01)]
+    ]
+}
+
+DATA = [
+    ReturnDict([
+        ('weight', Decimal('10.25')),
+        ('time', datetime(2021, 1, 10, 10, 33, 1, 420123,
+                          tzinfo=timezone.utc)),
+        ('date', date(2021, 1, 10)),
+        ('hours', time(9, 30)),
+        ('duration', timedelta(minutes=15)),
+        ('id', uuid.UUID(int=1)),
+    ], serializer=None),
+    ReturnList([OrderedDict([('rating', 4.93), ('earnings', 1000)])],
+               serializer=None),
+    {'error': [ErrorDetail("Неверный формат", code='invalid')]},
+    {'separators': 'line\u2028paragraph\u2029', 'escapes': '"\\\n\x00'},
+    ('tuple', None, True, -0.0, 1.5),
+    # rendered by DRF
+    {'int': 2 ** 64, 1: 'not a str key'},
+    {},
+    [],
+]
+
+
+@pytest.mark.parametrize('data', DATA)
+def test_renderer_is_byte_compatible(data, monkeypatch):
+    expected = JSONRenderer().render(data)
+    assert FastJSONRenderer().render(data) == expected
+    monkeypatch.setattr(renderers, 'orjson', None)
+    assert FastJSONRenderer().render(data) == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_api_responses_are_byte_compatible(client):
+    responses = [
+        client.post('/couriers', json.dumps(COURIERS),
+                    content_type="application/json"),
+        client.post('/orders', json.dumps(ORDERS),
+                    content_type="application/json"),
+        client.post('/orders/assign', json.dumps({"courier_id": 1}),
+                    content_type="application/json"),
+        client.post('/orders/complete', json.dumps({
+            "courier_id": 1,
+            "order_id": 1,
+            "complete_time": "2021-01-10T10:33:01.42Z"
+        }), content_type="application/json"),
+        client.get('/couriers/1'),
+        client.get('/couriers'),
+        client.get('/orders'),
+        client.post('/orders', json.dumps({"data": [{"order_id": 4}]}),
+                    content_type="application/json"),
+        client.get('/couriers/3'),
+    ]
+    assert [r.status_code for r in responses] == [
+        status.HTTP_201_CREATED, status.HTTP_201_CREATED,
+        status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_200_OK,
+        status.HTTP_200_OK, status.HTTP_200_OK,
+        status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND,
+    ]
+    assert isinstance(responses[4].data['rating'], float)
+    for response in responses:
+        assert response.content == JSONRenderer().render(response.data)
+
+
+@pytest.mark.parametrize('data, expected, rendered', [
+    # floats are written in exponent notation only when they are huge
+    (1e-05, b'1e-05', b'0.00001'),
+    (1e16, b'1e+16', b'1e16'),
+    (1.5e300, b'1.5e+300', b'1.5e300'),
+    # non-finite floats are rendered as null rather than refused
+    (float('nan'), ValueError, b'null'),
+    (float('-inf'), ValueError, b'null'),
+])
+def test_renderer_differences(data, expected, rendered):
+    if expected is ValueError:
+        with pytest.raises(ValueError):
+            JSONRenderer().render(data)
+    else:
+        assert JSONRenderer().render(data) == expected
+        # the same number
+        assert json.loads(rendered) == data
+    assert FastJSONRenderer().render(data) == rendered
+
+
+def parse(parser, body):
+    try:
+        return parser.parse(io.BytesIO(body))
+    except ParseError as e:
+        return e.detail
+
+
+@pytest.mark.parametrize('body, expected, parsed', [
+    # integers out of the 64-bit range are parsed as floats
+    (b'18446744073709551616', 2 ** 64, float(2 ** 64)),
+    (b'-9223372036854775809', -2 ** 63 - 1, float(-2 ** 63 - 1)),
+])
+def test_parser_differences(body, expected, parsed):
+    assert parse(JSONParser(), body) == expected
+    result = parse(FastJSONParser(), body)
+    assert type(result) is float and result == parsed
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_huge_ids_are_rejected(client):
+    body = json.dumps(ORDERS).replace('"order_id": 1,',
+                                      '"order_id": 18446744073709551616,')
+    response = client.post('/orders', body, content_type="application/json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize('body', [
+    json.dumps(COURIERS).encode(),
+    json.dumps({"data": "Доставка\u2028"}, ensure_ascii=False).encode(),
+    b'{"id": 18446744073709551615, "weight": 1e-7, "a": 1, "a": 2}',
+    b'"\\ud800"',
+    b'1e400',
+    b'\xef\xbb\xbf{}',
+    b'{"weight": NaN}',
+    b'{"data": [}',
+    b'\xff',
+    b'',
+])
+def test_parser_is_compatible(body):
+    assert parse(FastJSONParser(), body) == parse(JSONParser(), body)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('n_items', [1000, 10000])
+def test_json_latency(n_items):
+    data = ReturnList([
+        OrderedDict([
+            ('order_id', i),
+            ('weight', f'{i % 5000 / 100:.2f}'),
+            ('region', i % 100 + 1),
+            ('delivery_hours', ['09:00-12:00', '16:00-21:30']),
+        ])
+        for i in range(1, n_items + 1)
+    ], serializer=None)
+    body = JSONRenderer().render({'data': data})
+
+    for renderer, parser in [(JSONRenderer(), JSONParser()),
+                             (FastJSONRenderer(), FastJSONParser())]:
+        render_latency = min(timeit.repeat(
+            lambda: renderer.render(data), number=1, repeat=5))
+        parse_latency = min(timeit.repeat(
+            lambda: parser.parse(io.BytesIO(body)), number=1, repeat=5))
+        print(f"{type(renderer).__name__}: {n_items} items, "
+              f"{len(body)} bytes, render {render_latency * 1000:.2f} ms, "
+              f"parse {parse_latency * 1000:.2f} ms")
@@ -0,0 +1,155 @@
+import pytest
+import atexit
+import json
+import os
+import subprocess
+import sys
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from candy_shop.apps.delivery.metrics import MetricsRegistry, metrics_registry
+
+
+def get_samples(client):
+    response = client.get('/metrics')
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'].startswith('text/plain')
+    samples = {}
+    for line in response.content.decode().splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+@pytest.fixture
+def registry(settings, tmp_path):
+    settings.DELIVERY_METRICS = True
+    settings.DELIVERY_METRICS_DIR = str(tmp_path)
+    metrics_registry.__init__()
+    yield metrics_registry
+    metrics_registry.__init__()
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_metrics_per_view(client, registry):
+    couriers = {
+        "data": [
+            {
+                "courier_id": 1,
+                "courier_type": "car",
+                "regions": [1],
+                "working_hours": ["09:00-18:00"]
+            },
+        ]
+    }
+    response = client.post('/couriers', json.dumps(couriers),
+                           content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.post('/orders/assign',
+                               json.dumps({"courier_id": 1}),
+                               content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    n_queries = len(ctx.captured_queries)
+    response = client.get('/couriers/2')
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    samples = get_samples(client)
+    assign = 'view="AssignView",method="POST"'
+    assert samples[
+        'delivery_requests_total{%s,status="200"}' % assign] == 1
+    assert samples[
+        'delivery_requests_total{view="CourierViewSet.retrieve",'
+        'method="GET",status="404"}'] == 1
+    assert samples['delivery_db_queries_sum{%s}' % assign] == n_queries
+    assert samples['delivery_db_queries_count{%s}' % assign] == 1
+    assert samples[
+        'delivery_request_duration_seconds_bucket{%s,le="+Inf"}' % assign
+    ] == 1
+    assert 0 < samples['delivery_db_duration_seconds_sum{%s}' % assign]
+    assert samples['delivery_request_size_bytes_sum{%s}' % assign] == len(
+        json.dumps({"courier_id": 1}))
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_metrics_of_all_processes(client, registry, tmp_path):
+    # a registry of another worker process
+    other = MetricsRegistry()
+    labels = (('view', 'AssignView'), ('method', 'POST'))
+    other.inc('delivery_requests_total', labels + (('status', '200'),))
+    other.observe('delivery_db_queries', labels, 7)
+    other.flush()
+    os.rename(tmp_path / f'{os.getpid()}.json', tmp_path / '1.json')
+
+    registry.inc('delivery_requests_total', labels + (('status', '200'),))
+    registry.observe('delivery_db_queries', labels, 3)
+    samples = get_samples(client)
+    assign = 'view="AssignView",method="POST"'
+    assert samples[
+        'delivery_requests_total{%s,status="200"}' % assign] == 2
+    assert samples['delivery_db_queries_sum{%s}' % assign] == 10
+    assert samples['delivery_db_queries_bucket{%s,le="5"}' % assign] == 1
+    assert samples['delivery_db_queries_bucket{%s,le="10"}' % assign] == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_metrics_are_disabled_by_default(client):
+    metrics_registry.__init__()
+    response = client.get('/couriers/1')
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert client.get('/metrics').status_code == status.HTTP_404_NOT_FOUND
+    assert not any(metrics_registry.values.values())
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_metrics_token(client, registry, settings):
+    settings.DELIVERY_METRICS_TOKEN = 'metrics token'
+    assert client.get('/metrics').status_code == status.HTTP_403_FORBIDDEN
+    response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer forged')
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = client.get('/metrics',
+                          HTTP_AUTHORIZATION='Bearer metrics token')
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_values_of_exited_processes_are_kept(client, registry, tmp_path,
+                                             monkeypatch):
+    exit_handlers = []
+    monkeypatch.setattr(atexit, 'register',
+                        lambda *args: exit_handlers.append(args))
+    labels = (('view', 'AssignView'), ('method', 'POST'))
+    registry.inc('delivery_requests_total', labels + (('status', '200'),))
+    registry.observe('delivery_db_queries', labels, 3)
+    registry.flush()
+    own_path = tmp_path / f'{os.getpid()}.json'
+    assert exit_handlers == [(registry.on_exit, str(own_path))]
+
+    # a file of a worker which has been killed
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    (tmp_path / f'{process.pid}.json').write_text(own_path.read_text())
+    assign = 'view="AssignView",method="POST"'
+
+    def get_assign_samples():
+        return {name: value for name, value in get_samples(client).items()
+                if assign in name}
+    samples = get_assign_samples()
+    assert {p.name for p in tmp_path.glob('*.json')} == {
+        own_path.name, 'aggregate.json'}
+    assert samples[
+        'delivery_requests_total{%s,status="200"}' % assign] == 2
+    assert samples['delivery_db_queries_sum{%s}' % assign] == 6
+
+    # the worker exits, the totals don't go down
+    for func, *args in exit_handlers:
+        func(*args)
+    assert {p.name for p in tmp_path.glob('*.json')} == {'aggregate.json'}
+    registry.__init__()
+    assert get_assign_samples() == samples
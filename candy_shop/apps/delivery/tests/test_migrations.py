@@ -0,0 +1,112 @@
+import pytest
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+from candy_shop.apps.delivery.models import (Courier, CourierRegionStats,
+                                             Delivery, Order, WorkingHours)
+from candy_shop.apps.delivery.services import (complete_order,
+                                               reconcile_assigned_weight)
+
+INITIAL = [('delivery', '0001_initial')]
+
+
+def migrate(targets):
+    executor = MigrationExecutor(connection)
+    executor.loader.build_graph()
+    executor.migrate(targets)
+    return executor.loader.project_state(targets).apps
+
+
+def get_latest():
+    executor = MigrationExecutor(connection)
+    return executor.loader.graph.leaf_nodes('delivery')
+
+
+@pytest.fixture
+def initial_apps():
+    """
+    The schema which databases were created with before migrations,
+    it's migrated to the latest one after the test
+    """
+    latest = get_latest()
+    apps = migrate(INITIAL)
+    yield apps
+    migrate(latest)
+
+
+def create_history(apps):
+    """
+    Orders as they were assigned and completed before migrations
+    """
+    Region = apps.get_model('delivery', 'Region')
+    Courier = apps.get_model('delivery', 'Courier')
+    WorkingHours = apps.get_model('delivery', 'WorkingHours')
+    Order = apps.get_model('delivery', 'Order')
+    DeliveryHours = apps.get_model('delivery', 'DeliveryHours')
+
+    region = Region.objects.create(pk=1)
+    courier = Courier.objects.create(courier_id=1, courier_type=10)
+    courier.regions.add(region)
+    Courier.objects.create(courier_id=2, courier_type=15)
+    for starts_at, finishes_at in [(time(9), time(12)),
+                                   (time(23, 15), time(0, 45))]:
+        WorkingHours.objects.create(courier=courier, starts_at=starts_at,
+                                    finishes_at=finishes_at)
+
+    assigned_time = timezone.make_aware(datetime(2021, 3, 28, 10))
+    for order_id, weight, status, delivery_time in [
+            (1, '2', 'complete', timedelta(minutes=20)),
+            (2, '3', 'complete', timedelta(minutes=40)),
+            (3, '1.5', 'assigned', None),
+            (4, '4', 'open', None)]:
+        order = Order.objects.create(
+            order_id=order_id, weight=Decimal(weight), region=region,
+            status=status,
+            courier=courier if status != 'open' else None,
+            assigned_time=assigned_time if status != 'open' else None,
+            complete_time=(assigned_time + delivery_time
+                           if delivery_time else None),
+            delivery_time=delivery_time)
+        DeliveryHours.objects.create(order=order, starts_at=time(22),
+                                     finishes_at=time(2))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migrations_fill_new_fields(initial_apps):
+    create_history(initial_apps)
+    migrate(get_latest())
+
+    courier = Courier.objects.get(pk=1)
+    hours = list(courier.working_hours.order_by('starts_at'))
+    assert [(h.starts_minute, h.finishes_minute) for h in hours] == \
+        [(540, 720), (1395, 1485)]
+    assert (courier.working_slots, courier.working_slots_aligned) == \
+        WorkingHours.get_slots_of(hours)
+    assert Courier.objects.get(pk=2).working_slots == 0
+    order = Order.objects.get(pk=4)
+    assert (order.delivery_slots, order.delivery_slots_aligned) == \
+        order.delivery_hours.get().get_slots()
+
+    assert courier.assigned_weight == Decimal('1.5')
+    assert not reconcile_assigned_weight(repair=False)
+    stats = CourierRegionStats.objects.get()
+    assert (stats.delivery_time_sum, stats.n_orders_complete) == \
+        (timedelta(hours=1), 2)
+    assert courier.rating == courier.get_rating_from_history()
+
+    delivery = Delivery.objects.get()
+    assert set(delivery.orders.values_list('pk', flat=True)) == {1, 2, 3}
+    assert (delivery.n_orders_open, delivery.n_orders_complete) == (1, 2)
+    assert delivery.last_complete_time == Order.objects.get(pk=2).complete_time
+    assert Order.objects.get(pk=4).delivery is None
+    assert courier.earnings == 0
+
+    # orders assigned before the migration are completed as usual
+    order = complete_order(courier, Order.objects.get(pk=3))
+    assert order.delivery_time == order.complete_time - \
+        delivery.last_complete_time
+    courier = Courier.objects.get(pk=1)
+    assert courier.assigned_weight == 0
+    assert courier.earnings == 500 * 2
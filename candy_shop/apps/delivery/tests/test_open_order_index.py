@@ -0,0 +1,223 @@
+import pytest
+import json
+import timeit
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import status
+from candy_shop.apps.delivery.models import Order, OpenOrderChange
+from candy_shop.apps.delivery.open_orders import (OpenOrderIndex,
+                                                  open_order_index)
+
+
+def count_rebuilds(index, monkeypatch):
+    rebuilds = []
+    rebuild = index.rebuild
+
+    def counting_rebuild():
+        rebuilds.append(1)
+        rebuild()
+    monkeypatch.setattr(index, 'rebuild', counting_rebuild)
+    return rebuilds
+
+
+def last_change_id():
+    return OpenOrderChange.objects.aggregate(Max('pk'))['pk__max']
+
+
+@pytest.fixture
+def index_settings(settings):
+    settings.DELIVERY_OPEN_ORDER_INDEX = True
+    open_order_index.invalidate()
+    yield settings
+    open_order_index.invalidate()
+
+
+def get_db_candidates(courier):
+    return list(
+        Order.objects
+             .get_available_orders(courier)
+             .order_by('-weight', 'order_id')
+             .values_list('order_id', 'weight')
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_matches_database(seed, index_settings):
+    couriers = seed(n_couriers=20, n_orders=300)
+    assert not all(c.working_slots_aligned for c in couriers)
+    for courier in couriers:
+        db_candidates = get_db_candidates(courier)
+        assert open_order_index.get_candidates(courier) == db_candidates
+        assert (open_order_index.get_candidates(courier, limit=5) ==
+                db_candidates[:5])
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.integration
+def test_index_follows_changes(client, seed, index_settings, monkeypatch):
+    courier, *_ = seed(n_couriers=1, n_orders=50)
+    assert open_order_index.get_candidates(courier)
+    rebuilds = count_rebuilds(open_order_index, monkeypatch)
+
+    response = client.post(
+        '/orders/assign',
+        json.dumps({"courier_id": courier.pk}),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assigned_ids = {o['id'] for o in response.data['orders']}
+    assert assigned_ids
+    # the change is applied incrementally
+    open_order_index.catch_up()
+    assert open_order_index.version == last_change_id()
+    assert not assigned_ids & set(open_order_index.orders)
+
+    Order.objects.filter(pk__in=assigned_ids).return_to_open(timezone.now())
+    open_order_index.catch_up()
+    assert open_order_index.version == last_change_id()
+    assert assigned_ids <= set(open_order_index.orders)
+
+    (order_id, _), *_ = open_order_index.get_candidates(courier)
+    order = Order.objects.get(pk=order_id)
+    order.status = Order.OrderStatus.COMPLETE
+    order.save()
+    candidates = open_order_index.get_candidates(courier)
+    assert order.pk not in dict(candidates)
+    assert candidates == get_db_candidates(courier)
+    assert not rebuilds
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_follows_other_workers(seed, index_settings, monkeypatch):
+    couriers = seed(n_couriers=5, n_orders=200)
+    other_worker = OpenOrderIndex()
+    for courier in couriers:
+        other_worker.get_candidates(courier)
+        open_order_index.get_candidates(courier)
+    rebuilds = count_rebuilds(other_worker, monkeypatch)
+
+    for courier in couriers:
+        order_ids = [pk for pk, _ in
+                     open_order_index.get_candidates(courier, limit=3)]
+        with transaction.atomic():
+            Order.objects.assign(courier, order_ids, timezone.now())
+    Order.objects.filter(courier=couriers[0]).return_to_open(timezone.now())
+
+    for courier in couriers:
+        assert other_worker.get_candidates(courier) == \
+            get_db_candidates(courier)
+    assert not rebuilds
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_waits_for_changes_committed_late(seed, index_settings):
+    courier, *_ = seed(n_couriers=1, n_orders=20)
+    open_order_index.get_candidates(courier)
+    version = open_order_index.version
+    order_id, _ = open_order_index.get_candidates(courier)[0]
+
+    # a transaction which has taken the next id commits after a later one
+    Order.objects.filter(pk=order_id).update(
+        status=Order.OrderStatus.COMPLETE)
+    OpenOrderChange.objects.create(pk=version + 2, order_id=0, is_open=False)
+    open_order_index.catch_up()
+    assert open_order_index.gaps.keys() == {version + 1}
+    assert order_id in open_order_index.orders
+
+    OpenOrderChange.objects.create(pk=version + 1, order_id=order_id,
+                                   is_open=False)
+    open_order_index.catch_up()
+    assert not open_order_index.gaps
+    assert order_id not in open_order_index.orders
+    assert open_order_index.get_candidates(courier) == \
+        get_db_candidates(courier)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_is_rebuilt_behind_pruned_log(seed, index_settings, monkeypatch):
+    courier, *_ = seed(n_couriers=1, n_orders=20)
+    other_worker = OpenOrderIndex()
+    other_worker.get_candidates(courier)
+    rebuilds = count_rebuilds(other_worker, monkeypatch)
+
+    monkeypatch.setattr(OpenOrderIndex, 'log_size', 2)
+    monkeypatch.setattr(OpenOrderIndex, 'prune_every', 1)
+    for order_id, _ in open_order_index.get_candidates(courier, limit=5):
+        with transaction.atomic():
+            Order.objects.assign(courier, [order_id], timezone.now())
+        open_order_index.get_candidates(courier)
+    assert OpenOrderChange.objects.count() <= 3
+
+    assert other_worker.get_candidates(courier) == get_db_candidates(courier)
+    assert len(rebuilds) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_log_is_pruned_without_catch_ups(seed, index_settings, monkeypatch):
+    courier, *_ = seed(n_couriers=1, n_orders=20)
+    monkeypatch.setattr(OpenOrderIndex, 'log_size', 2)
+    monkeypatch.setattr(OpenOrderIndex, 'prune_every', 1)
+    for order in Order.objects.all()[:5]:
+        with transaction.atomic():
+            Order.objects.assign(courier, [order.pk], timezone.now())
+    assert OpenOrderChange.objects.count() <= 3
+    assert open_order_index.version is None
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db(transaction=True)
+def test_candidates_lookup_speed(seed, index_settings):
+    couriers = seed(n_couriers=100, n_orders=20000)
+
+    def lookup(get_candidates):
+        timer = timeit.Timer(lambda: [get_candidates(c) for c in couriers])
+        return min(timer.repeat(repeat=3, number=1)) / len(couriers)
+
+    def get_db_candidates(courier):
+        return list(
+            Order.objects
+                 .get_available_orders(courier)
+                 .order_by('-weight', 'order_id')
+                 .values_list('order_id', 'weight')[:100]
+        )
+
+    open_order_index.rebuild()
+    db_time = lookup(get_db_candidates)
+    index_time = lookup(
+        lambda c: open_order_index.get_candidates(c, limit=100))
+    print(f"candidates lookup: database {db_time * 1000:.2f} ms, "
+          f"index {index_time * 1000:.2f} ms")
+    assert index_time < db_time / 5
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db(transaction=True)
+def test_lookup_speed_with_other_workers(seed, index_settings):
+    couriers = seed(n_couriers=100, n_orders=20000)
+    workers = [OpenOrderIndex() for _ in range(4)]
+    for worker in workers:
+        worker.rebuild()
+
+    def lookup(catch_up):
+        # every lookup follows an assignment made by another worker
+        elapsed = 0
+        for i, courier in enumerate(couriers):
+            worker = workers[i % len(workers)]
+            order_ids = [pk for pk, _ in
+                         workers[i % len(workers) - 1]
+                         .get_candidates(courier, limit=3)]
+            with transaction.atomic():
+                Order.objects.assign(courier, order_ids, timezone.now())
+            start = timeit.default_timer()
+            if not catch_up:
+                worker.invalidate()
+            worker.get_candidates(courier, limit=100)
+            elapsed += timeit.default_timer() - start
+        return elapsed / len(couriers)
+
+    rebuild_time = lookup(catch_up=False)
+    catch_up_time = lookup(catch_up=True)
+    print(f"candidates lookup after another worker's change: "
+          f"rebuild {rebuild_time * 1000:.2f} ms, "
+          f"catch up {catch_up_time * 1000:.2f} ms")
+    assert catch_up_time < rebuild_time / 10
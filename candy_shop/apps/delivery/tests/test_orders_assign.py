@@ -247,3 +247,59 @@ def test_invalid_assign(client):
         content_type="application/json")
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_assign_encounters_time_within_slots(client):
+    couriers = {
+        "data": [
+            {
+                "courier_id": 1,
+                "courier_type": "car",
+                "regions": [1],
+                "working_hours": ["09:10-09:20", "11:00-11:30"]
+            },
+        ]
+    }
+    response = client.post(
+        '/couriers',
+        json.dumps(couriers),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    delivery_hours = [
+        ["09:00-09:10"],
+        ["09:15-09:40"],
+        ["09:20-10:00"],
+        ["09:00-09:30"],
+        ["11:29-11:45"],
+        ["10:30-11:00", "11:30-11:31"],
+    ]
+    orders = {
+        "data": [
+            {
+                "order_id": i,
+                "weight": 1,
+                "region": 1,
+                "delivery_hours": hours
+            }
+            for i, hours in enumerate(delivery_hours, start=1)
+        ]
+    }
+    response = client.post(
+        '/orders',
+        json.dumps(orders),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    assign = {
+        "courier_id": 1
+    }
+    response = client.post(
+        '/orders/assign',
+        json.dumps(assign),
+        content_type="application/json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert set([o['id'] for o in response.data['orders']]) == {2, 4, 5}
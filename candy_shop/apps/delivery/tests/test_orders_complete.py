@@ -1,7 +1,9 @@
 import pytest
 import json
 from rest_framework import status
-from candy_shop.apps.delivery.models import Order
+from rest_framework.exceptions import ValidationError
+from candy_shop.apps.delivery.models import Order, Courier
+from candy_shop.apps.delivery.services import complete_order
 
 
 @pytest.fixture
@@ -105,3 +107,70 @@ def test_complete_twice(simple_setup, client):
 
     assert Order.objects.get(pk=1).complete_time == complete_time
 
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_complete_updates_delivery(simple_setup, client):
+    order = Order.objects.get(pk=1)
+    delivery = order.delivery
+    assert delivery.courier_id == 1
+    assert delivery.assigned_time == order.assigned_time
+    assert (delivery.n_orders_open, delivery.n_orders_complete) == (1, 0)
+    assert Courier.objects.get(pk=1).earnings == 0
+
+    complete = {
+        "courier_id": 1,
+        "order_id": 1,
+    }
+    response = client.post(
+        '/orders/complete',
+        json.dumps(complete),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+
+    order.refresh_from_db()
+    delivery.refresh_from_db()
+    assert (delivery.n_orders_open, delivery.n_orders_complete) == (0, 1)
+    assert delivery.last_complete_time == order.complete_time
+    assert order.delivery_time == order.complete_time - order.assigned_time
+    assert Courier.objects.get(pk=1).earnings == 500 * 2
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_complete_stale_order_twice(simple_setup, client):
+    courier = Courier.objects.get(pk=1)
+    stale_order = Order.objects.get(pk=1)
+    complete_order(courier, Order.objects.get(pk=1))
+    order = complete_order(courier, stale_order)
+    assert order.status == Order.OrderStatus.COMPLETE
+
+    delivery = order.delivery
+    assert (delivery.n_orders_open, delivery.n_orders_complete) == (0, 1)
+    stats, = courier.region_stats.all()
+    assert stats.n_orders_complete == 1
+    assert stats.delivery_time_sum == order.delivery_time
+    assert Courier.objects.get(pk=1).assigned_weight == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_complete_after_rebalance(simple_setup, client):
+    courier = Courier.objects.get(pk=1)
+    stale_order = Order.objects.get(pk=1)
+    delivery = stale_order.delivery
+    response = client.patch('/couriers/1', json.dumps({"regions": [2]}),
+                            content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert Order.objects.get(pk=1).status == Order.OrderStatus.OPEN
+
+    with pytest.raises(ValidationError):
+        complete_order(courier, stale_order)
+    delivery.refresh_from_db()
+    assert (delivery.n_orders_open, delivery.n_orders_complete) == (0, 0)
+    assert not courier.region_stats.exists()
+
+    response = client.post('/orders/complete',
+                           json.dumps({"courier_id": 1, "order_id": 1}),
+                           content_type="application/json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,145 @@
+import pytest
+import json
+from rest_framework import status
+from candy_shop.apps.delivery.models import Order
+
+
+@pytest.fixture
+def setup_db(client):
+    couriers = {
+        "data": [
+            {
+                "courier_id": 1,
+                "courier_type": "foot",
+                "regions": [1],
+                "working_hours": ["09:00-18:00"]
+            },
+            {
+                "courier_id": 2,
+                "courier_type": "car",
+                "regions": [1, 2],
+                "working_hours": ["09:00-18:00"]
+            },
+            {
+                "courier_id": 3,
+                "courier_type": "bike",
+                "regions": [1],
+                "working_hours": ["09:10-09:20"]
+            },
+        ]
+    }
+    response = client.post(
+        '/couriers',
+        json.dumps(couriers),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    orders = {
+        "data": [
+            {
+                "order_id": 1,
+                "weight": 30,
+                "region": 1,
+                "delivery_hours": ["09:00-18:00"]
+            },
+            {
+                "order_id": 2,
+                "weight": 8,
+                "region": 1,
+                "delivery_hours": ["09:00-18:00"]
+            },
+            {
+                "order_id": 3,
+                "weight": 2,
+                "region": 1,
+                "delivery_hours": ["09:00-18:00"]
+            },
+            {
+                "order_id": 4,
+                "weight": 5,
+                "region": 2,
+                "delivery_hours": ["09:00-18:00"]
+            },
+            {
+                "order_id": 5,
+                "weight": 1,
+                "region": 1,
+                "delivery_hours": ["09:00-09:10"]
+            },
+        ]
+    }
+    response = client.post(
+        '/orders',
+        json.dumps(orders),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+def get_assigned_ids(response):
+    return {
+        c['courier_id']: {o['id'] for o in c['orders']}
+        for c in response.data['couriers']
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_dispatch_couriers(client, setup_db):
+    dispatch = {
+        "courier_ids": [1, 2, 3]
+    }
+    response = client.post(
+        '/orders/dispatch',
+        json.dumps(dispatch),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    # couriers with fewer candidates choose first,
+    # the order 5 is out of the working hours of the courier 3
+    assert get_assigned_ids(response) == {1: {5}, 2: {1, 4}, 3: {2, 3}}
+    assert not Order.objects.filter(status=Order.OrderStatus.OPEN).exists()
+
+    response = client.post(
+        '/orders/dispatch',
+        json.dumps(dispatch),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert get_assigned_ids(response) == {1: set(), 2: set(), 3: set()}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_dispatch_idle_couriers_of_regions(client, setup_db):
+    assign = {
+        "courier_id": 1
+    }
+    response = client.post(
+        '/orders/assign',
+        json.dumps(assign),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+
+    dispatch = {
+        "regions": [2]
+    }
+    response = client.post(
+        '/orders/dispatch',
+        json.dumps(dispatch),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert get_assigned_ids(response) == {2: {1, 4, 5}}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.parametrize('dispatch', [
+    {"courier_ids": [1, 4]},
+    {"courier_ids": [1], "regions": [1]},
+    {},
+])
+def test_invalid_dispatch(client, setup_db, dispatch):
+    response = client.post(
+        '/orders/dispatch',
+        json.dumps(dispatch),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not Order.objects.filter(status=Order.OrderStatus.ASSIGNED).exists()
@@ -0,0 +1,115 @@
+import pytest
+import json
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from candy_shop.apps.delivery.models import Order
+
+
+@pytest.fixture
+def setup_db(client):
+    couriers = {
+        "data": [
+            {
+                "courier_id": 1,
+                "courier_type": "car",
+                "regions": [1],
+                "working_hours": ["09:00-18:00"]
+            },
+        ]
+    }
+    response = client.post(
+        '/couriers',
+        json.dumps(couriers),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    orders = {
+        "data": [
+            {
+                "order_id": order_id,
+                "weight": 10,
+                "region": order_id % 3 + 1,
+                "delivery_hours": ["09:00-12:00", "14:00-18:00"]
+            }
+            for order_id in range(1, 601)
+        ]
+    }
+    response = client.post(
+        '/orders',
+        json.dumps(orders),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = client.post(
+        '/orders/assign',
+        json.dumps({"courier_id": 1}),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_200_OK
+    assert {o['id'] for o in response.data['orders']} == {3, 6, 9, 12, 15}
+
+
+def get_all_pages(client, params):
+    order_ids = []
+    url = '/orders'
+    while url:
+        response = client.get(url, params)
+        assert response.status_code == status.HTTP_200_OK
+        order_ids.extend(o['order_id'] for o in response.data['results'])
+        url, params = response.data['next'], None
+    return order_ids
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_filters(client, setup_db):
+    assert get_all_pages(client, {'status': 'assigned'}) == [3, 6, 9, 12, 15]
+    assert get_all_pages(client, {'courier': 1}) == [3, 6, 9, 12, 15]
+    assert (get_all_pages(client, {'status': 'open', 'region': 1}) ==
+            list(range(18, 601, 3)))
+    assert (get_all_pages(client, {'status': ['open', 'assigned'],
+                                   'region': [1, 2], 'limit': 50}) ==
+            [pk for pk in range(1, 601) if pk % 3 != 2])
+
+    assigned_time = Order.objects.get(pk=3).assigned_time
+    assert get_all_pages(client, {
+        'assigned_after': assigned_time.isoformat(),
+        'assigned_before': timezone.now().isoformat(),
+    }) == [3, 6, 9, 12, 15]
+    assert get_all_pages(client, {
+        'assigned_before': assigned_time.isoformat(),
+    }) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.parametrize('params', [
+    {'status': 'lost'},
+    {'region': 'one'},
+    {'courier': 0},
+    {'assigned_after': 'yesterday'},
+])
+def test_invalid_filters(client, setup_db, params):
+    response = client.get('/orders', params)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_page_query_count(client, setup_db):
+    url = '/orders?limit=500'
+    while url:
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(ctx.captured_queries) <= 3
+        url = response.data['next']
+
+    order = response.data['results'][-1]
+    assert order == {
+        'order_id': 600,
+        'weight': '10.00',
+        'region': 1,
+        'delivery_hours': ['09:00-12:00', '14:00-18:00'],
+    }
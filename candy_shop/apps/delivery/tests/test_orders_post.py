@@ -1,7 +1,10 @@
 import pytest
 import json
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from candy_shop.apps.delivery.models import Order, Region
+from candy_shop.apps.delivery.regions import region_registry
 from copy import deepcopy
 from decimal import Decimal
 
@@ -100,3 +103,89 @@ def test_invalid_delivery_hours(client, post_and_assert_fn):
     incorrect_data = deepcopy(CORRECT_POST_DATA)
     incorrect_data['data'][0]['delivery_hours'] = '03.09.09 10:00-15:00'
     post_and_assert_fn(client, incorrect_data)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_duplicate_ids(client):
+    response = client.post(
+        '/orders',
+        json.dumps(CORRECT_POST_DATA),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    data = deepcopy(CORRECT_POST_DATA)
+    for i, o in enumerate(data['data']):
+        o['order_id'] = 10 + i
+    data['data'][1]['order_id'] = 1
+    data['data'][2]['order_id'] = 10
+    response = client.post(
+        '/orders',
+        json.dumps(data),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    errors = response.data['validation_error']['orders']
+    assert set(str(e['id']) for e in errors) == {'1', '10'}
+    assert Order.objects.count() == 3
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_query_count_does_not_depend_on_batch_size(client):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    def post_batch(first_id, size):
+        data = {
+            "data": [
+                {
+                    "order_id": first_id + i,
+                    "weight": 1,
+                    "region": i % 7 + 1,
+                    "delivery_hours": ["09:00-12:00", "16:00-21:30"]
+                }
+                for i in range(size)
+            ]
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(
+                '/orders',
+                json.dumps(data),
+                content_type="application/json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data['orders']) == size
+        return len(ctx.captured_queries)
+
+    # the batch fits into one INSERT even with SQLite limit of 999 parameters
+    assert post_batch(1, 5) == post_batch(100, 60)
+    assert Order.objects.count() == 65
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.integration
+def test_known_regions_are_not_queried(client):
+    def post_orders(orders):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(
+                '/orders',
+                json.dumps({"data": orders}),
+                content_type="application/json")
+        assert response.status_code == status.HTTP_201_CREATED
+        return [q['sql'] for q in ctx.captured_queries
+                if 'delivery_region' in q['sql']]
+
+    region_registry.clear()
+    orders = deepcopy(CORRECT_POST_DATA['data'])
+    assert len(post_orders(orders[:2])) == 2
+    assert region_registry.region_ids == {1, 12}
+
+    for order_id, o in enumerate(orders, start=4):
+        o['order_id'] = order_id
+    # only the new region is inserted
+    assert len(post_orders(orders)) == 2
+    assert region_registry.region_ids == {1, 12, 22}
+    assert Region.objects.count() == 3
+
+    for order_id, o in enumerate(orders, start=7):
+        o['order_id'] = order_id
+    assert post_orders(orders) == []
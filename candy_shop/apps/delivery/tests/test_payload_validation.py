@@ -0,0 +1,162 @@
+import pytest
+import timeit
+from rest_framework import serializers
+from candy_shop.apps.delivery.serializers import (CourierSerializer,
+                                                  OrderSerializer)
+
+
+def validate_with_serializer(serializer_class, items):
+    serializer = serializers.ListSerializer(
+        child=serializer_class(), data=items)
+    if serializer.is_valid():
+        return [dict(d) for d in serializer.validated_data], None
+    return None, serializer.errors
+
+
+def validate_with_payload_validator(serializer_class, items):
+    validated_data, errors = serializer_class.payload_validator(items)
+    if any(errors):
+        return None, serializers.ValidationError(errors).detail
+    return validated_data, None
+
+
+COURIER = {
+    "courier_id": 1,
+    "courier_type": "foot",
+    "regions": [1, 2],
+    "working_hours": ["09:00-18:00"]
+}
+
+ORDER = {
+    "order_id": 1,
+    "weight": 0.23,
+    "region": 12,
+    "delivery_hours": ["09:00-18:00"]
+}
+
+COURIER_VARIANTS = [
+    {},
+    {"courier_id": "12"},
+    {"courier_id": 12.0},
+    {"courier_id": "12.00 "},
+    {"courier_id": 12.5},
+    {"courier_id": True},
+    {"courier_id": None},
+    {"courier_id": [1]},
+    {"courier_type": "car"},
+    {"courier_type": "carpet-plane"},
+    {"courier_type": 10},
+    {"courier_type": ["foot"]},
+    {"courier_type": None},
+    {"regions": []},
+    {"regions": (3, "4")},
+    {"regions": [0]},
+    {"regions": [None]},
+    {"regions": "12"},
+    {"regions": {1: 1}},
+    {"regions": 1},
+    {"working_hours": []},
+    {"working_hours": ["09:00-18:00", "23:59-00:00"]},
+    {"working_hours": "09:00-18:00"},
+    {"working_hours": ["9:00-18:00"]},
+    {"working_hours": ["09:00-18:00\n"]},
+    {"working_hours": ["24:00-25:00"]},
+    {"working_hours": ["10:00-09:00"]},
+    {"working_hours": [900]},
+    {"working_hours": None},
+    {"unknown": 1},
+]
+
+ORDER_VARIANTS = [
+    {},
+    {"order_id": "7"},
+    {"order_id": -7},
+    {"order_id": "x"},
+    {"weight": 50},
+    {"weight": "50.00"},
+    {"weight": " 2 "},
+    {"weight": 0.01},
+    {"weight": 0.001},
+    {"weight": 50.01},
+    {"weight": 1.005},
+    {"weight": 1e2},
+    {"weight": "NaN"},
+    {"weight": "Infinity"},
+    {"weight": True},
+    {"weight": None},
+    {"weight": [1]},
+    {"region": "3"},
+    {"region": 0},
+    {"region": [1]},
+    {"delivery_hours": ["12:00-13:00", "14:00-15:30"]},
+    {"delivery_hours": "03.09.09 10:00-15:00"},
+    {"delivery_hours": [None]},
+    {"delivery_hours": ["12:00-12:00"]},
+    {"extra": None},
+]
+
+
+def build_cases(item, variants):
+    cases = [[dict(item, **v)] for v in variants]
+    # missing fields
+    cases += [[{k: v for k, v in item.items() if k != key}] for key in item]
+    # mixed batches and items which aren't objects
+    cases.append([dict(item, **v) for v in variants])
+    cases.append([item, 5, [item]])
+    return cases
+
+
+@pytest.mark.parametrize('serializer_class, items', (
+    [(CourierSerializer, c) for c in build_cases(COURIER, COURIER_VARIANTS)] +
+    [(OrderSerializer, c) for c in build_cases(ORDER, ORDER_VARIANTS)]
+))
+def test_payload_validator_matches_serializer(serializer_class, items):
+    expected = validate_with_serializer(serializer_class, items)
+    actual = validate_with_payload_validator(serializer_class, items)
+    assert actual == expected
+
+
+def generate_orders(n):
+    return [
+        {
+            "order_id": i,
+            "weight": round(0.01 + i % 5000 / 100, 2),
+            "region": i % 100 + 1,
+            "delivery_hours": ["09:00-12:00", "16:00-21:30"]
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def generate_couriers(n):
+    return [
+        {
+            "courier_id": i,
+            "courier_type": ["foot", "bike", "car"][i % 3],
+            "regions": [i % 100 + 1, i % 7 + 1],
+            "working_hours": ["09:00-12:00", "16:00-21:30"]
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('serializer_class, items', [
+    (CourierSerializer, generate_couriers(10000)),
+    (OrderSerializer, generate_orders(10000)),
+])
+def test_payload_validator_speedup(serializer_class, items):
+    # the best of several runs, garbage collection is disabled by timeit
+    serializer_time = min(timeit.repeat(
+        lambda: validate_with_serializer(serializer_class, items),
+        number=1, repeat=3))
+    validator_time = min(timeit.repeat(
+        lambda: validate_with_payload_validator(serializer_class, items),
+        number=1, repeat=3))
+
+    print(f"{serializer_class.__name__}: serializer {serializer_time:.3f}s, "
+          f"payload validator {validator_time:.3f}s, "
+          f"speedup {serializer_time / validator_time:.1f}x")
+    assert (validate_with_payload_validator(serializer_class, items) ==
+            validate_with_serializer(serializer_class, items))
+    assert serializer_time / validator_time >= 10
@@ -0,0 +1,81 @@
+import pytest
+import json
+import pstats
+import threading
+import tracemalloc
+from io import StringIO
+from django.core.management import call_command
+from django.http import HttpResponse
+from rest_framework import status
+from candy_shop.apps.delivery.profiling import ProfilingMiddleware
+
+
+@pytest.fixture
+def profile_settings(settings, tmp_path):
+    settings.DELIVERY_PROFILE_KEY = 'profiling key'
+    settings.DELIVERY_PROFILE_DIR = str(tmp_path)
+    return settings
+
+
+def sign(path):
+    out = StringIO()
+    call_command('sign_profile_request', path, stdout=out)
+    return out.getvalue().strip()
+
+
+def assign(client, **headers):
+    response = client.post('/orders/assign', json.dumps({"courier_id": 1}),
+                           content_type="application/json", **headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_signed_requests_are_profiled(client, profile_settings, tmp_path):
+    assign(client, HTTP_X_DELIVERY_PROFILE=sign('/orders/assign'))
+
+    profile, = tmp_path.glob('*.prof')
+    assert '-AssignView-courier_id1-' in profile.name
+    stats = pstats.Stats(str(profile))
+    assert any(name == 'post' for _, _, name in stats.stats)
+    allocations = profile.with_suffix('.alloc.txt')
+    assert allocations.read_text()
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_other_requests_are_not_profiled(client, profile_settings, tmp_path):
+    assign(client)
+    assign(client, HTTP_X_DELIVERY_PROFILE=sign('/orders/complete'))
+    assign(client, HTTP_X_DELIVERY_PROFILE='/orders/assign:forged')
+    profile_settings.DELIVERY_PROFILE_MAX_AGE = -1
+    assign(client, HTTP_X_DELIVERY_PROFILE=sign('/orders/assign'))
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.django_db
+def test_overlapping_requests_are_profiled(profile_settings, tmp_path, rf):
+    headers = {'HTTP_X_DELIVERY_PROFILE': sign('/orders/assign')}
+    requests = [rf.post('/orders/assign', **headers) for _ in range(2)]
+    second_started = threading.Event()
+    first_finished = threading.Event()
+
+    def get_response(request):
+        if request is requests[0]:
+            # the second request ends after the first one
+            thread.start()
+            second_started.wait()
+        else:
+            second_started.set()
+            first_finished.wait()
+        return HttpResponse()
+
+    middleware = ProfilingMiddleware(get_response)
+    thread = threading.Thread(target=middleware, args=(requests[1],))
+    middleware(requests[0])
+    first_finished.set()
+    thread.join()
+
+    assert len(list(tmp_path.glob('*.prof'))) == 2
+    assert len(list(tmp_path.glob('*.alloc.txt'))) == 2
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,185 @@
+import pytest
+import json
+import re
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from candy_shop.apps.delivery.models import Courier, Order, DeliveryHours
+from candy_shop.apps.delivery.services import assign_orders, complete_order
+
+N_COURIERS = 30
+N_ORDERS = 600
+
+
+@pytest.fixture
+def seeded_db(seed):
+    couriers = seed(N_COURIERS, N_ORDERS, max_weight=20)
+    for courier in couriers[:N_COURIERS // 2]:
+        for order in Order.objects.filter(pk__in=assign_orders(courier))[:1]:
+            complete_order(courier, order)
+    if connection.vendor == 'postgresql':
+        # statistics left by autovacuum after other tests make plans vary
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def unaligned(courier):
+    courier.working_slots_aligned = False
+    return courier
+
+
+def get_plan(queryset):
+    if connection.vendor == 'postgresql':
+        # the tables are small, so that the planner would scan them anyway,
+        # a sequential scan still happens when no index is usable
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    return queryset.explain()
+
+
+def uses_index(plan, index, columns):
+    """
+    Whether a PostgreSQL plan scans `index`, or any of a tuple of them,
+    with a condition on `columns`
+    """
+    names = '|'.join(index) if isinstance(index, tuple) else index
+    lines = plan.splitlines()
+    for i, line in enumerate(lines):
+        if not re.search(rf'\b(using|on) ({names})\b', line):
+            continue
+        # conditions of the node precede its children
+        for condition in lines[i + 1:]:
+            if '->' in condition:
+                break
+            if 'Index Cond:' in condition and all(
+                    re.search(rf'\b{column}\b', condition)
+                    for column in columns):
+                return True
+    return False
+
+
+def is_full_scan(plan):
+    if connection.vendor == 'postgresql':
+        return 'Seq Scan' in plan
+    # SQLite has SEARCH for index lookups and SCAN for full scans
+    return re.search(r'\bSCAN\b(?! CONSTANT ROW)', plan) is not None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('get_queryset, index', [
+    pytest.param(
+        lambda c: Order.objects.get_available_orders(c),
+        ('order_open_region_weight_idx', ['weight']),
+        id='available_orders'),
+    pytest.param(
+        lambda c: Order.objects.get_available_orders(unaligned(c)),
+        ('order_open_region_weight_idx', ['weight']),
+        id='available_orders_unaligned'),
+    pytest.param(
+        lambda c: (Order.objects.get_available_orders(c)
+                                .order_by('-weight', 'order_id')[:100]),
+        ('order_open_region_weight_idx', ['weight']),
+        id='assignment_candidates'),
+    pytest.param(
+        lambda c: Order.objects.filter(
+            region__in=c.regions.all(), status=Order.OrderStatus.OPEN),
+        # either index is chosen depending on statistics
+        (('order_open_region_weight_idx', 'order_region_status_idx'),
+         ['region_id']),
+        id='dispatch_candidates'),
+    pytest.param(
+        lambda c: c.orders.filter(status=Order.OrderStatus.ASSIGNED),
+        ('order_courier_status_idx', ['courier_id', 'status']),
+        id='assigned_orders'),
+    pytest.param(
+        lambda c: Order.objects.filter(
+            region__in=[1],
+            status__in=[Order.OrderStatus.OPEN, Order.OrderStatus.ASSIGNED],
+        ).order_by('pk')[:500],
+        # a fifth of the orders are in the region, so that the index is
+        # cheaper than reading all of them by pk, most orders match
+        # the statuses, so they are filtered after the scan
+        ('order_region_status_idx', ['region_id']),
+        id='orders_list_by_region'),
+    pytest.param(
+        lambda c: Order.objects.filter(
+            assigned_time__gte=timezone.now() - timedelta(hours=1)),
+        ('order_assigned_time_idx', ['assigned_time']),
+        id='orders_list_by_assigned_time'),
+    pytest.param(
+        lambda c: c.deliveries.filter(n_orders_open=0,
+                                      n_orders_complete__gt=0),
+        ('delivery_courier_open_idx', ['courier_id', 'n_orders_open']),
+        id='complete_deliveries'),
+    pytest.param(
+        lambda c: c.region_stats.all(),
+        ('delivery_courierregionstats_courier_id_4756f796', ['courier_id']),
+        id='region_stats'),
+    pytest.param(
+        lambda c: c.working_hours.all(),
+        ('working_hours_bounds_idx', ['courier_id']),
+        id='working_hours'),
+    pytest.param(
+        lambda c: DeliveryHours.objects.filter(order__in=[1, 2, 3]),
+        ('delivery_hours_bounds_idx', ['order_id']),
+        id='delivery_hours'),
+])
+def test_queries_use_indexes(seeded_db, get_queryset, index):
+    courier = Courier.objects.get(pk=1)
+    plan = get_plan(get_queryset(courier))
+    assert not is_full_scan(plan), plan
+    if connection.vendor == 'postgresql':
+        assert uses_index(plan, *index), plan
+
+
+# queries of every endpoint on the seeded dataset,
+# they must not depend on the number of orders, dispatch takes
+# three queries per courier which gets orders: the delivery is created,
+# the orders are updated and so is the courier's assigned weight
+QUERY_BUDGETS = {
+    'list_couriers': 4,
+    'get_courier': 4,
+    'patch_courier': 8,
+    'assign': 9,
+    'complete': 14,
+    'dispatch': 62,
+}
+
+
+def count_queries(request):
+    with CaptureQueriesContext(connection) as ctx:
+        response = request()
+    assert response.status_code == status.HTTP_200_OK, response.data
+    return len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_query_budgets(seeded_db, client):
+    def post(path, data):
+        return client.post(path, json.dumps(data),
+                           content_type="application/json")
+
+    courier_id = N_COURIERS
+    n_queries = {
+        'list_couriers': count_queries(
+            lambda: client.get('/couriers', {'limit': 10})),
+        'get_courier': count_queries(
+            lambda: client.get(f'/couriers/{courier_id}')),
+        'patch_courier': count_queries(
+            lambda: client.patch(
+                f'/couriers/{courier_id}',
+                json.dumps({'regions': [1, 2, 3, 4, 5]}),
+                content_type="application/json")),
+        'assign': count_queries(
+            lambda: post('/orders/assign', {'courier_id': courier_id})),
+    }
+    order = Order.objects.filter(courier=courier_id).first()
+    n_queries['complete'] = count_queries(
+        lambda: post('/orders/complete',
+                     {'courier_id': courier_id, 'order_id': order.pk}))
+    n_queries['dispatch'] = count_queries(
+        lambda: post('/orders/dispatch', {'regions': [1, 2, 3, 4, 5]}))
+    assert n_queries == QUERY_BUDGETS
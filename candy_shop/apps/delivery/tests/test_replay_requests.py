@@ -0,0 +1,59 @@
+import pytest
+import json
+from io import StringIO
+from django.core.management import call_command
+from django.test import override_settings
+from candy_shop.apps.delivery.models import Courier, Order
+
+
+REQUESTS = [
+    {
+        'method': 'POST',
+        'path': '/couriers',
+        'body': {'data': [{'courier_id': 1, 'courier_type': 'car',
+                           'regions': [1], 'working_hours': ['09:00-18:00']}]},
+    },
+    {
+        'method': 'POST',
+        'path': '/orders',
+        'body': {'data': [{'order_id': order_id, 'weight': 1, 'region': 1,
+                           'delivery_hours': ['10:00-12:00']}
+                          for order_id in range(1, 6)]},
+    },
+    {'method': 'POST', 'path': '/orders/assign', 'body': {'courier_id': 1}},
+    {'method': 'GET', 'path': '/couriers/1'},
+    {'method': 'GET', 'path': '/couriers/2'},
+]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.integration
+def test_capture_and_replay(client, tmp_path):
+    log = tmp_path / 'requests.jsonl'
+    with override_settings(DELIVERY_REQUEST_CAPTURE_FILE=str(log)):
+        # the client's handler loads middleware on the first request
+        for request in REQUESTS:
+            client.generic(request['method'], request['path'],
+                           json.dumps(request.get('body')),
+                           content_type='application/json')
+    captured = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(r['method'], r['path'], r.get('body')) for r in captured] == [
+        (r['method'], r['path'], r.get('body')) for r in REQUESTS]
+
+    Order.objects.all().delete()
+    Courier.objects.all().delete()
+    report = tmp_path / 'report.json'
+    out = StringIO()
+    call_command('replay_requests', str(log), '--concurrency', '1',
+                 '--report', str(report), stdout=out)
+    assert Order.objects.filter(courier=1).count() == 5
+
+    summary = json.loads(report.read_text())
+    assert summary['requests'] == len(REQUESTS)
+    endpoints = summary['endpoints']
+    assert set(endpoints) == {'POST /couriers', 'POST /orders',
+                              'POST /orders/assign', 'GET /couriers/{id}'}
+    assert endpoints['GET /couriers/{id}']['requests'] == 2
+    assert endpoints['GET /couriers/{id}']['errors'] == 1
+    assert endpoints['POST /orders/assign']['queries'] > 0
+    assert 'POST /orders/assign' in out.getvalue()
@@ -0,0 +1,40 @@
+import pytest
+import json
+from io import StringIO
+from django.core.management import call_command
+from candy_shop.apps.delivery.benchmarks import BENCHMARKS
+from candy_shop.apps.delivery.models import Courier, Order, Delivery
+
+
+def get_state():
+    return (
+        dict(Order.objects.values_list('pk', 'status')),
+        dict(Courier.objects.values_list('pk', 'assigned_weight')),
+        Delivery.objects.count(),
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_seed_and_run_benchmarks(tmp_path):
+    call_command('seed_data', '--couriers', '30', '--orders', '500',
+                 '--regions', '5', '--chunk-size', '200', stdout=StringIO())
+    assert Courier.objects.count() == 30
+    statuses = set(Order.objects.values_list('status', flat=True))
+    assert statuses == set(Order.OrderStatus.values)
+    # running aggregates are consistent with the generated history
+    call_command('reconcile_assigned_weight', '--check', stdout=StringIO())
+    call_command('rebuild_region_stats', '--check', stdout=StringIO())
+    assert not Delivery.objects.filter(n_orders_open=0,
+                                       n_orders_complete=0).exists()
+
+    state = get_state()
+    report = tmp_path / 'report.json'
+    call_command('run_benchmarks', '--samples', '3', '--report', str(report),
+                 stdout=StringIO())
+    assert get_state() == state
+
+    report = json.loads(report.read_text())
+    assert report['dataset']['orders'] == 500
+    assert set(report['benchmarks']) == set(BENCHMARKS)
+    assert all(b['samples'] == 3 for b in report['benchmarks'].values())
@@ -0,0 +1,145 @@
+import pytest
+import json
+import io
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from candy_shop.apps.delivery.models import Courier, Order
+from candy_shop.apps.delivery.parsers import JSONStreamReader
+from .test_couriers_post import CORRECT_POST_DATA as COURIERS_DATA
+from .test_orders_post import CORRECT_POST_DATA as ORDERS_DATA
+from copy import deepcopy
+
+
+@pytest.mark.parametrize('read_size', [1, 3, 7, 1024])
+def test_stream_reader(read_size):
+    payload = {
+        "before": {"data": [1, 2]},
+        "data": [
+            {"id": 12345, "weight": 0.25, "s": "при, ]"},
+            [],
+            -10.5e3,
+            "x",
+        ],
+        "after": None,
+    }
+    stream = io.BytesIO(json.dumps(payload, ensure_ascii=False).encode())
+    reader = JSONStreamReader(stream, read_size=read_size)
+    assert list(reader.iter_items('data')) == payload['data']
+
+
+class GeneratedStream:
+    """
+    A payload of `n_items` orders which is generated on the fly,
+    so that the payload itself doesn't take memory
+    """
+    def __init__(self, n_items):
+        self.parts = self.generate(n_items)
+        self.rest = b''
+
+    def generate(self, n_items):
+        yield b'{"data": ['
+        for i in range(n_items):
+            item = {"order_id": i, "weight": 1.5, "region": 1,
+                    "delivery_hours": ["09:00-18:00"]}
+            separator = b',' if i < n_items - 1 else b''
+            yield json.dumps(item).encode() + separator
+        yield b']}'
+
+    def read(self, size):
+        while len(self.rest) < size:
+            part = next(self.parts, None)
+            if part is None:
+                break
+            self.rest += part
+        data, self.rest = self.rest[:size], self.rest[size:]
+        return data
+
+
+def test_stream_reader_memory_is_bounded():
+    import tracemalloc
+    reader = JSONStreamReader(GeneratedStream(20000))
+    tracemalloc.start()
+    n_items = sum(1 for _ in reader.iter_items('data'))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert n_items == 20000
+    # the payload is about 1.7 MB
+    assert peak < 512 * 1024
+
+
+@pytest.mark.parametrize('payload', [
+    b'{"data": [1, 2',
+    b'{"data": [1, 2]} []',
+    b'{"data": [1 2]}',
+    b'{"other": [1, 2]}',
+    b'{"data": [NaN]}',
+    b'[]',
+])
+def test_stream_reader_invalid_json(payload):
+    reader = JSONStreamReader(io.BytesIO(payload), read_size=4)
+    with pytest.raises(ParseError):
+        list(reader.iter_items('data'))
+
+
+@pytest.fixture
+def streaming_settings(settings):
+    settings.DELIVERY_STREAMING_MIN_SIZE = 0
+    settings.DELIVERY_STREAMING_CHUNK_SIZE = 2
+    return settings
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_successful_streaming_post(client, streaming_settings):
+    response = client.post(
+        '/couriers',
+        json.dumps(COURIERS_DATA),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [c['id'] for c in response.data['couriers']] == [1, 2, 23]
+    assert Courier.objects.count() == 3
+
+    response = client.post(
+        '/orders',
+        json.dumps(ORDERS_DATA),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [o['id'] for o in response.data['orders']] == [1, 2, 3]
+    assert Order.objects.count() == 3
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_invalid_streaming_post_is_rolled_back(client, streaming_settings):
+    data = deepcopy(ORDERS_DATA)
+    data['data'][2]['weight'] = 51
+    response = client.post(
+        '/orders',
+        json.dumps(data),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    errors = response.data['validation_error']['orders']
+    assert [str(e['id']) for e in errors] == ['3']
+    assert Order.objects.count() == 0
+
+    data = deepcopy(ORDERS_DATA)
+    data['data'][2]['order_id'] = 1
+    response = client.post(
+        '/orders',
+        json.dumps(data),
+        content_type="application/json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    errors = response.data['validation_error']['orders']
+    assert [str(e['id']) for e in errors] == ['1']
+    assert Order.objects.count() == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_malformed_streaming_post(client, streaming_settings):
+    response = client.post(
+        '/orders',
+        json.dumps(ORDERS_DATA)[:-10],
+        content_type="application/json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert Order.objects.count() == 0
@@ -0,0 +1,97 @@
+import pytest
+import json
+import os
+from rest_framework import status
+
+
+@pytest.fixture
+def trace_settings(settings, tmp_path):
+    settings.DELIVERY_TRACE_FILE = str(tmp_path / 'trace.log')
+    settings.DELIVERY_TRACE_SAMPLE_RATE = 1
+    settings.DELIVERY_TRACE_SLOW_SECONDS = 0
+    return settings
+
+
+def read_traces(settings):
+    with open(settings.DELIVERY_TRACE_FILE) as f:
+        return [json.loads(line) for line in f]
+
+
+def get_names(span):
+    return [span['name']] + [name for child in span.get('children', [])
+                             for name in get_names(child)]
+
+
+COURIERS = {
+    "data": [
+        {
+            "courier_id": courier_id,
+            "courier_type": "car",
+            "regions": [1],
+            "working_hours": ["09:00-18:00"]
+        }
+        for courier_id in range(1, 11)
+    ]
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_slow_requests_are_traced(client, trace_settings):
+    response = client.post('/couriers', json.dumps(COURIERS),
+                           content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    trace, = read_traces(trace_settings)
+    assert trace['status'] == status.HTTP_201_CREATED
+    root = trace['span']
+    assert root['name'] == 'POST /couriers'
+    assert [c['name'] for c in root['children']] == [
+        'parse', 'validate', 'services.create_couriers', 'render']
+    assert sum(c.get('queries', 0) for c in root['children']) > 0
+    assert all(c['ms'] <= root['ms'] for c in root['children'])
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_streaming_upload_is_traced(client, trace_settings):
+    trace_settings.DELIVERY_STREAMING_MIN_SIZE = 0
+    trace_settings.DELIVERY_STREAMING_CHUNK_SIZE = 4
+    response = client.post('/couriers', json.dumps(COURIERS),
+                           content_type="application/json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    trace, = read_traces(trace_settings)
+    names = get_names(trace['span'])
+    assert names.count('validate') == 3
+    assert names.count('services.create_couriers') == 3
+    # the last one finds the end of the array
+    assert names.count('parse') == 4
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_fast_and_unsampled_requests_are_not_written(client, trace_settings):
+    trace_settings.DELIVERY_TRACE_SLOW_SECONDS = 60
+    client.post('/orders/assign', json.dumps({"courier_id": 1}),
+                content_type="application/json")
+    trace_settings.DELIVERY_TRACE_SLOW_SECONDS = 0
+    trace_settings.DELIVERY_TRACE_SAMPLE_RATE = 0
+    client.post('/orders/assign', json.dumps({"courier_id": 1}),
+                content_type="application/json")
+    assert read_traces(trace_settings) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_trace_file_is_reopened_after_rotation(client, trace_settings):
+    def assign():
+        client.post('/orders/assign', json.dumps({"courier_id": 1}),
+                    content_type="application/json")
+    assign()
+    rotated = trace_settings.DELIVERY_TRACE_FILE + '.1'
+    os.rename(trace_settings.DELIVERY_TRACE_FILE, rotated)
+    assign()
+    assert len(read_traces(trace_settings)) == 1
+    with open(rotated) as f:
+        assert len(f.readlines()) == 1
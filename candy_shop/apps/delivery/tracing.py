@@ -0,0 +1,167 @@
+import functools
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import WatchedFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .asynchronous import HybridMiddleware, wrapping_queries
+
+logger = logging.getLogger(__name__)
+
+# the innermost span of the current request if the request is sampled
+current_span = ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    A timed phase of a request with nested phases,
+    queries are counted in the innermost span they are made in
+    """
+    __slots__ = ('name', 'started', 'duration', 'children',
+                 'n_queries', 'db_duration')
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration = None
+        self.children = []
+        self.n_queries = 0
+        self.db_duration = 0
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def to_dict(self):
+        data = {'name': self.name, 'ms': round(self.duration * 1000, 3)}
+        if self.n_queries:
+            data['queries'] = self.n_queries
+            data['db_ms'] = round(self.db_duration * 1000, 3)
+        if self.children:
+            data['children'] = [child.to_dict() for child in self.children]
+        return data
+
+
+@contextmanager
+def span(name):
+    """
+    Times the block as a child of the current span,
+    does nothing when the request isn't sampled
+    """
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name)
+    parent.children.append(child)
+    token = current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        current_span.reset(token)
+
+
+def traced(func):
+    """
+    Times every call of the function as a span named after it
+    """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if current_span.get() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def traced_iter(iterable, name):
+    """
+    Times getting every item of the iterable, e.g. of a parser
+    """
+    iterator = iter(iterable)
+    while True:
+        with span(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def count_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current = current_span.get()
+        if current is not None:
+            current.n_queries += 1
+            current.db_duration += time.perf_counter() - started
+
+
+class TracingMiddleware(HybridMiddleware):
+    """
+    Traces a `DELIVERY_TRACE_SAMPLE_RATE` share of requests and writes
+    the ones slower than `DELIVERY_TRACE_SLOW_SECONDS` with their spans
+    to `DELIVERY_TRACE_FILE`. Worker processes append to the same file,
+    which is rotated externally and reopened when it is moved
+    """
+    def __init__(self, get_response):
+        if not settings.DELIVERY_TRACE_FILE:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        path = os.path.abspath(settings.DELIVERY_TRACE_FILE)
+        for handler in logger.handlers[:]:
+            if getattr(handler, 'baseFilename', None) != path:
+                logger.removeHandler(handler)
+                handler.close()
+        if not logger.handlers:
+            handler = WatchedFileHandler(path)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    def handle(self, request):
+        if random.random() >= settings.DELIVERY_TRACE_SAMPLE_RATE:
+            return self.get_response(request)
+        with self.trace(request) as root:
+            response = self.get_response(request)
+        self.log(root, response)
+        return response
+
+    async def handle_async(self, request):
+        if random.random() >= settings.DELIVERY_TRACE_SAMPLE_RATE:
+            return await self.get_response(request)
+        with self.trace(request) as root:
+            response = await self.get_response(request)
+        self.log(root, response)
+        return response
+
+    @contextmanager
+    def trace(self, request):
+        root = Span(f'{request.method} {request.path}')
+        token = current_span.set(root)
+        try:
+            with wrapping_queries(count_query):
+                yield root
+        finally:
+            root.finish()
+            current_span.reset(token)
+
+    def log(self, root, response):
+        if root.duration >= settings.DELIVERY_TRACE_SLOW_SECONDS:
+            logger.info(json.dumps({
+                'time': time.time(),
+                'status': response.status_code,
+                'span': root.to_dict(),
+            }))
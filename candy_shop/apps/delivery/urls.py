@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework import routers
-from .views import CourierViewSet, OrderViewSet, AssignView, CompleteOrderView
+from .views import (CourierViewSet, OrderViewSet, AssignView,
+                    CompleteOrderView, DispatchView, metrics)
 
 
 router = routers.DefaultRouter(trailing_slash=False)
@@ -10,6 +11,8 @@ router.register(r'orders', OrderViewSet)
 
 urlpatterns = [
     path('orders/assign', AssignView.as_view()),
+    path('orders/dispatch', DispatchView.as_view()),
     path('orders/complete', CompleteOrderView.as_view()),
+    path('metrics', metrics),
     path('', include(router.urls)),
 ]
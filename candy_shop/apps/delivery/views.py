@@ -1,85 +1,232 @@
+import hmac
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from rest_framework import viewsets, status, mixins
 from rest_framework.response import Response
+from .asynchronous import async_view
+from .metrics import metrics_registry
 from .models import Courier, Order
+from .pagination import DeliveryCursorPagination
+from .parsers import JSONStreamReader, iter_chunks
 from rest_framework.generics import GenericAPIView
 from .serializers import (CourierSerializer, OrderSerializer, AssignSerializer,
-                          CompleteOrderSerializer, CourierDetailsSerializer)
-from .services import assign_orders, complete_order
+                          CompleteOrderSerializer, CourierDetailsSerializer,
+                          DispatchSerializer, OrderFilterSerializer)
+from .services import assign_orders, complete_order, dispatch_orders
+from .tracing import current_span, span, traced_iter
+
+
+class AsyncViewMixin:
+    """
+    Makes views async with `DELIVERY_ASYNC_VIEWS`,
+    see `asynchronous.async_view`
+    """
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        view = super().as_view(*args, **kwargs)
+        if settings.DELIVERY_ASYNC_VIEWS:
+            view = async_view(view)
+        return view
+
+
+class TracedViewMixin:
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response,
+                                             *args, **kwargs)
+        # rendered here rather than by the handler to be traced
+        if isinstance(response, Response) and current_span.get():
+            with span('render'):
+                response.render()
+        return response
 
 
 class DeliveryCreateMixin(mixins.CreateModelMixin):
     entity_name = 'object'
     entity_id_field = 'id'
 
+    def is_streaming(self, request):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return False
+        return content_length >= settings.DELIVERY_STREAMING_MIN_SIZE
+
     def create(self, request, *args, **kwargs):
-        is_many = 'data' in request.data
+        if self.is_streaming(request):
+            return self.create_streaming(request)
+
+        with span('parse'):
+            data = request.data
+        is_many = 'data' in data
         serializer = self.get_serializer(
-            data=request.data['data'] if is_many else request.data,
+            data=data['data'] if is_many else data,
             many=is_many,
         )
-        if not serializer.is_valid(raise_exception=False):
+        with span('validate'):
+            is_valid = serializer.is_valid(raise_exception=False)
+        if not is_valid:
             errors = [e for e in serializer.errors if e]
             error_message = {'validation_error': {self.entity_name: errors}}
             return Response(error_message, status=status.HTTP_400_BAD_REQUEST)
 
         self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
+        # ids are taken from the created instances, rendering
+        # `serializer.data` would fetch every relation of every object
+        instances = serializer.instance if is_many else [serializer.instance]
         response_data = {
             self.entity_name: [
-                {'id': d[self.entity_id_field]} for d in serializer.data
+                {'id': getattr(obj, self.entity_id_field)} for obj in instances
             ]
         }
+        headers = self.get_success_headers(response_data)
         return Response(response_data,
                         status=status.HTTP_201_CREATED,
                         headers=headers)
 
+    def create_streaming(self, request):
+        """
+        Processes a large bulk upload without loading it into memory:
+        the `data` array is parsed incrementally, validated and inserted
+        in chunks inside one transaction, which is rolled back
+        if any of the items is invalid
+        """
+        reader = JSONStreamReader(request.stream)
+        chunks = iter_chunks(reader.iter_items('data'),
+                             settings.DELIVERY_STREAMING_CHUNK_SIZE)
+        created_ids = []
+        errors = []
+        with transaction.atomic():
+            for chunk in traced_iter(chunks, 'parse'):
+                serializer = self.get_serializer(data=chunk, many=True)
+                with span('validate'):
+                    is_valid = serializer.is_valid(raise_exception=False)
+                if not is_valid:
+                    errors.extend(e for e in serializer.errors if e)
+                elif not errors:
+                    self.perform_create(serializer)
+                    created_ids.extend(
+                        getattr(obj, self.entity_id_field)
+                        for obj in serializer.instance)
+            if errors:
+                transaction.set_rollback(True)
+
+        if errors:
+            error_message = {'validation_error': {self.entity_name: errors}}
+            return Response(error_message, status=status.HTTP_400_BAD_REQUEST)
+        response_data = {
+            self.entity_name: [{'id': pk} for pk in created_ids]
+        }
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
 
-class CourierViewSet(DeliveryCreateMixin,
+class CourierViewSet(AsyncViewMixin,
+                     TracedViewMixin,
+                     DeliveryCreateMixin,
                      mixins.RetrieveModelMixin,
                      mixins.UpdateModelMixin,
                      mixins.ListModelMixin,
                      viewsets.GenericViewSet):
     queryset = Courier.objects.all()
+    pagination_class = DeliveryCursorPagination
     entity_name = 'couriers'
     entity_id_field = 'courier_id'
 
+    def get_queryset(self):
+        if self.action == 'list' or self.action == 'retrieve':
+            return self.queryset.with_details()
+        return super().get_queryset()
+
     def get_serializer_class(self):
         if self.action == 'list' or self.action == 'retrieve':
             return CourierDetailsSerializer
         return CourierSerializer
 
 
-class OrderViewSet(DeliveryCreateMixin,
+class OrderViewSet(AsyncViewMixin,
+                   TracedViewMixin,
+                   DeliveryCreateMixin,
                    mixins.RetrieveModelMixin,
                    mixins.ListModelMixin,
                    viewsets.GenericViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = DeliveryCursorPagination
     entity_name = 'orders'
     entity_id_field = 'order_id'
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list' or self.action == 'retrieve':
+            queryset = queryset.prefetch_related('delivery_hours')
+        if self.action == 'list':
+            filters = OrderFilterSerializer(data=self.request.query_params)
+            filters.is_valid(raise_exception=True)
+            queryset = queryset.filter(**filters.get_lookups())
+        return queryset
+
 
-class AssignView(GenericAPIView):
+class AssignView(AsyncViewMixin, TracedViewMixin, GenericAPIView):
     serializer_class = AssignSerializer
 
     def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        assigned_orders = assign_orders(
-            serializer.validated_data['courier_id'])
-        response_data = {'orders': [{'id': o.pk} for o in assigned_orders]}
+        with span('parse'):
+            data = request.data
+        serializer = self.get_serializer(data=data)
+        with span('validate'):
+            serializer.is_valid(raise_exception=True)
+        assigned_ids = assign_orders(serializer.validated_data['courier_id'])
+        response_data = {'orders': [{'id': pk} for pk in assigned_ids]}
         return Response(response_data, status=status.HTTP_200_OK)
 
 
-class CompleteOrderView(GenericAPIView):
+class DispatchView(AsyncViewMixin, TracedViewMixin, GenericAPIView):
+    serializer_class = DispatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        with span('parse'):
+            data = request.data
+        serializer = self.get_serializer(data=data)
+        with span('validate'):
+            serializer.is_valid(raise_exception=True)
+        assigned_ids = dispatch_orders(serializer.validated_data['couriers'])
+        response_data = {
+            'couriers': [
+                {
+                    'courier_id': courier_id,
+                    'orders': [{'id': pk} for pk in order_ids],
+                }
+                for courier_id, order_ids in assigned_ids.items()
+            ]
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class CompleteOrderView(AsyncViewMixin, TracedViewMixin, GenericAPIView):
     serializer_class = CompleteOrderSerializer
 
     def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with span('parse'):
+            data = request.data
+        serializer = self.get_serializer(data=data)
+        with span('validate'):
+            serializer.is_valid(raise_exception=True)
 
         order = complete_order(
             serializer.validated_data['courier_id'],
             serializer.validated_data['order_id'])
         response_data = {'order_id': order.pk}
         return Response(response_data, status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    if not settings.DELIVERY_METRICS:
+        raise Http404()
+    token = settings.DELIVERY_METRICS_TOKEN
+    if token and not hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    metrics_registry.flush(force=True)
+    return HttpResponse(metrics_registry.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,22 @@
+"""
+ASGI config for candy_shop project.
+It exposes the ASGI callable as a module-level variable named ``application``.
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+import os
+from dotenv import load_dotenv
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "candy_shop.config")
+os.environ.setdefault("DJANGO_CONFIGURATION", "Production")
+
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+
+# otherwise Django runs sync views one at a time in a single thread
+os.environ.setdefault("DELIVERY_ASYNC_VIEWS", "yes")
+
+from configurations import importer  # noqa
+importer.install()
+
+from django.core.asgi import get_asgi_application  # noqa
+application = get_asgi_application()
@@ -21,6 +21,10 @@ class Common(Configuration):
 
     # https://docs.djangoproject.com/en/2.0/topics/http/middleware/
     MIDDLEWARE = (
+        'candy_shop.apps.delivery.middleware.RequestCaptureMiddleware',
+        'candy_shop.apps.delivery.metrics.MetricsMiddleware',
+        'candy_shop.apps.delivery.tracing.TracingMiddleware',
+        'candy_shop.apps.delivery.profiling.ProfilingMiddleware',
         'django.middleware.security.SecurityMiddleware',
         'django.contrib.sessions.middleware.SessionMiddleware',
         'django.middleware.common.CommonMiddleware',
@@ -33,6 +37,7 @@ class Common(Configuration):
     ALLOWED_HOSTS = ["*"]
     ROOT_URLCONF = 'candy_shop.urls'
     WSGI_APPLICATION = 'candy_shop.wsgi.application'
+    ASGI_APPLICATION = 'candy_shop.asgi.application'
 
     # Email
     EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -59,6 +64,62 @@ class Common(Configuration):
     USE_TZ = True
     LOGIN_REDIRECT_URL = '/'
 
+    # Delivery
+    # bulk uploads larger than this number of bytes are parsed, validated
+    # and inserted chunk by chunk of `DELIVERY_STREAMING_CHUNK_SIZE` items
+    DELIVERY_STREAMING_MIN_SIZE = int(
+        os.getenv('DELIVERY_STREAMING_MIN_SIZE', 1024 * 1024))
+    DELIVERY_STREAMING_CHUNK_SIZE = 1000
+    # a subclass of `candy_shop.apps.delivery.assignment.AssignmentStrategy`
+    DELIVERY_ASSIGNMENT_STRATEGY = (
+        'candy_shop.apps.delivery.assignment.KnapsackStrategy')
+    # candidates locked by a single assignment,
+    # the rest are left to concurrent assignments
+    DELIVERY_ASSIGNMENT_CANDIDATES = 100
+    # keep open orders in memory of every worker for assignment,
+    # see `candy_shop.apps.delivery.open_orders`
+    DELIVERY_OPEN_ORDER_INDEX = strtobool(
+        os.getenv('DELIVERY_OPEN_ORDER_INDEX', 'no'))
+    # appends every request to this file for `manage.py replay_requests`
+    DELIVERY_REQUEST_CAPTURE_FILE = os.getenv('DELIVERY_REQUEST_CAPTURE_FILE')
+    # per view metrics served at `/metrics` in Prometheus text format,
+    # with several worker processes set a directory shared by them
+    DELIVERY_METRICS = strtobool(os.getenv('DELIVERY_METRICS', 'no'))
+    DELIVERY_METRICS_DIR = os.getenv('DELIVERY_METRICS_DIR')
+    # if set, `/metrics` is served only with `Authorization: Bearer <token>`
+    DELIVERY_METRICS_TOKEN = os.getenv('DELIVERY_METRICS_TOKEN')
+    # a share of requests traced by phases, the ones slower than
+    # `DELIVERY_TRACE_SLOW_SECONDS` are appended to a file rotated externally
+    DELIVERY_TRACE_FILE = os.getenv('DELIVERY_TRACE_FILE')
+    DELIVERY_TRACE_SAMPLE_RATE = float(
+        os.getenv('DELIVERY_TRACE_SAMPLE_RATE', 0.01))
+    DELIVERY_TRACE_SLOW_SECONDS = float(
+        os.getenv('DELIVERY_TRACE_SLOW_SECONDS', 1))
+    # requests with the X-Delivery-Profile header signed by this key,
+    # see `manage.py sign_profile_request`, are profiled to the directory
+    DELIVERY_PROFILE_KEY = os.getenv('DELIVERY_PROFILE_KEY')
+    DELIVERY_PROFILE_DIR = os.getenv(
+        'DELIVERY_PROFILE_DIR', join(os.path.dirname(BASE_DIR), 'profiles'))
+    DELIVERY_PROFILE_MAX_AGE = 60 * 60
+    # async API views running the ORM in a pool of this number of threads
+    # per process, which is the default of `candy_shop.asgi`
+    DELIVERY_ASYNC_VIEWS = strtobool(os.getenv('DELIVERY_ASYNC_VIEWS', 'no'))
+    DELIVERY_ASYNC_THREADS = int(os.getenv('DELIVERY_ASYNC_THREADS', 16))
+
+    # Django Rest Framework
+    # the same wire format as the JSON renderer and parser of DRF
+    REST_FRAMEWORK = {
+        'DEFAULT_RENDERER_CLASSES': (
+            'candy_shop.apps.delivery.renderers.FastJSONRenderer',
+            'rest_framework.renderers.BrowsableAPIRenderer',
+        ),
+        'DEFAULT_PARSER_CLASSES': (
+            'candy_shop.apps.delivery.parsers.FastJSONParser',
+            'rest_framework.parsers.FormParser',
+            'rest_framework.parsers.MultiPartParser',
+        ),
+    }
+
     # Static files (CSS, JavaScript, Images)
     # https://docs.djangoproject.com/en/2.0/howto/static-files/
     STATIC_ROOT = os.path.normpath(join(os.path.dirname(BASE_DIR), 'static'))